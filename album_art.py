@@ -0,0 +1,179 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from mutagen.id3 import ID3
+from PIL import Image as PILImage
+from library_cache import CACHE_DIR
+
+# How many decoded covers to keep around for recently played songs
+ALBUM_ART_CACHE_SIZE = 32
+
+# Leading bytes of the image formats covers come in; a direct read at a
+# recorded offset that doesn't start with one of these is stale
+IMAGE_MAGIC = (b'\xff\xd8', b'\x89PNG', b'GIF8', b'BM', b'RIFF')
+
+# Pre-rendered covers sized for the now-playing widget (200px high)
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, 'thumbs')
+THUMBNAIL_SIZE = 200
+
+
+class AlbumArtCache:
+    """Small thread-safe LRU of cover bytes, keyed by content hash or path."""
+
+    def __init__(self, max_items=ALBUM_ART_CACHE_SIZE):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+_art_cache = AlbumArtCache()
+
+
+def get_album_art(song, cache=None):
+    """
+    Return the cover image bytes for `song`, or None if it has none.
+
+    Scanned songs only carry a reference ('art_frame' + 'art_hash'); the APIC
+    payload is read from the file the first time it is needed and then kept
+    in a bounded LRU. Songs built by hand may still carry raw 'album_art'
+    bytes, which are returned as-is.
+    """
+    if not song:
+        return None
+    if song.get('album_art'):
+        return song['album_art']
+    frame_key = song.get('art_frame')
+    if not frame_key:
+        return None
+
+    cache = cache if cache is not None else _art_cache
+    key = song.get('art_hash') or song.get('path')
+    data = cache.get(key)
+    if data is None:
+        data = read_album_art(song['path'], frame_key, song.get('art_offset'), song.get('art_length'))
+        if data is not None:
+            cache.put(key, data)
+    return data
+
+
+def read_album_art(path, frame_key, offset=None, length=None):
+    """
+    Read one APIC frame's bytes from an MP3 on disk. If the scan recorded
+    where the image sits in the file, just those bytes are read; otherwise
+    (or if the file changed since) the tag is parsed with mutagen.
+    """
+    if offset is not None and length:
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+            if len(data) == length and data.startswith(IMAGE_MAGIC):
+                return data
+        except OSError:
+            pass
+    try:
+        tags = ID3(path)
+    except Exception as e:
+        print(f"Album art read error for '{path}': {e}")
+        return None
+    frame = tags.get(frame_key)
+    if frame is None:
+        # Tag was rewritten since the scan; take whichever cover is there now
+        frame = next((t for t in tags.values() if t.FrameID == 'APIC'), None)
+    return frame.data if frame is not None else None
+
+
+# -------- THUMBNAILS --------
+def thumbnail_path(art_hash, size=THUMBNAIL_SIZE, thumb_dir=THUMBNAIL_DIR):
+    """Where the thumbnail for a cover with this content hash lives on disk."""
+    return os.path.join(thumb_dir, f"{art_hash}_{size}.png")
+
+
+def get_thumbnail(song, size=THUMBNAIL_SIZE, thumb_dir=THUMBNAIL_DIR):
+    """
+    Return the path of a small pre-sized cover for `song`, rendering it once
+    if it is not on disk yet. Returns None if the song has no art reference.
+    """
+    if not song or not song.get('art_hash'):
+        return None
+    path = thumbnail_path(song['art_hash'], size, thumb_dir)
+    if os.path.exists(path):
+        return path
+    data = get_album_art(song)
+    if not data:
+        return None
+    return _write_thumbnail(data, path, size)
+
+
+def build_thumbnails(songs, size=THUMBNAIL_SIZE, thumb_dir=THUMBNAIL_DIR, stop_event=None):
+    """Render missing thumbnails for every distinct cover in `songs`. Returns how many were made."""
+    created = 0
+    seen = set()
+    for song in songs:
+        if stop_event is not None and stop_event.is_set():
+            break
+        art_hash = song.get('art_hash')
+        if not art_hash or art_hash in seen:
+            continue
+        seen.add(art_hash)
+        path = thumbnail_path(art_hash, size, thumb_dir)
+        if os.path.exists(path):
+            continue
+        # Bypass the LRU so a bulk build doesn't evict recently played covers
+        data = read_album_art(song['path'], song.get('art_frame'),
+                              song.get('art_offset'), song.get('art_length'))
+        if data and _write_thumbnail(data, path, size):
+            created += 1
+    return created
+
+
+def build_thumbnails_in_background(songs, size=THUMBNAIL_SIZE, thumb_dir=THUMBNAIL_DIR):
+    """Start build_thumbnails on a daemon thread and return the thread."""
+    def worker():
+        created = build_thumbnails(list(songs), size, thumb_dir)
+        if created:
+            print(f"[Art] Rendered {created} new thumbnails into '{thumb_dir}'")
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
+
+
+def _write_thumbnail(data, path, size):
+    """Downscale cover bytes to fit size x size and save as PNG. Returns path or None."""
+    try:
+        img = PILImage.open(io.BytesIO(data))
+        img.thumbnail((size, size))
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Write to a temp name first so a half-written file is never picked up
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, format='PNG')
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"Thumbnail error for '{path}': {e}")
+        return None
@@ -0,0 +1,91 @@
+import os
+import random
+
+AMBIENT_EXTENSIONS = ('.mp3',)
+
+
+class AmbientIndex:
+    """
+    The ambient tracks in a folder (and its subfolders), dealt in shuffled
+    order.
+
+    The folder is walked once; after that files() only stats the folders
+    it found and walks again if one of them changed (a file added, removed
+    or renamed), so starting ambient doesn't re-scan an unchanged folder.
+
+    next() deals every track once before any repeats, like a shuffled deck:
+    when the deck runs out it is reshuffled, never starting with the track
+    that was just played. peek() shows what next() will return, so the
+    track can be decoded before it is needed.
+    """
+
+    def __init__(self, folder, extensions=AMBIENT_EXTENSIONS, rng=random):
+        self.folder = folder
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.rng = rng
+        self.scans = 0
+        self._files = []
+        self._dirs = {}     # folder -> st_mtime_ns when it was walked
+        self._deck = []     # tracks still to deal this round; dealt from the end
+        self._last = None
+
+    def files(self):
+        """Every track in the folder, walking it again only if it changed."""
+        if self._stale():
+            self._scan()
+        return self._files
+
+    def peek(self):
+        """The track next() will return, or None if the folder has none."""
+        self.files()
+        if not self._deck:
+            self._deal()
+        return self._deck[-1] if self._deck else None
+
+    def next(self):
+        """The next track in the shuffled order, or None if the folder has none."""
+        path = self.peek()
+        if path is not None:
+            self._deck.pop()
+            self._last = path
+        return path
+
+    def _stale(self):
+        if not self._dirs:
+            return True  # never walked, or the folder wasn't there
+        for folder, mtime in self._dirs.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _scan(self):
+        files, dirs = [], {}
+        for root, _, names in os.walk(self.folder):
+            try:
+                dirs[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                pass
+            files.extend(os.path.join(root, name) for name in names
+                         if name.lower().endswith(self.extensions))
+        files.sort()
+        known = set(self._files)
+        self.scans += 1
+        self._files, self._dirs = files, dirs
+        # Keep the order dealt so far: tracks that are gone drop out and new
+        # ones join at random, but never in front of the track peek() showed
+        present = set(files)
+        self._deck = [path for path in self._deck if path in present]
+        if self._deck:
+            for path in files:
+                if path not in known:
+                    self._deck.insert(self.rng.randrange(len(self._deck)), path)
+
+    def _deal(self):
+        deck = list(self.files())
+        self.rng.shuffle(deck)
+        if len(deck) > 1 and deck[-1] == self._last:
+            deck[0], deck[-1] = deck[-1], deck[0]  # no track twice in a row across rounds
+        self._deck = deck
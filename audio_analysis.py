@@ -0,0 +1,502 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pygame
+
+from library_cache import file_signature
+
+# Loudness is measured as gated RMS in dBFS over overlapping 400 ms blocks
+# (the same block/gate scheme ReplayGain 2 / EBU R128 use, without the
+# K-weighting filter). A full-scale sine measures about -3 dB.
+TARGET_LOUDNESS_DB = -18.0
+BLOCK_SECONDS = 0.4
+HOP_SECONDS = 0.1
+ABSOLUTE_GATE_DB = -70.0
+RELATIVE_GATE_DB = -10.0
+
+# Cue points come from 50 ms frame levels. Anything under SILENCE_DB is
+# treated as silence; the outro starts once the level stays OUTRO_DROP_DB
+# below the track's loudness. MIX_SECONDS is the default transition length
+# the suggested mix-out point leaves room for.
+CUE_FRAME_SECONDS = 0.05
+SILENCE_DB = -50.0
+OUTRO_DROP_DB = 12.0
+MIX_SECONDS = 5.0
+
+# Tempo and key are estimated from (at most) EXCERPT_SECONDS taken from the
+# middle of the track, where the beat is steadiest and there's no intro/outro.
+EXCERPT_SECONDS = 90.0
+ONSET_FFT = 1024
+ONSET_HOP = 256
+MIN_BPM = 60.0
+MAX_BPM = 180.0
+TEMPO_PRIOR_BPM = 120.0   # octave errors are resolved toward this tempo
+MIN_ONSET_STRENGTH = 0.03  # per-bin spread of the onset envelope; below this there's no beat
+MIN_BEAT_CLARITY = 0.1     # autocorrelation peak vs. lag 0; below this the onsets aren't periodic
+CHROMA_FFT = 8192         # ~2.7 Hz bins at 22 kHz, fine enough to separate semitones
+CHROMA_MIN_HZ = 65.0
+CHROMA_MAX_HZ = 2100.0
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Fingerprints follow Haitsma & Kalker: 33 log-spaced bands between 300 Hz
+# and 2 kHz, ~370 ms frames every ~23 ms, one 32-bit hash per frame from the
+# signs of the band-energy differences across frequency and time. Only the
+# hashes in a fixed 1/32 slice of the hash space are kept (the same slice for
+# every track), which keeps a few hundred per song and still lines up matches.
+FP_BANDS = 33
+FP_MIN_HZ = 300.0
+FP_MAX_HZ = 2000.0
+FP_FRAME_SECONDS = 0.37
+FP_HOP_SECONDS = 0.023
+FP_KEEP_BITS = 5
+
+# Rate used when we get to initialise the mixer ourselves (workers, CLI)
+ANALYSIS_RATE = 22050
+
+
+def _ensure_mixer():
+    """Decoding goes through pygame, which needs an initialised mixer."""
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=ANALYSIS_RATE, channels=1)
+
+
+def _init_worker():
+    # Worker processes only decode; never let them open the sound card
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    _ensure_mixer()
+
+
+def decode_pcm(path):
+    """Decode `path` to mono float32 samples in [-1, 1]. Returns (samples, rate)."""
+    _ensure_mixer()
+    rate = pygame.mixer.get_init()[0]
+    pcm = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if pcm.dtype.kind == 'f':
+        samples = pcm.astype(np.float32)
+    else:
+        full_scale = float(2 ** (pcm.dtype.itemsize * 8 - 1))
+        samples = pcm.astype(np.float32)
+        if pcm.dtype.kind == 'u':
+            samples -= full_scale
+        samples /= full_scale
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1)
+    return samples, rate
+
+
+def block_power(samples, rate, block_seconds=BLOCK_SECONDS, hop_seconds=HOP_SECONDS):
+    """Mean square of every (overlapping) block, computed from one running sum."""
+    n = max(1, int(rate * block_seconds))
+    hop = max(1, int(rate * hop_seconds))
+    if len(samples) == 0:
+        return np.zeros(0)
+    if len(samples) < n:
+        return np.array([np.mean(np.square(samples, dtype=np.float64))])
+    csum = np.concatenate(([0.0], np.cumsum(np.square(samples, dtype=np.float64))))
+    starts = np.arange(0, len(samples) - n + 1, hop)
+    return (csum[starts + n] - csum[starts]) / n
+
+
+def measure_loudness(samples, rate):
+    """Gated loudness of `samples` in dBFS, or None if the track is silent."""
+    power = block_power(samples, rate)
+    power = power[power > 10 ** (ABSOLUTE_GATE_DB / 10)]
+    if len(power) == 0:
+        return None
+    # Ignore blocks far below the track's own level (fades, quiet intros)
+    power = power[power >= power.mean() * 10 ** (RELATIVE_GATE_DB / 10)]
+    return float(10 * np.log10(power.mean()))
+
+
+def analyze_loudness(samples, rate):
+    """Loudness analyzer: level, peak and the gain that brings it to the target."""
+    loudness = measure_loudness(samples, rate)
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    if loudness is None:
+        return {'loudness_db': None, 'peak': peak, 'gain_db': 0.0}
+    gain = TARGET_LOUDNESS_DB - loudness
+    if peak > 0:
+        # Never boost a quiet track past clipping
+        gain = min(gain, -20 * np.log10(peak))
+    return {'loudness_db': round(loudness, 2), 'peak': round(peak, 4), 'gain_db': round(float(gain), 2)}
+
+
+def frame_levels(samples, rate, frame_seconds=CUE_FRAME_SECONDS):
+    """RMS level in dBFS of consecutive non-overlapping frames. Returns (levels, frame_seconds)."""
+    n = max(1, int(rate * frame_seconds))
+    count = len(samples) // n
+    if count == 0:
+        return np.zeros(0), n / rate
+    frames = samples[:count * n].reshape(count, n)
+    power = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / n
+    return 10 * np.log10(np.maximum(power, 1e-12)), n / rate
+
+
+def analyze_cues(samples, rate):
+    """
+    Cue analyzer: where the music starts (cue_in, after leading silence), where
+    it ends (cue_out, before trailing silence) and a suggested point to start
+    mixing into the next song (mix_out), all in seconds from the file start.
+    """
+    levels, frame = frame_levels(samples, rate)
+    duration = len(samples) / rate
+    audible = np.flatnonzero(levels > SILENCE_DB)
+    if len(audible) == 0:
+        return {'cue_in': 0.0, 'cue_out': round(duration, 2),
+                'mix_out': round(max(0.0, duration - MIX_SECONDS), 2)}
+
+    cue_in = audible[0] * frame
+    cue_out = (audible[-1] + 1) * frame
+    loudness = measure_loudness(samples, rate)
+    loud = np.flatnonzero(levels >= loudness - OUTRO_DROP_DB) if loudness is not None else audible
+    outro_start = (loud[-1] + 1) * frame if len(loud) else cue_out
+    # Start the transition when the outro fades, or early enough to finish by cue_out
+    mix_out = max(cue_in, min(outro_start, cue_out - MIX_SECONDS))
+    return {'cue_in': round(float(cue_in), 2), 'cue_out': round(float(cue_out), 2),
+            'mix_out': round(float(mix_out), 2)}
+
+
+def _excerpt(samples, rate, seconds=EXCERPT_SECONDS):
+    """The middle `seconds` of `samples`, brought down to at most ~22 kHz."""
+    while rate > 32000:
+        # Cheap 2x decimation; tempo and key live well below the new Nyquist
+        samples = 0.5 * (samples[0:len(samples) - 1:2] + samples[1::2])
+        rate /= 2
+    n = int(rate * seconds)
+    if len(samples) > n:
+        start = (len(samples) - n) // 2
+        samples = samples[start:start + n]
+    return samples, rate
+
+
+def onset_envelope(samples, rate):
+    """Spectral flux (summed increase in log magnitude) per hop. Returns (envelope, frames_per_second)."""
+    fps = rate / ONSET_HOP
+    if len(samples) < ONSET_FFT * 2:
+        return np.zeros(0), fps
+    frames = np.lib.stride_tricks.sliding_window_view(samples, ONSET_FFT)[::ONSET_HOP]
+    mag = np.abs(np.fft.rfft(frames * np.hanning(ONSET_FFT).astype(np.float32), axis=1))
+    flux = np.diff(np.log1p(1000.0 * mag), axis=0)
+    # Averaged over bins so the envelope's scale doesn't depend on the FFT size
+    return np.maximum(flux, 0.0).mean(axis=1), fps
+
+
+def estimate_bpm(envelope, fps):
+    """Tempo from the autocorrelation of the onset envelope, or None if there's no clear beat."""
+    lo = int(fps * 60 / MAX_BPM)
+    hi = int(fps * 60 / MIN_BPM) + 1
+    if len(envelope) < hi * 4 or envelope.std() < MIN_ONSET_STRENGTH:
+        return None
+    # Smear each onset over a few frames so beats that fall between frames still line up
+    x = np.convolve(envelope, np.hanning(7), mode='same')
+    x -= x.mean()
+    size = 1 << (2 * len(x) - 1).bit_length()
+    spectrum = np.fft.rfft(x, size)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(x)]
+    if ac[0] <= 0:
+        return None
+    lags = np.arange(lo, hi)
+    # Favour tempos near TEMPO_PRIOR_BPM so half/double time doesn't win by accident
+    weight = np.exp(-0.5 * np.log2(60 * fps / lags / TEMPO_PRIOR_BPM) ** 2)
+    score = ac[lo:hi] * weight
+    i = int(np.argmax(score))
+    if ac[lo + i] < MIN_BEAT_CLARITY * ac[0]:
+        return None
+    lag = float(lags[i])
+    if 0 < i < len(score) - 1:
+        a, b, c = score[i - 1:i + 2]
+        if a - 2 * b + c != 0:
+            lag += 0.5 * (a - c) / (a - 2 * b + c)
+    return 60 * fps / lag
+
+
+def chroma_vector(samples, rate):
+    """Energy per pitch class (C..B), from long FFT frames averaged over the excerpt."""
+    count = len(samples) // CHROMA_FFT
+    if count == 0:
+        return np.zeros(12)
+    frames = samples[:count * CHROMA_FFT].reshape(count, CHROMA_FFT)
+    power = np.square(np.abs(np.fft.rfft(frames * np.hanning(CHROMA_FFT).astype(np.float32), axis=1))).mean(axis=0)
+    freqs = np.fft.rfftfreq(CHROMA_FFT, 1.0 / rate)
+    band = (freqs >= CHROMA_MIN_HZ) & (freqs <= CHROMA_MAX_HZ)
+    pitch_class = (np.round(12 * np.log2(freqs[band] / 440.0)).astype(int) + 69) % 12
+    return np.bincount(pitch_class, weights=np.sqrt(power[band]), minlength=12)
+
+
+def estimate_key(chroma):
+    """Best matching key for `chroma` as (tonic pitch class, is_minor), or None."""
+    if not np.any(chroma > 0):
+        return None
+    profiles = np.array([np.roll(p, tonic) for p in (MAJOR_PROFILE, MINOR_PROFILE) for tonic in range(12)])
+    profiles = (profiles - profiles.mean(axis=1, keepdims=True)) / profiles.std(axis=1, keepdims=True)
+    z = (chroma - chroma.mean()) / (chroma.std() or 1.0)
+    best = int(np.argmax(profiles @ z))
+    return best % 12, best >= 12
+
+
+def camelot(tonic, minor):
+    """Camelot wheel code (e.g. '8A' for A minor): neighbours on the wheel mix well."""
+    relative_major = (tonic + 3) % 12 if minor else tonic
+    return f"{(7 * relative_major + 7) % 12 + 1}{'A' if minor else 'B'}"
+
+
+def analyze_tempo_key(samples, rate):
+    """Tempo/key analyzer: bpm, key name and Camelot code (None when they can't be told)."""
+    excerpt, ex_rate = _excerpt(samples, rate)
+    bpm = estimate_bpm(*onset_envelope(excerpt, ex_rate))
+    key = estimate_key(chroma_vector(excerpt, ex_rate))
+    return {
+        'bpm': round(float(bpm), 1) if bpm else None,
+        'key': f"{PITCH_CLASSES[key[0]]} {'minor' if key[1] else 'major'}" if key else None,
+        'camelot': camelot(*key) if key else None,
+    }
+
+
+def fingerprint(samples, rate):
+    """Sorted list of sampled 32-bit spectral hashes identifying the recording."""
+    frame = 1 << int(round(np.log2(rate * FP_FRAME_SECONDS)))
+    hop = max(1, int(rate * FP_HOP_SECONDS))
+    if len(samples) < frame * 2:
+        return []
+    edges = np.round(np.geomspace(FP_MIN_HZ, FP_MAX_HZ, FP_BANDS + 1) * frame / rate).astype(int)
+    window = np.hanning(frame).astype(np.float32)
+    weights = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop]
+    hashes = []
+    # A few hundred frames at a time keeps the spectrogram from ballooning on long tracks
+    for start in range(0, len(frames) - 1, 500):
+        chunk = frames[start:start + 501]
+        power = np.square(np.abs(np.fft.rfft(chunk * window, axis=1)))[:, edges[0]:edges[-1]]
+        energy = np.add.reduceat(power, edges[:-1] - edges[0], axis=1)
+        across = energy[:, :-1] - energy[:, 1:]
+        bits = (across[1:] - across[:-1]) > 0
+        values = bits.astype(np.uint64) @ weights
+        # Frames with next to no energy hash noise, not music
+        audible = energy[1:].sum(axis=1) > 1e-6 * frame
+        hashes.append(values[audible])
+    values = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    keep = ((values * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)) >> np.uint64(32 - FP_KEEP_BITS) == 0
+    values = np.unique(values[keep])
+    return [int(v) for v in values if 0 < v < 0xFFFFFFFF]
+
+
+def analyze_fingerprint(samples, rate):
+    """Fingerprint analyzer (see FingerprintIndex for how the hashes are matched)."""
+    return {'fingerprint': fingerprint(samples, rate)}
+
+
+# name -> (version, fn(samples, rate) -> dict). Bump a version to have that
+# analyzer re-run over the whole library on the next pass.
+ANALYZERS = {
+    'loudness': (1, analyze_loudness),
+    'cues': (1, analyze_cues),
+    'tempo_key': (1, analyze_tempo_key),
+    'fingerprint': (1, analyze_fingerprint),
+}
+
+
+def gain_to_volume(gain_db):
+    """Turn a stored gain into a pygame volume. pygame can only attenuate, so boosts cap at 1.0."""
+    if gain_db is None:
+        return 1.0
+    return max(0.0, min(1.0, 10 ** (gain_db / 20)))
+
+
+def missing_analyzers(data, names=None):
+    """Analyzers in `names` that have no up-to-date result in `data`."""
+    names = list(ANALYZERS) if names is None else names
+    done = (data or {}).get('analyzers', {})
+    return [n for n in names if done.get(n) != ANALYZERS[n][0]]
+
+
+def analyze_file(path, names=None):
+    """Decode `path` once and run every requested analyzer over it."""
+    names = list(ANALYZERS) if names is None else names
+    samples, rate = decode_pcm(path)
+    data = {'analyzers': {}}
+    for name in names:
+        version, fn = ANALYZERS[name]
+        data.update(fn(samples, rate))
+        data['analyzers'][name] = version
+    return data
+
+
+def _analyze_one(path, names):
+    try:
+        return path, analyze_file(path, names), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def analyze_library(paths, cache=None, workers=None, names=None, on_result=None,
+                    stop_event=None, stats=None):
+    """
+    Analyze every file in `paths`, returning {path: analysis dict}.
+
+    Files whose analysis is already in `cache` (and still matches their size
+    and mtime) are not decoded again, so after the first run only new or
+    changed files cost anything. The rest are spread over a process pool
+    (`workers` processes, default one per spare core). `on_result(path, data)`
+    is called as each fresh result comes in, and `stats` (if given) gets the
+    analyzed/cached/failed counts, elapsed seconds and tracks per second.
+    """
+    names = list(ANALYZERS) if names is None else names
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+
+    results = {}
+    todo = {}
+    for path in paths:
+        try:
+            sig = file_signature(path)
+        except OSError:
+            continue
+        cached = cache.lookup_analysis(path, *sig) if cache is not None else None
+        missing = missing_analyzers(cached, names)
+        if missing:
+            todo[path] = (sig, cached, missing)
+        else:
+            results[path] = cached
+
+    analyzed = failed = 0
+    t0 = time.perf_counter()
+
+    def finish(path, data, error):
+        nonlocal analyzed, failed
+        if data is None:
+            failed += 1
+            print(f"[Analysis] Could not analyze {path}: {error}")
+            return
+        sig, cached, _ = todo[path]
+        merged = dict(cached or {}, **data)
+        merged['analyzers'] = dict((cached or {}).get('analyzers', {}), **data['analyzers'])
+        results[path] = merged
+        analyzed += 1
+        if cache is not None:
+            # One short transaction per track: the app writes to the same
+            # catalog and must never wait behind a batch of decodes
+            cache.store_analysis(path, *sig, merged)
+            cache.commit()
+        if on_result:
+            on_result(path, merged)
+
+    if todo:
+        if workers <= 1:
+            for path, (_, _, missing) in todo.items():
+                if stop_event is not None and stop_event.is_set():
+                    break
+                finish(*_analyze_one(path, missing))
+        else:
+            # Spawned, not forked: a forked child inherits the parent's live
+            # mixer (and its locks) and can hang on the first decode
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(_analyze_one, path, missing)
+                           for path, (_, _, missing) in todo.items()]
+                for future in as_completed(futures):
+                    if stop_event is not None and stop_event.is_set():
+                        for f in futures:
+                            f.cancel()
+                        break
+                    finish(*future.result())
+        if cache is not None:
+            cache.commit()
+
+    elapsed = time.perf_counter() - t0
+    if stats is not None:
+        stats.update({
+            'analyzed': analyzed,
+            'cached': len(results) - analyzed,
+            'failed': failed,
+            'seconds': elapsed,
+            'tracks_per_sec': analyzed / elapsed if analyzed and elapsed > 0 else 0.0,
+            'workers': workers,
+        })
+    return results
+
+
+def format_analysis_stats(stats):
+    return (f"[Analysis] {stats.get('analyzed', 0)} analyzed, {stats.get('cached', 0)} cached, "
+            f"{stats.get('failed', 0)} failed in {stats.get('seconds', 0.0):.1f}s "
+            f"({stats.get('tracks_per_sec', 0.0):.1f} tracks/s on {stats.get('workers', 1)} workers)")
+
+
+def run_analysis_process(directory, cache_path, workers=None):
+    """
+    Start the analyzer as its own process (see __main__ below) and return the Popen.
+
+    The GUI uses this rather than calling analyze_library() directly: the
+    worker pool needs a clean parent process to start from, and the app's
+    main module (Kivy window, live mixer) is not one. Results stream back on
+    stdout as one JSON object per line; read them with read_analysis_results().
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), directory, '--Cache', cache_path, '--Json']
+    if workers:
+        cmd += ['--Workers', str(workers)]
+    env = dict(os.environ, SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, env=env)
+
+
+def read_analysis_results(stream):
+    """Yield (path, data) pairs from a --Json analyzer's output; other lines are echoed."""
+    for line in stream:
+        if line.startswith('{'):
+            item = json.loads(line)
+            yield item['path'], item['data']
+        elif line.strip():
+            print(line.rstrip())
+
+
+if __name__ == "__main__":
+    """
+    Benchmark / pre-warm the analysis cache without starting the GUI:
+
+    python audio_analysis.py mp3/                 # analyze into .cache/library.sqlite3
+    python audio_analysis.py mp3/ --Workers 1     # compare against a single process
+    python audio_analysis.py mp3/ --NoCache       # always decode everything (pure benchmark)
+    """
+    import argparse
+    from library_cache import MetadataCache, DEFAULT_CACHE_PATH
+    from song_library import _walk_mp3_paths
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?", default="mp3/")
+    parser.add_argument("--Workers", type=int, default=None,
+                        help="Number of analysis processes (default: one per spare core)")
+    parser.add_argument("--Cache", default=DEFAULT_CACHE_PATH,
+                        help="Metadata cache to read and store results in")
+    parser.add_argument("--NoCache", action="store_true",
+                        help="Ignore stored results and analyze every file")
+    parser.add_argument("--Json", action="store_true",
+                        help="Print every result as a JSON line (used by the jukebox app)")
+    args = parser.parse_args()
+
+    emitted = set()
+
+    def emit(path, data):
+        emitted.add(path)
+        print(json.dumps({'path': path, 'data': data}), flush=True)
+
+    paths = list(_walk_mp3_paths(args.directory))
+    cache = None if args.NoCache else MetadataCache(args.Cache)
+    stats = {}
+    results = analyze_library(paths, cache=cache, workers=args.Workers, stats=stats,
+                              on_result=emit if args.Json else None)
+    if args.Json:
+        # Fresh results went out as they finished; now the ones served from the cache
+        for path, data in results.items():
+            if path not in emitted:
+                emit(path, data)
+    print(format_analysis_stats(stats), flush=True)
+    if cache is not None:
+        cache.close()
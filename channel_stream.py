@@ -0,0 +1,201 @@
+import shutil
+import subprocess
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+# Channel playback is fed in blocks this long. One block plays while the
+# next waits in the channel's queue, so the feeding thread has a whole block
+# of slack before the mixer would run dry.
+CHUNK_SECONDS = 2.0
+
+# Decoder used to stream tracks instead of decoding them whole (None if not installed)
+FFMPEG = shutil.which('ffmpeg')
+
+# pygame mixer sample size (mixer.get_init()[1]) -> (ffmpeg raw format, NumPy dtype).
+# Unsigned formats are faded and mixed around their midpoint (see crossfade_mixer).
+PCM_FORMATS = {
+    -16: ('s16le', np.int16),
+    16: ('u16le', np.uint16),
+    -8: ('s8', np.int8),
+    8: ('u8', np.uint8),
+    32: ('f32le', np.float32),
+}
+
+
+class ArraySource:
+    """
+    Reads a decoded track block by block, from frame `start` up to `end`.
+    `samples` is normally a pygame.sndarray view of a cached Sound; blocks
+    are views into it, so reading never copies the whole track.
+    """
+
+    def __init__(self, samples, start=0, end=None):
+        self.samples = samples
+        self.end = len(samples) if end is None else min(end, len(samples))
+        self.pos = min(max(0, start), self.end)
+
+    def read(self, n):
+        block = self.samples[self.pos:min(self.pos + n, self.end)]
+        self.pos += len(block)
+        return block
+
+    def remaining(self):
+        return self.end - self.pos
+
+    def close(self):
+        pass
+
+
+class DecoderSource:
+    """
+    Reads a track block by block from an ffmpeg process decoding it to the
+    mixer's sample format, starting at frame `start`. Only the block being
+    read is held in memory (one reusable buffer, plus the pipe's own small
+    buffer), so memory use doesn't grow with the length of the track.
+
+    Same interface as ArraySource, except that a block is only valid until
+    the next read() and `end` is an estimate (from the tagged duration)
+    until the decoder runs dry. Call close() when done with it.
+    """
+
+    def __init__(self, path, rate, channels=2, size=-16, start=0, end=None):
+        fmt, self.dtype = PCM_FORMATS[size]
+        self.path = path
+        self.channels = channels
+        self.pos = max(0, start)
+        self.end = sys.maxsize if end is None else max(end, self.pos)
+        self._start = self.pos
+        self._frame_bytes = np.dtype(self.dtype).itemsize * channels
+        self._buf = np.empty(0, dtype=np.uint8)
+        self._proc = subprocess.Popen(
+            [FFMPEG, '-nostdin', '-v', 'error', '-ss', f'{self.pos / rate:.6f}', '-i', path,
+             '-f', fmt, '-ac', str(channels), '-ar', str(rate), '-'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+    @staticmethod
+    def available():
+        return FFMPEG is not None
+
+    def read(self, n):
+        want = max(0, int(n)) * self._frame_bytes
+        if len(self._buf) < want:
+            self._buf = np.empty(want, dtype=np.uint8)
+        got = 0
+        if self._proc is not None:
+            view = memoryview(self._buf)[:want]
+            while got < want:
+                k = self._proc.stdout.readinto(view[got:])
+                if not k:
+                    self._finish(decoded=got or self.pos > self._start)
+                    break
+                got += k
+        frames = got // self._frame_bytes
+        block = self._buf[:frames * self._frame_bytes].view(self.dtype)
+        if self.channels > 1:
+            block = block.reshape(-1, self.channels)
+        self.pos += frames
+        if self._proc is None:
+            self.end = self.pos
+        else:
+            self.end = max(self.end, self.pos)
+        return block
+
+    def remaining(self):
+        return self.end - self.pos
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+
+    def _finish(self, decoded):
+        """The decoder ran dry: the track is over, or (nothing `decoded`) it could not be decoded at all."""
+        proc = self._proc
+        proc.wait()
+        error = proc.stderr.read().decode(errors='replace').strip()
+        self.close()
+        if proc.returncode and not decoded:
+            raise RuntimeError(f"ffmpeg could not decode '{self.path}': {error or proc.returncode}")
+
+
+class ChannelStream:
+    """
+    Plays a run of sample blocks on one mixer channel, gap-free.
+
+    The first block is played and every later one goes into the channel's
+    queue (Channel.queue), which the mixer switches to on the exact sample
+    the previous block ends. What is heard is therefore exactly the blocks
+    as rendered; the feeding thread only has to hand over the next block
+    before the playing one runs out, not at any particular moment.
+
+    Each block can carry a tag (e.g. the song that starts in it); poll()
+    reports tags as their blocks start playing.
+    """
+
+    def __init__(self, channel, make_sound, rate):
+        self.channel = channel
+        self._make_sound = make_sound  # sample array -> pygame Sound
+        self.rate = rate
+        self._pending = deque()  # [frames, tag] handed to the channel; the first one is playing
+        self._started = []       # tags whose blocks have started since the last poll()
+        self._playing_since = None
+
+    def feed(self, frames, tag=None):
+        """Play `frames` after everything fed so far. Only call when room() is true."""
+        sound = self._make_sound(frames)
+        if not self._pending:
+            self.channel.play(sound)
+            self._playing_since = time.time()
+            self._started.append(tag)
+        else:
+            self.channel.queue(sound)
+        self._pending.append((len(frames), tag))
+
+    def room(self):
+        """True when the next block can be fed (nothing is waiting in the channel's queue)."""
+        self._update()
+        return len(self._pending) < 2
+
+    def busy(self):
+        self._update()
+        return bool(self._pending)
+
+    def poll(self):
+        """Tags of the blocks that started playing since the last call (None for untagged blocks)."""
+        self._update()
+        started, self._started = self._started, []
+        return [tag for tag in started if tag is not None]
+
+    def next_due(self):
+        """When (time.time()) the playing block should end, or None if idle."""
+        if not self._pending:
+            return None
+        return self._playing_since + self._pending[0][0] / self.rate
+
+    def stop(self):
+        self.channel.stop()
+        self._pending.clear()
+        self._started = []
+        self._playing_since = None
+
+    def _update(self):
+        if not self._pending:
+            return
+        if not self.channel.get_busy():
+            # Everything ran out; a queued block may have started and ended unseen
+            for _, tag in list(self._pending)[1:]:
+                self._started.append(tag)
+            self._pending.clear()
+            self._playing_since = None
+        elif len(self._pending) == 2 and self.channel.get_queue() is None:
+            # The queued block is playing now; it started where the last one ended
+            frames, _ = self._pending.popleft()
+            self._playing_since += frames / self.rate
+            self._started.append(self._pending[0][1])
@@ -0,0 +1,84 @@
+import numpy as np
+
+# Fade shapes. With 'equal_power' the two songs' gains satisfy
+# out² + in² = 1 all the way through, so the overlap doesn't dip in loudness
+# the way a linear crossfade does halfway (two songs at 0.5 each).
+CURVES = ('equal_power', 'linear')
+DEFAULT_CURVE = 'equal_power'
+
+
+def _ramp(n):
+    """0 -> 1 over n samples, evaluated at sample centres."""
+    return (np.arange(n, dtype=np.float64) + 0.5) / max(n, 1)
+
+
+def fade_gains(n, curve=DEFAULT_CURVE):
+    """(fade_out, fade_in) gain arrays of length n for a crossfade with the given curve."""
+    t = _ramp(n)
+    if curve == 'linear':
+        return 1.0 - t, t
+    if curve == 'equal_power':
+        return np.cos(t * np.pi / 2), np.sin(t * np.pi / 2)
+    raise ValueError(f"Unknown crossfade curve {curve!r} (expected one of {CURVES})")
+
+
+def _per_frame(gains, frames):
+    """Broadcastable gains for a mono (n,) or multi-channel (n, channels) block."""
+    gains = np.asarray(gains, dtype=np.float64)
+    return gains[:, None] if gains.ndim and frames.ndim > 1 else gains
+
+
+def _midpoint(dtype):
+    """Silence in the sample format: 0, or half-scale for unsigned PCM (128 for u8, 32768 for u16)."""
+    if np.issubdtype(dtype, np.unsignedinteger):
+        return (np.iinfo(dtype).max + 1) // 2
+    return 0
+
+
+def _to_dtype(mixed, dtype):
+    """Round and clip a float mix back to the sample format, so loud overlaps clip instead of wrapping."""
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        mixed = np.clip(np.rint(mixed), info.min, info.max)
+    return mixed.astype(dtype)
+
+
+def render(frames, gains=1.0):
+    """
+    New block of `frames` scaled by `gains` (a constant, or one gain per
+    frame). The source, e.g. a cached decoded sound, is never written to.
+    Unsigned samples are scaled around their midpoint, not around 0.
+    """
+    if np.ndim(gains) == 0 and gains == 1.0:
+        return np.array(frames, copy=True)
+    mid = _midpoint(frames.dtype)
+    return _to_dtype((frames - np.float64(mid)) * _per_frame(gains, frames) + mid, frames.dtype)
+
+
+def mix_overlap(out_frames, in_frames, curve=DEFAULT_CURVE, out_volume=1.0, in_volume=1.0):
+    """
+    Render a crossfade: `out_frames` (the tail of the outgoing song) fading
+    out under `in_frames` (the head of the incoming one) fading in. The
+    result is as long as the longer block and the shorter one is padded
+    with silence: an incoming song shorter than the fade, or a streamed
+    outgoing song that ran out before its tagged length. Volumes are the
+    songs' own playback levels. Unsigned samples are mixed around their
+    midpoint, which is also what the padding is filled with.
+    """
+    n = max(len(out_frames), len(in_frames))
+    g_out, g_in = fade_gains(n, curve)
+    k, m = len(out_frames), len(in_frames)
+    mid = np.float64(_midpoint(out_frames.dtype))
+    mixed = np.zeros((n,) + out_frames.shape[1:], dtype=np.float64)
+    mixed[:k] = (out_frames - mid) * _per_frame(g_out[:k] * out_volume, out_frames)
+    mixed[:m] += (in_frames - mid) * _per_frame(g_in[:m] * in_volume, in_frames)
+    return _to_dtype(mixed + mid, out_frames.dtype)
+
+
+def envelope(samples, block):
+    """Peak absolute level of each `block`-frame block (for checking a rendered fade)."""
+    flat = np.abs(samples.astype(np.float64))
+    if flat.ndim > 1:
+        flat = flat.max(axis=1)
+    usable = len(flat) // block * block
+    return flat[:usable].reshape(-1, block).max(axis=1)
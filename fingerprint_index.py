@@ -0,0 +1,108 @@
+import threading
+from collections import Counter, defaultdict
+
+# Two songs are the same recording when at least this share of the smaller
+# fingerprint's hashes also appear in the other one (unrelated songs share a
+# few percent), and at least MIN_MATCHES hashes line up.
+MATCH_THRESHOLD = 0.2
+MIN_MATCHES = 8
+
+
+class FingerprintIndex:
+    """
+    Finds songs that are stored more than once (re-rips, renamed copies,
+    different bitrates) from the fingerprints made by audio_analysis.
+
+    Hashes go into an inverted index (hash -> paths), so matching a song only
+    visits the posting lists of its own few hundred hashes: the cost depends
+    on how many songs share hashes with it, not on the size of the library.
+    Matches are merged into duplicate groups as songs are added.
+    """
+
+    def __init__(self, threshold=MATCH_THRESHOLD, min_matches=MIN_MATCHES):
+        self.threshold = threshold
+        self.min_matches = min_matches
+        self._postings = defaultdict(set)
+        self._hashes = {}
+        self._groups = {}  # path -> frozenset of its whole group (only songs that have duplicates)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, path, hashes):
+        """Index `path` (replacing any earlier fingerprint) and group it with its matches."""
+        with self._lock:
+            if path in self._hashes:
+                self._remove(path)
+            hashes = set(hashes)
+            matches = self._query(hashes)
+            self._hashes[path] = hashes
+            for h in hashes:
+                self._postings[h].add(path)
+            if matches:
+                self._merge([path] + matches)
+
+    def remove(self, path):
+        with self._lock:
+            self._remove(path)
+
+    def query(self, hashes):
+        """Paths whose fingerprint matches `hashes`."""
+        with self._lock:
+            return self._query(set(hashes))
+
+    def duplicates_of(self, path):
+        """Other copies of the song at `path`."""
+        return set(self._groups.get(path, ())) - {path}
+
+    def duplicates_of_any(self, paths):
+        """Every other copy of any song in `paths` (the paths themselves excluded)."""
+        paths = set(paths)
+        found = set()
+        for path in paths:
+            found.update(self._groups.get(path, ()))
+        return found - paths
+
+    def groups(self):
+        """List of duplicate groups (sets of two or more paths)."""
+        return [set(g) for g in set(self._groups.values())]
+
+    def summary(self):
+        groups = self.groups()
+        extra = sum(len(g) - 1 for g in groups)
+        return f"[Duplicates] {len(groups)} songs stored more than once ({extra} extra copies)"
+
+    # -------- INTERNALS --------
+    def _query(self, hashes):
+        if not hashes:
+            return []
+        counts = Counter(p for h in hashes for p in self._postings.get(h, ()))
+        return [p for p, n in counts.items()
+                if n >= self.min_matches and n / min(len(hashes), len(self._hashes[p])) >= self.threshold]
+
+    def _merge(self, paths):
+        group = set()
+        for p in paths:
+            group.update(self._groups.get(p, (p,)))
+        group = frozenset(group)
+        for p in group:
+            self._groups[p] = group
+
+    def _remove(self, path):
+        for h in self._hashes.pop(path, ()):
+            posting = self._postings[h]
+            posting.discard(path)
+            if not posting:
+                del self._postings[h]
+        group = self._groups.pop(path, None)
+        if not group:
+            return
+        # The removed song may have been the only link between the others: regroup them
+        rest = group - {path}
+        for p in rest:
+            del self._groups[p]
+        for p in rest:
+            matches = [q for q in self._query(self._hashes[p]) if q != p]
+            if matches:
+                self._merge([p] + matches)
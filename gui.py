@@ -1,4 +1,5 @@
 import io
+import time
 from PIL import Image as PILImage
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
@@ -12,6 +13,8 @@ from kivy.core.text import LabelBase
 from kivy.core.image import Image as CoreImage
 from kivy.graphics import Color, Rectangle
 from kivy.uix.widget import Widget
+from album_art import get_album_art, get_thumbnail
+from song_library import ARTISTS, GENRES
 
 LabelBase.register(name="EmojiFont", fn_regular=".\\assets\\font\\seguiemj.ttf")
 
@@ -242,38 +245,55 @@ class JukeboxGUI(BoxLayout):
 
     def display_songs(self):
         self.songs_grid.clear_widgets()
+        self._add_song_buttons(self.all_songs)
 
+    def add_songs(self, songs):
+        """
+        Append newly scanned songs to the library and to the visible list,
+        without rebuilding the buttons that are already there.
+        """
+        self.all_songs.extend(songs)
+        self._add_song_buttons(songs)
+
+    def _add_song_buttons(self, songs):
         # --- Create a comprehensive set of all song titles to hide ---
         # 1. Get titles of songs already played.
         played_titles = self.player.played_songs
 
         # 2. Get titles of songs in the active queues (user-selected, and special).
-        primary_queued_titles = {song['title'] for song in self.player.primary_playlist}
-        special_queued_titles = {song['title'] for song in self.player.Special_playlist}
+        primary_queued_titles = {song.title for song in self.player.primary_playlist}
+        special_queued_titles = {song.title for song in self.player.Special_playlist}
         
         # 3. Combine them all into a single set for an efficient lookup.
         titles_to_hide = played_titles.union(primary_queued_titles, special_queued_titles)
 
-        for song in self.all_songs:
+        # 4. Other copies of those songs (same recording under another name).
+        paths_to_hide = self.player.hidden_duplicate_paths()
+
+        # Filters compare interned ids rather than strings (None = nothing matches)
+        genre_id = None if self.genre_filter == 'All' else GENRES.id_of(self.genre_filter)
+        artist_id = None if self.artist_filter == 'All' else ARTISTS.id_of(self.artist_filter)
+
+        for song in songs:
             # --- Apply all filters ---
 
             # 1. Hide songs that are played or already in an active queue.
-            if song.get('title') in titles_to_hide:
+            if song.title in titles_to_hide or song.path in paths_to_hide:
                 continue
 
             # 2. Exclude songs from the 'Special' genre from the main list.
-            if 'Special' in song.get('genres', []):
+            if song.is_special:
                 continue
             
             # 3. Apply the user-selected genre and artist filters.
-            if not (self.genre_filter == 'All' or self.genre_filter in song.get('genres', [])):
+            if self.genre_filter != 'All' and genre_id not in song.genre_ids:
                 continue
-            if not (self.artist_filter == 'All' or self.artist_filter in song.get('artists', [])):
+            if self.artist_filter != 'All' and artist_id not in song.artist_ids:
                 continue
 
             # If the song passes all filters, create and add its button.
             btn = Button(
-                text=f"{self.emoji_for(song.get('genres', []))} {song.get('title')}\n{self._get_joined_artists(song)}",
+                text=f"{self.emoji_for(song.genres)} {song.title}\n{self._get_joined_artists(song)}",
                 font_name="EmojiFont", background_color=(0.53, 0.81, 0.98, 1),
                 size_hint_y=None, height=60, halign='center', valign='middle', color=(1, 1, 1, 1), # <-- This is now white
                 on_press=lambda instance, s=song: self.handle_song_selection(s)
@@ -296,10 +316,20 @@ class JukeboxGUI(BoxLayout):
         self.info_label.text = f"{self.emoji_for(song.get('genres', []))} {self._get_joined_artists(song)} – {song.get('title', 'N/A')}"
         self.info_label.font_size = 35 if len(self.info_label.text) < 50 else 25
         
-        # Try to load embedded album art first
-        if song.get('album_art'):
+        # Prefer the small pre-rendered thumbnail of the embedded cover
+        thumb_path = get_thumbnail(song)
+        if thumb_path:
+            try:
+                self.album_art.texture = CoreImage(thumb_path).texture
+                return
+            except Exception as e:
+                print(f"Thumbnail error: {e}")
+
+        # Songs without a thumbnail (e.g. inline bytes) decode the full cover
+        art_bytes = get_album_art(song)
+        if art_bytes:
             try:
-                data = io.BytesIO(song['album_art'])
+                data = io.BytesIO(art_bytes)
                 core_img = CoreImage(data, ext='png') # Assume png, but can be autodetected
                 self.album_art.texture = core_img.texture
                 return
@@ -322,13 +352,14 @@ class JukeboxGUI(BoxLayout):
             self.album_art.texture = None
 
     def update_upcoming_songs(self, upcoming):
+        """Show the upcoming queue: (song, estimated start time) pairs, see JukeboxPlayer.upcoming_timeline."""
         self.upcoming_grid.clear_widgets()
         if not upcoming:
             self.upcoming_grid.add_widget(Label(text="No upcoming songs.", font_name="EmojiFont", font_size=20, color=(0.15, 0.15, 0.15, 1)))
             return
-        for i, song in enumerate(upcoming):
+        for i, (song, eta) in enumerate(upcoming):
             self.upcoming_grid.add_widget(Label(
-                text=f"{i+1}. {self.emoji_for(song.get('genres', []))} {self._get_joined_artists(song)} - {song.get('title','N/A')}",
+                text=f"{i+1}. ~{time.strftime('%H:%M', time.localtime(eta))} {self.emoji_for(song.get('genres', []))} {self._get_joined_artists(song)} - {song.get('title','N/A')}",
                 size_hint_y=None, font_size=35, color=(0.15, 0.15, 0.15, 1), height=30, font_name="EmojiFont" 
             ))
 
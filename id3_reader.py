@@ -0,0 +1,238 @@
+import hashlib
+import struct
+import sys
+import time
+
+from mutagen.id3 import ID3, TCON
+
+# Text frames the library scan needs
+TEXT_FRAMES = ('TIT2', 'TPE1', 'TCON')
+
+# Bytes of an APIC frame read to get past its mime type and description
+APIC_HEAD_BYTES = 512
+
+# How much of each end of a cover goes into its content hash
+ART_SAMPLE_BYTES = 4096
+
+_TEXT_CODECS = {0: ('latin-1', b'\0'), 1: ('utf-16', b'\0\0'), 2: ('utf-16-be', b'\0\0'), 3: ('utf-8', b'\0')}
+
+
+class FastTags:
+    """What read_fast_tags found: first text values and where the first cover lives."""
+
+    def __init__(self, text, art_key=None, art_hash=None, art_offset=None, art_length=None, bytes_read=0):
+        self.text = text            # frame id -> first value (TCON already normalized like mutagen)
+        self.art_key = art_key      # mutagen HashKey of the first APIC frame, e.g. 'APIC:'
+        self.art_hash = art_hash
+        self.art_offset = art_offset
+        self.art_length = art_length
+        self.bytes_read = bytes_read
+
+
+def read_fast_tags(path):
+    """
+    Read TIT2/TPE1/TCON from an ID3v2.3/2.4 tag by walking the frame headers,
+    seeking past everything else. For the first APIC frame only its header
+    is read; the image's file offset and length are recorded instead.
+
+    Returns None for anything it doesn't handle (no ID3v2 tag, v2.2,
+    unsynchronised or compressed/encrypted frames, odd sizes, unreadable
+    files) so the caller can fall back to mutagen.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _read(f)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+def art_hash_from_file(f, offset, length):
+    """Content hash of a cover stored at `offset` in an open file (reads at most 2 * ART_SAMPLE_BYTES)."""
+    f.seek(offset)
+    if length <= 2 * ART_SAMPLE_BYTES:
+        return art_hash(f.read(length))
+    head = f.read(ART_SAMPLE_BYTES)
+    f.seek(offset + length - ART_SAMPLE_BYTES)
+    return _sample_hash(length, head, f.read(ART_SAMPLE_BYTES))
+
+
+def art_hash(data):
+    """Short content hash identifying a cover image (same value as art_hash_from_file)."""
+    if len(data) <= 2 * ART_SAMPLE_BYTES:
+        return _sample_hash(len(data), data, b'')
+    return _sample_hash(len(data), data[:ART_SAMPLE_BYTES], data[-ART_SAMPLE_BYTES:])
+
+
+def _sample_hash(length, head, tail):
+    # Length plus both ends tells covers apart without hashing megabytes
+    return hashlib.sha1(str(length).encode() + head + tail).hexdigest()[:16]
+
+
+def _synchsafe(b):
+    if any(x & 0x80 for x in b):
+        raise ValueError("not a synchsafe integer")
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _read(f):
+    header = f.read(10)
+    bytes_read = len(header)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return None
+    major, flags = header[3], header[5]
+    if major not in (3, 4) or flags & 0x80:  # v2.2 or whole-tag unsynchronisation
+        return None
+    end = 10 + _synchsafe(header[6:10])
+    pos = 10
+    if flags & 0x40:  # extended header: v2.4 size includes itself, v2.3 doesn't
+        ext = f.read(4)
+        bytes_read += 4
+        pos += _synchsafe(ext) if major == 4 else struct.unpack('>I', ext)[0] + 4
+
+    raw_text, art = {}, None
+    while pos + 10 <= end and (len(raw_text) < len(TEXT_FRAMES) or art is None):
+        f.seek(pos)
+        frame_header = f.read(10)
+        bytes_read += len(frame_header)
+        if len(frame_header) < 10 or frame_header[0] == 0:  # padding
+            break
+        frame_id = frame_header[:4].decode('latin-1')
+        size = _synchsafe(frame_header[4:8]) if major == 4 else struct.unpack('>I', frame_header[4:8])[0]
+        data_pos = pos + 10
+        if data_pos + size > end:
+            return None
+        wanted = (frame_id in TEXT_FRAMES and frame_id not in raw_text) or (frame_id == 'APIC' and art is None)
+        if wanted:
+            if frame_header[9]:  # compressed, encrypted, grouped or unsynchronised frame
+                return None
+            if frame_id == 'APIC':
+                head = f.read(min(size, APIC_HEAD_BYTES))
+                bytes_read += len(head)
+                art = _parse_apic_head(head, data_pos, size)
+                if art is None:
+                    return None
+            else:
+                data = f.read(size)
+                bytes_read += len(data)
+                raw_text[frame_id] = _decode_text(data)
+        pos = data_pos + size
+
+    text = {frame_id: values[0] for frame_id, values in raw_text.items() if frame_id != 'TCON' and values}
+    if 'TCON' in raw_text:
+        # mutagen turns '(17)' style references into names when it loads a tag
+        genres = TCON(encoding=3, text=raw_text['TCON']).genres
+        if not genres:
+            return None
+        text['TCON'] = genres[0]
+
+    tags = FastTags(text, bytes_read=bytes_read)
+    if art is not None:
+        tags.art_key, tags.art_offset, tags.art_length = art
+        tags.art_hash = art_hash_from_file(f, tags.art_offset, tags.art_length)
+        tags.bytes_read += min(tags.art_length, 2 * ART_SAMPLE_BYTES)
+    return tags
+
+
+def _decode_text(data):
+    """All values of a text frame body (encoding byte + null-separated strings)."""
+    if not data:
+        return []
+    codec, _ = _TEXT_CODECS[data[0]]
+    body = data[1:]
+    if codec.startswith('utf-16') and len(body) % 2:
+        body = body[:-1]
+    values = body.decode(codec).split('\0')
+    while len(values) > 1 and values[-1] == '':
+        values.pop()
+    return values
+
+
+def _parse_apic_head(head, data_pos, size):
+    """(HashKey, image offset, image length) from the start of an APIC frame, or None."""
+    if not head:
+        return None
+    codec, terminator = _TEXT_CODECS.get(head[0], (None, None))
+    if codec is None:
+        return None
+    mime_end = head.find(b'\0', 1)
+    if mime_end < 0:
+        return None
+    desc_start = mime_end + 2  # skip the picture type byte
+    desc_end = desc_start
+    while True:
+        desc_end = head.find(terminator, desc_end)
+        if desc_end < 0:
+            return None
+        if len(terminator) == 1 or (desc_end - desc_start) % 2 == 0:
+            break
+        desc_end += 1
+    raw_desc = head[desc_start:desc_end]
+    desc = raw_desc.decode(codec) if raw_desc else ''
+    image_start = desc_end + len(terminator)
+    return f"APIC:{desc}", data_pos + image_start, size - image_start
+
+
+class _CountingFile:
+    """File wrapper that counts bytes read, for comparing readers in the benchmark."""
+
+    def __init__(self, path):
+        self._f = open(path, 'rb')
+        self.name = path
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def close(self):
+        self._f.close()
+
+
+def _benchmark(paths):
+    results = {}
+    for name in ('mutagen', 'fast'):
+        total_bytes, t0 = 0, time.perf_counter()
+        for path in paths:
+            if name == 'fast':
+                tags = read_fast_tags(path)
+                if tags is not None:
+                    total_bytes += tags.bytes_read
+                    continue
+            f = _CountingFile(path)
+            try:
+                tags = ID3(f)
+                frame = next((t for t in tags.values() if t.FrameID == 'APIC'), None)
+                if frame is not None:
+                    art_hash(frame.data)
+            except Exception:
+                pass
+            finally:
+                f.close()
+                total_bytes += f.bytes_read
+        results[name] = (time.perf_counter() - t0, total_bytes)
+    return results
+
+
+if __name__ == "__main__":
+    """
+    Compare the fast tag reader with a full mutagen parse:
+
+    python id3_reader.py mp3/
+    """
+    from song_library import _walk_mp3_paths
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'mp3/'
+    paths = _walk_mp3_paths(directory)
+    if not paths:
+        sys.exit(f"No MP3s under {directory}")
+    fast_hits = sum(read_fast_tags(p) is not None for p in paths)
+    print(f"{len(paths)} files, {fast_hits} readable by the fast path")
+    # Run twice so both readers see a warm page cache
+    _benchmark(paths)
+    for name, (seconds, total_bytes) in _benchmark(paths).items():
+        print(f"  {name:8s} {len(paths) / seconds:8.0f} files/s  "
+              f"{total_bytes / len(paths) / 1024:8.1f} KiB read per file")
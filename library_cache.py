@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+
+CACHE_DIR = '.cache'
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'library.sqlite3')
+
+# Bump this whenever the shape of a cached song record changes, so stale
+# catalogs are thrown away instead of serving records with missing fields.
+CACHE_SCHEMA_VERSION = 4
+
+# The analyzer runs in its own process and writes to the same catalog, so a
+# writer may briefly hold the lock; wait for it instead of failing.
+BUSY_TIMEOUT = 30.0
+
+
+class MetadataCache:
+    """
+    Persistent catalog of parsed song metadata, stored in SQLite.
+
+    Entries are keyed by path and validated against the file's size and
+    mtime, so an unchanged file is served straight from the catalog and only
+    new or modified files need their ID3 tags parsed again.
+
+    Audio analysis results (loudness etc.) live in a separate table with the
+    same validation, so a tag rescan doesn't throw away expensive analysis.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, rescan=False):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self._lock = threading.Lock()
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # The catalog is shared with background scanners, so all access goes
+        # through self._lock rather than relying on sqlite's thread check.
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        if db_path != ':memory:':
+            # WAL lets readers (a new MetadataCache, the snapshot check) go on
+            # while the other process is in the middle of a write
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._init_schema(drop=rescan)
+
+    def _init_schema(self, drop=False):
+        with self._lock:
+            cur = self._conn.cursor()
+            version = cur.execute('PRAGMA user_version').fetchone()[0]
+            if not drop and version == CACHE_SCHEMA_VERSION:
+                return  # already set up; don't take the write lock just to open it
+            cur.execute('DROP TABLE IF EXISTS songs')
+            cur.execute(
+                'CREATE TABLE IF NOT EXISTS songs ('
+                ' path TEXT PRIMARY KEY,'
+                ' size INTEGER NOT NULL,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' record TEXT NOT NULL)'
+            )
+            cur.execute(
+                'CREATE TABLE IF NOT EXISTS analysis ('
+                ' path TEXT PRIMARY KEY,'
+                ' size INTEGER NOT NULL,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' data TEXT NOT NULL)'
+            )
+            cur.execute(f'PRAGMA user_version = {CACHE_SCHEMA_VERSION}')
+            self._conn.commit()
+
+    def lookup(self, path, size, mtime_ns):
+        """Return the cached song record for `path`, or None if missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, record FROM songs WHERE path = ?', (path,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[2])
+
+    def store(self, path, size, mtime_ns, song):
+        """Insert or replace the record for `path`."""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO songs (path, size, mtime_ns, record) VALUES (?, ?, ?, ?)',
+                (path, size, mtime_ns, json.dumps(song)),
+            )
+
+    def lookup_analysis(self, path, size, mtime_ns):
+        """Return the stored analysis dict for `path`, or None if missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, data FROM analysis WHERE path = ?', (path,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def store_analysis(self, path, size, mtime_ns, data):
+        """Insert or replace the analysis results for `path`."""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analysis (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)',
+                (path, size, mtime_ns, json.dumps(data)),
+            )
+
+    def remove(self, paths):
+        """Forget the given paths (e.g. files deleted while the app is running)."""
+        rows = [(p,) for p in paths]
+        with self._lock:
+            self._conn.executemany('DELETE FROM songs WHERE path = ?', rows)
+            self._conn.executemany('DELETE FROM analysis WHERE path = ?', rows)
+
+    def prune(self, seen_paths):
+        """Drop entries for files that no longer exist in the scanned library."""
+        seen = set(seen_paths)
+        with self._lock:
+            cached = [row[0] for row in self._conn.execute(
+                'SELECT path FROM songs UNION SELECT path FROM analysis')]
+            gone = [(p,) for p in cached if p not in seen]
+            self._conn.executemany('DELETE FROM songs WHERE path = ?', gone)
+            self._conn.executemany('DELETE FROM analysis WHERE path = ?', gone)
+        self.pruned += len(gone)
+        return len(gone)
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def summary(self):
+        return (f"[Library] {self.hits} cached, {self.misses} parsed, "
+                f"{self.pruned} removed ({self.db_path})")
+
+
+def file_signature(path):
+    """Return the (size, mtime_ns) pair used to validate cache entries."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
@@ -0,0 +1,243 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from library_cache import CACHE_DIR, file_signature
+from song_library import Song
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(CACHE_DIR, 'library.snapshot')
+
+MAGIC = b'JBXSNAP\0'
+SNAPSHOT_VERSION = 2
+_PREAMBLE = struct.Struct('<8sII')  # magic, version, header length
+_ALIGN = 8
+
+# Per-song columns: name -> dtype. Missing values are stored as -1 (or NaN).
+_COLUMNS = {
+    'key': '<i8',
+    'path': '<i4',
+    'title': '<i4',
+    'art_frame': '<i4',
+    'art_hash': '<i4',
+    'art_offset': '<i8',
+    'art_length': '<i8',
+    'duration': '<f8',
+    'bitrate': '<i4',
+    'sample_rate': '<i4',
+    'size': '<i8',
+    'mtime_ns': '<i8',
+}
+
+
+class LibrarySnapshot:
+    """A loaded snapshot: songs, their file signatures and the precomputed lists."""
+
+    def __init__(self, songs, signatures, playlists, artists, created):
+        self.songs = songs
+        self.signatures = signatures   # path -> (size, mtime_ns) when the snapshot was written
+        self.playlists = playlists     # 'primary' / 'special' / 'default' -> [Song]
+        self.artists = artists         # sorted artists with at least one default-rotation song
+        self.created = created
+
+
+def snapshot_validators(music_dir, extra_files=()):
+    """
+    mtime of every folder under `music_dir` plus `extra_files` (e.g. playlist
+    JSONs). Adding, removing or renaming a song changes its folder's mtime.
+    """
+    validators = {}
+    for root, _, _ in os.walk(music_dir):
+        validators[root] = os.stat(root).st_mtime_ns
+    for path in extra_files:
+        if os.path.exists(path):
+            validators[path] = os.stat(path).st_mtime_ns
+    return validators
+
+
+def _is_current(validators):
+    for path, mtime_ns in validators.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def write_snapshot(path, songs, playlists, artists, validators, signatures=None):
+    """
+    Write `songs` and the precomputed playlist/artist lists to `path` in one
+    go (to a temp file, then renamed into place). `signatures` maps path ->
+    (size, mtime_ns); songs missing from it are stat'ed here.
+    """
+    signatures = signatures or {}
+    strings, string_ids = [], {}
+
+    def sid(value):
+        if value is None:
+            return -1
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    row_of = {song.key: row for row, song in enumerate(songs)}
+    columns = {name: [] for name in _COLUMNS}
+    artist_start, artist_ids, genre_start, genre_ids = [0], [], [0], []
+    for song in songs:
+        sig = signatures.get(song.path)
+        if sig is None:
+            try:
+                sig = file_signature(song.path)
+            except OSError:
+                sig = (-1, -1)
+        columns['key'].append(song.key)
+        columns['path'].append(sid(song.path))
+        columns['title'].append(sid(song.title))
+        columns['art_frame'].append(sid(song.art_frame))
+        columns['art_hash'].append(sid(song.art_hash))
+        columns['art_offset'].append(-1 if song.art_offset is None else song.art_offset)
+        columns['art_length'].append(-1 if song.art_length is None else song.art_length)
+        columns['duration'].append(np.nan if song.duration is None else song.duration)
+        columns['bitrate'].append(-1 if song.bitrate is None else song.bitrate)
+        columns['sample_rate'].append(-1 if song.sample_rate is None else song.sample_rate)
+        columns['size'].append(sig[0])
+        columns['mtime_ns'].append(sig[1])
+        artist_ids.extend(sid(a) for a in song.artists)
+        artist_start.append(len(artist_ids))
+        genre_ids.extend(sid(g) for g in song.genres)
+        genre_start.append(len(genre_ids))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    sections = {name: np.asarray(values, dtype=_COLUMNS[name]) for name, values in columns.items()}
+    sections.update({
+        'str_offsets': np.cumsum([0] + [len(b) for b in encoded], dtype='<i8'),
+        'str_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'artist_start': np.asarray(artist_start, dtype='<i4'),
+        'artist_ids': np.asarray(artist_ids, dtype='<i4'),
+        'genre_start': np.asarray(genre_start, dtype='<i4'),
+        'genre_ids': np.asarray(genre_ids, dtype='<i4'),
+        'artists': np.asarray([sid(a) for a in artists], dtype='<i4'),
+    })
+    for name, playlist in playlists.items():
+        sections[f'playlist:{name}'] = np.asarray([row_of[s.key] for s in playlist if s.key in row_of], dtype='<i4')
+
+    # Lay the sections out back to back, each 8-byte aligned, after the header
+    layout, offset = {}, 0
+    for name, array in sections.items():
+        layout[name] = [offset, array.dtype.str, len(array)]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({'count': len(songs), 'created': time.time(),
+                         'validators': validators, 'sections': layout}).encode('utf-8')
+    header += b' ' * (-(len(header) + _PREAMBLE.size) % _ALIGN)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for array in sections.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % _ALIGN))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path, validate=True):
+    """
+    Memory-map the snapshot at `path` and rebuild its songs. Returns None if
+    there's no snapshot, it's from another version, or any folder/playlist it
+    was built from has changed since (so the caller falls back to a scan).
+    """
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+    try:
+        magic, version, header_len = _PREAMBLE.unpack_from(mm, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            return None
+        header = json.loads(mm[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        if validate and not _is_current(header['validators']):
+            return None
+        base = _PREAMBLE.size + header_len
+        sections = {name: np.frombuffer(mm, dtype=dtype, count=count, offset=base + offset)
+                    for name, (offset, dtype, count) in header['sections'].items()}
+        snapshot = _build(sections, header)
+        del sections
+        return snapshot
+    except (struct.error, ValueError, KeyError) as e:
+        print(f"[Snapshot] Ignoring unreadable snapshot {path}: {e}")
+        return None
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            pass  # a view is still alive; the map goes away with it
+
+
+def _build(sections, header):
+    blob = sections['str_blob'].tobytes()
+    offsets = sections['str_offsets'].tolist()
+    strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    def text(sid):
+        return None if sid < 0 else strings[sid]
+
+    cols = {name: sections[name].tolist() for name in _COLUMNS}
+    artist_start, artist_ids = sections['artist_start'].tolist(), sections['artist_ids'].tolist()
+    genre_start, genre_ids = sections['genre_start'].tolist(), sections['genre_ids'].tolist()
+
+    songs, signatures = [], {}
+    for row in range(header['count']):
+        duration = cols['duration'][row]
+        song = Song(
+            key=cols['key'][row],
+            path=strings[cols['path'][row]],
+            title=text(cols['title'][row]),
+            artists=[strings[i] for i in artist_ids[artist_start[row]:artist_start[row + 1]]],
+            genres=[strings[i] for i in genre_ids[genre_start[row]:genre_start[row + 1]]],
+            art_frame=text(cols['art_frame'][row]),
+            art_hash=text(cols['art_hash'][row]),
+            duration=None if duration != duration else duration,  # NaN -> None
+            bitrate=None if cols['bitrate'][row] < 0 else cols['bitrate'][row],
+            sample_rate=None if cols['sample_rate'][row] < 0 else cols['sample_rate'][row],
+            art_offset=None if cols['art_offset'][row] < 0 else cols['art_offset'][row],
+            art_length=None if cols['art_length'][row] < 0 else cols['art_length'][row],
+        )
+        songs.append(song)
+        if cols['size'][row] >= 0:
+            signatures[song.path] = (cols['size'][row], cols['mtime_ns'][row])
+
+    playlists = {name.split(':', 1)[1]: [songs[i] for i in array.tolist()]
+                 for name, array in sections.items() if name.startswith('playlist:')}
+    artists = [strings[i] for i in sections['artists'].tolist()]
+    return LibrarySnapshot(songs, signatures, playlists, artists, header.get('created'))
+
+
+if __name__ == "__main__":
+    """
+    Time a snapshot load (what startup does before the first frame):
+
+    python library_snapshot.py                        # .cache/library.snapshot
+    python library_snapshot.py path/to/library.snapshot
+    """
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SNAPSHOT_PATH
+    t0 = time.perf_counter()
+    snap = load_snapshot(path, validate=False)
+    elapsed = time.perf_counter() - t0
+    if snap is None:
+        print(f"No usable snapshot at {path}")
+    else:
+        print(f"[Snapshot] {len(snap.songs)} songs loaded in {elapsed * 1000:.0f} ms")
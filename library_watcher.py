@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+# inotify is optional (Linux only); without it we fall back to polling.
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # pragma: no cover - depends on platform
+    INotify = None
+    inotify_flags = None
+
+from library_cache import file_signature
+from song_library import _walk_mp3_paths
+
+
+class LibraryWatcher:
+    """
+    Watches the music folder and reports added, modified and removed MP3s.
+
+    Filesystem events (or a poll tick when inotify is unavailable) only
+    trigger a cheap re-snapshot of path -> (size, mtime). Changes are held
+    back until the folder has been quiet for `debounce` seconds and are then
+    delivered in a single on_changes(added, modified, removed) call, so a
+    bulk copy produces one batch instead of one update per file, and files
+    still being copied are not picked up half-written.
+    """
+
+    def __init__(self, directory, on_changes, poll_interval=2.0, debounce=1.5, use_inotify=True):
+        self.directory = directory
+        self.on_changes = on_changes
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify and INotify is not None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._watched_dirs = {}
+        self._committed = {}
+
+    # -------- PUBLIC CONTROLS --------
+    def start(self, initial_snapshot=None):
+        """Start watching. Files in `initial_snapshot` (or on disk now) count as known."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._committed = initial_snapshot if initial_snapshot is not None else self.snapshot()
+        self._stop_event.clear()
+        if self.use_inotify:
+            try:
+                self._inotify = INotify()
+                self._sync_watches()
+            except OSError as e:
+                print(f"[Watcher] inotify unavailable, polling instead: {e}")
+                self._inotify = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # -------- SNAPSHOTS --------
+    def snapshot(self):
+        """Return {path: (size, mtime_ns)} for every MP3 currently on disk."""
+        snap = {}
+        for path in _walk_mp3_paths(self.directory):
+            try:
+                snap[path] = file_signature(path)
+            except OSError:
+                continue  # deleted between walk and stat
+        return snap
+
+    @staticmethod
+    def diff(old, new):
+        """Compare two snapshots and return (added, modified, removed) path lists."""
+        added = [p for p in new if p not in old]
+        removed = [p for p in old if p not in new]
+        modified = [p for p in new if p in old and new[p] != old[p]]
+        return added, modified, removed
+
+    # -------- INTERNALS --------
+    def _run(self):
+        last_seen = self._committed
+        last_change_ts = None
+        while not self._stop_event.is_set():
+            self._wait_for_activity(timeout=self.debounce if last_change_ts else self.poll_interval)
+            if self._stop_event.is_set():
+                break
+
+            current = self.snapshot()
+            if current != last_seen:
+                last_seen = current
+                last_change_ts = time.monotonic()
+                if self._inotify is not None:
+                    self._sync_watches()
+                continue
+
+            if last_change_ts and time.monotonic() - last_change_ts >= self.debounce:
+                added, modified, removed = self.diff(self._committed, current)
+                last_change_ts = None
+                if added or modified or removed:
+                    try:
+                        self.on_changes(added, modified, removed)
+                    except Exception as e:
+                        # Keep the batch pending and offer it again after another quiet period
+                        print(f"[Watcher] Error applying library changes, will retry: {e}")
+                        last_change_ts = time.monotonic()
+                        continue
+                self._committed = current
+
+    def _wait_for_activity(self, timeout):
+        """Block until a filesystem event arrives or `timeout` seconds pass."""
+        if self._inotify is None:
+            self._stop_event.wait(timeout)
+            return
+        try:
+            self._inotify.read(timeout=int(timeout * 1000))
+        except OSError:
+            self._stop_event.wait(timeout)
+
+    def _sync_watches(self):
+        """Make sure every directory under the music folder has an inotify watch."""
+        mask = (inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MODIFY |
+                inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_FROM | inotify_flags.MOVED_TO)
+        # The kernel drops watches of deleted directories on its own
+        for path in [d for d in self._watched_dirs if not os.path.isdir(d)]:
+            del self._watched_dirs[path]
+        for root, _, _ in os.walk(self.directory):
+            if root not in self._watched_dirs:
+                try:
+                    self._watched_dirs[root] = self._inotify.add_watch(root, mask)
+                except OSError:
+                    pass
@@ -5,14 +5,24 @@ Config.set('graphics', 'height', '800')
 
 from kivy.app import App
 from gui import JukeboxGUI
-from player import JukeboxPlayer
-from song_library import get_all_mp3_files_with_metadata, is_abba_song
+from player import JukeboxPlayer, GAPLESS, PLAYLIST_NAMES
+from song_library import iter_mp3_files_with_metadata, load_songs, is_abba_song, format_scan_timings, Song
+from library_watcher import LibraryWatcher
+from library_cache import MetadataCache, DEFAULT_CACHE_PATH
+from library_snapshot import load_snapshot, write_snapshot, snapshot_validators, DEFAULT_SNAPSHOT_PATH
+from album_art import build_thumbnails, build_thumbnails_in_background
+from audio_analysis import analyze_library, run_analysis_process, read_analysis_results
+from playlist_order import smooth_order
+from song_queue import SongQueue
+from slot_scheduler import SlotScheduler
+from crossfade_mixer import CURVES
 from dialogs import confirm_dialog, confirm_dialog_error
 import argparse
 import threading
 import os
 import random
 import json
+from kivy.clock import Clock
 from kivy.core.window import Window
 Window.clearcolor = (1, 0.99, 0.9, 1)  # A nice cream color (RGBA)
 from kivy.uix.floatlayout import FloatLayout
@@ -64,46 +74,33 @@ class RootWidget(FloatLayout):
 
 MUSIC_DIR = 'mp3/'
 PLAYLISTS_DIR = 'playlists'
+LIBRARY_CACHE_PATH = DEFAULT_CACHE_PATH
+LIBRARY_SNAPSHOT_PATH = DEFAULT_SNAPSHOT_PATH
+PLAYLIST_FILES = ('Special_playlist.json', 'default_playlist.json')
+GAPLESS_PAIRS_FILE = 'gapless_pairs.json'  # optional: [[from file, to file], ...] that join without a gap
+SLOT_RULES_FILE = 'slot_rules.json'        # optional: which playlist fills which slots (see slot_scheduler)
+SNAPSHOT_GUI_BATCH = 500
+UPCOMING_REFRESH_SECONDS = 30  # re-show the upcoming list so its times follow a song running long
 
 all_songs_list = []
 all_songs_path_map = {}
 gui = None
 player = None
+library_cache = None
+library_watcher = None
+analysis_enabled = False
+analysis_process = None
+snapshot_path = None  # set by the app; None means don't write snapshots
+next_song_key = 0
+special_playlist_order = {}
+primary_playlist_order = {}
+available_artists = set()
 
 def get_upcoming_songs_for_display():
-    """Simulates the player's logic to generate a list of the next 10 upcoming songs."""
-    global player
+    """The next 10 upcoming songs with their estimated start times, from the player's cached projection."""
     if not player:
         return []
-    
-    # Create copies of playlists to simulate without affecting the actual player state
-    sim_primary_playlist = list(player.primary_playlist)
-    sim_special_playlist = list(player.Special_playlist)
-    sim_default_playlist = list(player.default_playlist)
-    sim_song_counter = player.song_counter 
-
-    upcoming_list_for_gui = []
-
-    while len(upcoming_list_for_gui) < 10:
-        is_special_slot = (sim_song_counter % 5 == 0 and sim_song_counter != 0)
-        next_song_candidate = None
-
-        if is_special_slot and sim_special_playlist:
-            next_song_candidate = sim_special_playlist.pop(0)
-        elif sim_primary_playlist:
-            next_song_candidate = sim_primary_playlist.pop(0)
-        elif sim_default_playlist:
-            next_song_candidate = sim_default_playlist.pop(0)
-        elif sim_special_playlist: # In case we run out of primary/default songs
-            next_song_candidate = sim_special_playlist.pop(0)
-        else:
-            break # No more songs available
-
-        if next_song_candidate not in upcoming_list_for_gui:
-            upcoming_list_for_gui.append(next_song_candidate)
-        sim_song_counter += 1
-
-    return upcoming_list_for_gui
+    return player.upcoming_timeline(10)
 
 def select_song(song_to_select):
     """Handles the logic for when a user selects a song from the GUI."""
@@ -115,7 +112,7 @@ def select_song(song_to_select):
         gui.clear_filter()
         return
 
-    is_already_in_primary = any(s['key'] == song_to_select['key'] for s in player.primary_playlist)
+    is_already_in_primary = song_to_select in player.primary_playlist
     if is_already_in_primary:
         confirm_dialog_error(None, f"'{song_name}' is already in the upcoming song queue.")
         gui.clear_filter()
@@ -131,16 +128,16 @@ def select_song(song_to_select):
                 threading.Thread(target=player.play_song_immediately, args=(song_to_select,)).start()
             else:
                 # Insert after all other user-selected songs
-                selected_count = sum(1 for s in player.primary_playlist if s['title'] in player.selected_songs)
-                player.primary_playlist.insert(selected_count, song_to_select)
+                with player.queue_lock:
+                    player.primary_playlist.insert_after_picks(song_to_select)
                 player.selected_songs.add(song_name)
 
             # Hide the song from future selections and remove from other playlists
             gui.hidden_song_keys.append(song_to_select['key'])
-            if song_to_select in player.default_playlist:
-                player.default_playlist.remove(song_to_select)
-            if song_to_select in player.Special_playlist:
-                player.Special_playlist.remove(song_to_select)
+            with player.queue_lock:
+                player.default_playlist.discard(song_to_select)
+                player.Special_playlist.discard(song_to_select)
+            player.notify_queue_changed()
             
             # *** CRITICAL: Clear filters and update GUI only after confirmation ***
             gui.clear_filter() 
@@ -204,67 +201,325 @@ def load_song_filenames_from_json(playlist_filename):
         print(f"Warning: Could not load playlist '{filepath}'. Reason: {e}")
     return []
 
-def map_filenames_to_song_objects(filenames, song_path_map):
-    """Maps a list of filenames to their corresponding full song data objects."""
-    loaded_songs = []
-    for fname in filenames:
-        # First, try a direct lookup with the expected path structure
-        normalized_path = os.path.join(MUSIC_DIR, fname).replace("\\", "/")
-        if normalized_path in song_path_map:
-            loaded_songs.append(song_path_map[normalized_path])
-        else:
-            # Fallback: search for the base filename in all song objects
-            found_song = next((s for s in song_path_map.values() if os.path.basename(s['path']) == fname), None)
-            if found_song:
-                loaded_songs.append(found_song)
-            else:
-                print(f"Warning: Song '{fname}' from playlist not found in music library.")
-    return loaded_songs
+def load_slot_rules(filename=SLOT_RULES_FILE):
+    """Scheduler from the playlist folder's slot rules, or None to keep the built-in every-5th rule."""
+    filepath = os.path.join(PLAYLISTS_DIR, filename)
+    if not os.path.exists(filepath):
+        return None
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return SlotScheduler.from_config(json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Warning: Could not load slot rules '{filepath}'. Reason: {e}")
+    return None
+
+def _playlist_order(filenames):
+    """Maps each playlist file's base name to its position in the JSON list."""
+    return {os.path.basename(fname): idx for idx, fname in reversed(list(enumerate(filenames)))}
+
+def _playlist_successor(playlist, song, order):
+    """The queued song `song` goes in front of to keep `playlist` in JSON order (None: the end); user picks stay in front."""
+    rank = order[os.path.basename(song.path)]
+    for s in playlist:
+        if order.get(os.path.basename(s.path), -1) > rank:
+            return s
+    return None
+
+def _normalize_path(path):
+    return path.replace("\\", "/")
+
+def prepare_song(record, key=None):
+    """Turns a scanned record into a Song with a key and normalized genres, and registers it."""
+    global next_song_key
+    if key is None:
+        key = next_song_key
+        next_song_key += 1
+    if os.path.basename(record['path']) in special_playlist_order:
+        genres = ['Special']
+    else:
+        genres = [normalize_genre(g) for g in record.get('genres', [])] or ['Pop']
+    song = Song.from_record(record, key, genres=genres)
+    all_songs_path_map[_normalize_path(song.path)] = song
+    return song
+
+def _enqueue_new_song(song):
+    """
+    Puts a newly found song in its JSON playlist, or at a random spot in the
+    default rotation. Returns True if it went to the default rotation
+    (i.e. it is still free to pick). Caller holds player.queue_lock.
+    """
+    name = os.path.basename(song.path)
+    if name in special_playlist_order:
+        player.Special_playlist.insert_before(
+            _playlist_successor(player.Special_playlist, song, special_playlist_order), song)
+        return False
+    if name in primary_playlist_order:
+        player.primary_playlist.insert_before(
+            _playlist_successor(player.primary_playlist, song, primary_playlist_order), song)
+        return False
+    # Random insertion keeps the default rotation uniformly shuffled as it grows
+    player.default_playlist.insert_random(song)
+    return True
+
+def add_scanned_songs(records):
+    """
+    Adds one batch from the streaming library scan. Songs are keyed in scan
+    order, slotted into their JSON playlist (or a random spot in the default
+    rotation), and appended to the GUI without rebuilding what is shown.
+    """
+    songs = [prepare_song(record) for record in records]
+    all_songs_list.extend(songs)
+
+    new_artists = set()
+    with player.queue_lock:
+        for song in songs:
+            if _enqueue_new_song(song):
+                new_artists.update(song.artists)
+    player.notify_queue_changed()
+
+    if gui:
+        if not new_artists <= available_artists:
+            available_artists.update(new_artists)
+            gui.populate_artists(sorted(available_artists))
+        gui.add_songs(songs)
+        gui.update_upcoming_songs(get_upcoming_songs_for_display())
+
+def load_library_from_snapshot(snapshot):
+    """
+    Fills the library, playlists and artist list from a startup snapshot in
+    one go. Song buttons are added in batches over the next few frames so
+    the window shows up straight away even for a huge library.
+    """
+    global all_songs_list, next_song_key
+    all_songs_list = list(snapshot.songs)
+    for song in all_songs_list:
+        all_songs_path_map[_normalize_path(song.path)] = song
+    next_song_key = max((s.key for s in all_songs_list), default=-1) + 1
+
+    default = list(snapshot.playlists.get('default', ()))
+    random.shuffle(default)
+    with player.queue_lock:
+        player.primary_playlist = SongQueue(snapshot.playlists.get('primary', ()))
+        player.Special_playlist = SongQueue(snapshot.playlists.get('special', ()))
+        player.default_playlist = SongQueue(default)
+    player.notify_queue_changed()
+    available_artists.update(snapshot.artists)
+    # Covers added since the thumbnails were last rendered (or a cleared cache)
+    build_thumbnails_in_background(all_songs_list)
+
+    if gui:
+        gui.populate_artists(sorted(available_artists))
+        for start in range(0, len(all_songs_list), SNAPSHOT_GUI_BATCH):
+            batch = all_songs_list[start:start + SNAPSHOT_GUI_BATCH]
+            Clock.schedule_once(lambda dt, b=batch: gui.add_songs(b))
+        gui.update_upcoming_songs(get_upcoming_songs_for_display())
+    print(f"[Snapshot] Loaded {len(all_songs_list)} songs without scanning")
+
+def _snapshot_playlists(songs):
+    """The JSON playlists and default rotation as a fresh start would build them from `songs`."""
+    def in_order(order, songs):
+        return sorted((s for s in songs if os.path.basename(s.path) in order),
+                      key=lambda s: order[os.path.basename(s.path)])
+    special = in_order(special_playlist_order, songs)
+    primary = in_order(primary_playlist_order,
+                       [s for s in songs if os.path.basename(s.path) not in special_playlist_order])
+    queued = set(special) | set(primary)
+    return {'primary': primary, 'special': special, 'default': [s for s in songs if s not in queued]}
+
+def save_library_snapshot():
+    """Writes the current library to the startup snapshot on a background thread."""
+    if snapshot_path is None:
+        return None
+    songs = list(all_songs_list)
+    playlists = _snapshot_playlists(songs)
+    artists = sorted({a for s in playlists['default'] for a in s.artists})
+    path = snapshot_path
+
+    def worker():
+        # Anything added after `songs` was taken shows up as a watcher change on the next start
+        try:
+            validators = snapshot_validators(
+                MUSIC_DIR, [os.path.join(PLAYLISTS_DIR, name) for name in PLAYLIST_FILES])
+            write_snapshot(path, songs, playlists, artists, validators)
+        except OSError as e:
+            print(f"[Snapshot] Could not write {path}: {e}")
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
+
+def scan_library_in_background(cache, workers=None, use_processes=False, on_done=None):
+    """Streams the library scan on a worker thread, handing each batch to the UI thread."""
+    def worker():
+        timings = {}
+        records = []
+        for batch in iter_mp3_files_with_metadata(MUSIC_DIR, cache=cache, workers=workers,
+                                                  use_processes=use_processes, timings=timings):
+            records.extend(batch)
+            Clock.schedule_once(lambda dt, b=batch: add_scanned_songs(b))
+        print(cache.summary())
+        print(format_scan_timings(timings))
+        if on_done:
+            Clock.schedule_once(lambda dt: on_done())
+        # Render now-playing thumbnails for any new covers
+        build_thumbnails(records)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
+
+def analyze_library_in_background(workers=None, on_done=None):
+    """Runs the audio analyzer next to the app and hands each song's results to the player as they arrive."""
+    global analysis_process
+    # Songs analyzed on a previous run come straight back from the cache
+    analysis_process = run_analysis_process(MUSIC_DIR, LIBRARY_CACHE_PATH, workers=workers)
+
+    def reader(proc):
+        for path, data in read_analysis_results(proc.stdout):
+            player.set_track_analysis(path, data)
+        print(player.duplicates.summary())
+        if proc.wait() == 0 and on_done:
+            Clock.schedule_once(lambda dt: on_done())
+
+    thread = threading.Thread(target=reader, args=(analysis_process,), daemon=True)
+    thread.start()
+    return thread
+
+def reorder_default_playlist():
+    """Reorders the default playlist so tempo and key change gradually from song to song."""
+    with player.queue_lock:
+        player.default_playlist = SongQueue(smooth_order(list(player.default_playlist), player.track_analysis))
+    print(f"[Analysis] Reordered {len(player.default_playlist)} songs for smooth transitions")
+    if gui:
+        gui.update_upcoming_songs(get_upcoming_songs_for_display())
+
+def get_available_artists():
+    """Sorted artists that still have at least one song that can be picked."""
+    # First, determine which song titles are currently unavailable.
+    played_titles = player.played_songs
+    primary_queued_titles = {song.title for song in player.primary_playlist}
+    special_queued_titles = {song.title for song in player.Special_playlist}
+    unavailable_titles = played_titles.union(primary_queued_titles, special_queued_titles)
+
+    # Keep artists with at least one available song in a single pass over the library.
+    available_artists = set()
+    for song in all_songs_list:
+        if song.title not in unavailable_titles:
+            available_artists.update(song.artists)
+    return sorted(available_artists)
+
+def on_library_changes(added, modified, removed):
+    """Watcher callback (background thread): parse changed files, then apply on the UI thread."""
+    records = load_songs(added + modified, cache=library_cache)
+    if library_cache is not None:
+        library_cache.remove(removed)
+        library_cache.commit()
+    if analysis_enabled and player is not None:
+        analyze_library(added + modified, cache=library_cache, workers=1,
+                        on_result=player.set_track_analysis)
+    print(f"[Watcher] {len(added)} added, {len(modified)} changed, {len(removed)} removed")
+    Clock.schedule_once(lambda dt: apply_library_changes(records, removed))
+
+def apply_library_changes(records, removed_paths):
+    """
+    Applies one debounced batch of library changes to the song list, the
+    player's playlists and the GUI, rebuilding the song list only once.
+    """
+    global all_songs_list
+
+    # Songs deleted from disk disappear from the library and every queue
+    removed = [all_songs_path_map.pop(_normalize_path(p)) for p in removed_paths
+               if _normalize_path(p) in all_songs_path_map]
+    if removed:
+        removed = set(removed)
+        all_songs_list = [s for s in all_songs_list if s not in removed]
+        for song in removed:
+            player.duplicates.remove(song.path)
+        with player.queue_lock:
+            for playlist in (player.primary_playlist, player.default_playlist, player.Special_playlist):
+                for song in removed:
+                    playlist.discard(song)
+
+    for record in records:
+        old = all_songs_path_map.get(_normalize_path(record['path']))
+        if old is not None:
+            # Changed file: swap the new record in wherever the old one was
+            song = prepare_song(record, key=old.key)
+            all_songs_list = [song if s is old else s for s in all_songs_list]
+            with player.queue_lock:
+                for playlist in (player.primary_playlist, player.default_playlist, player.Special_playlist):
+                    playlist.replace(old, song)
+            continue
+
+        song = prepare_song(record)
+        all_songs_list.append(song)
+        with player.queue_lock:
+            _enqueue_new_song(song)
+    player.notify_queue_changed()
+    if records:
+        build_thumbnails_in_background(records)
+
+    if gui:
+        gui.all_songs = all_songs_list
+        available_artists.clear()
+        available_artists.update(get_available_artists())
+        gui.populate_artists(sorted(available_artists))
+        gui.display_songs()
+        gui.update_upcoming_songs(get_upcoming_songs_for_display())
+    save_library_snapshot()
 
 class JukeboxKivyApp(App):
-    def __init__(self, no_test=False, no_ambient=False, **kwargs):
+    def __init__(self, no_test=False, no_ambient=False, rescan=False,
+                 scan_workers=None, scan_processes=False, watch=True,
+                 analyze=True, analysis_workers=None, smooth_transitions=False,
+                 sound_cache_mb=None, crossfade_curve=None, gapless_playlists=(), **kwargs):
         # Let Kivy initialize normally with its own kwargs
         super().__init__(**kwargs)
         # Store our custom flags
         self.no_test = no_test
         self.no_ambient = no_ambient
+        self.rescan = rescan
+        self.scan_workers = scan_workers
+        self.scan_processes = scan_processes
+        self.watch = watch
+        self.analyze = analyze
+        self.analysis_workers = analysis_workers
+        self.smooth_transitions = smooth_transitions
+        self.sound_cache_mb = sound_cache_mb
+        self.crossfade_curve = crossfade_curve
+        self.gapless_playlists = gapless_playlists or ()
 
     def build(self):
-        global gui, player, all_songs_list, all_songs_path_map
-        
-        # 1. Load all songs from disk and process metadata
-        all_songs_list = get_all_mp3_files_with_metadata(MUSIC_DIR)
-        for idx, song in enumerate(all_songs_list):
-            song['key'] = idx
-            song['genres'] = [normalize_genre(g) for g in song.get('genres', [])] or ['Pop']
-            all_songs_path_map[song['path'].replace("\\", "/")] = song
-
-        # 2. Load playlists and map filenames to song objects
-        special_playlist_filenames = load_song_filenames_from_json('Special_playlist.json')
-        songs_from_special_json = map_filenames_to_song_objects(special_playlist_filenames, all_songs_path_map)
-        for s in songs_from_special_json:  # Ensure correct genre tagging
-            s['genres'] = ['Special']
-        
-        default_playlist_filenames = load_song_filenames_from_json('default_playlist.json')
-        initial_primary_queue_songs = map_filenames_to_song_objects(default_playlist_filenames, all_songs_path_map)
-
-        # 3. Initialize the player with the loaded playlists
+        global gui, player, library_cache, snapshot_path
+        global special_playlist_order, primary_playlist_order
+
+        # 1. Load playlist files; songs are matched to them as the scan finds them
+        special_filenames = load_song_filenames_from_json(PLAYLIST_FILES[0])
+        special_playlist_order = _playlist_order(special_filenames)
+        primary_playlist_order = _playlist_order(load_song_filenames_from_json(PLAYLIST_FILES[1]))
+
+        # 2. Initialize the player with empty playlists
         player = JukeboxPlayer(
             gui_update_now_playing=lambda song_data: gui.update_now_playing(song_data) if gui else None,
             update_upcoming_songs_callback=lambda: gui.update_upcoming_songs(get_upcoming_songs_for_display()) if gui else None,
             start_playback_callback=start_playback_thread
         )
-        player.Special_playlist = list(songs_from_special_json)
-        player.primary_playlist = list(initial_primary_queue_songs)
-        
-        # Create the default/fallback playlist from all remaining songs
-        played_paths = {s['path'] for s in player.Special_playlist + player.primary_playlist}
-        player.default_playlist = [s for s in all_songs_list if s['path'] not in played_paths]
-        random.shuffle(player.default_playlist)
-
-        # 4. Initialize the GUI and link it to the player and song data
+        if self.sound_cache_mb is not None:
+            player.sound_cache.budget_bytes = self.sound_cache_mb * 1024 * 1024
+        if self.crossfade_curve is not None:
+            player.crossfade_curve = self.crossfade_curve
+        for name in self.gapless_playlists:
+            player.set_playlist_transition(name, GAPLESS)
+        scheduler = load_slot_rules()
+        if scheduler is not None:
+            player.scheduler = scheduler
+        if os.path.exists(os.path.join(PLAYLISTS_DIR, GAPLESS_PAIRS_FILE)):
+            for from_file, to_file in load_song_filenames_from_json(GAPLESS_PAIRS_FILE):
+                player.set_pair_transition(from_file, to_file, GAPLESS)
+
+        # 3. Initialize the GUI and link it to the player and song data
         gui = JukeboxGUI(
-            all_songs=all_songs_list,
+            all_songs=[],
             player=player,
             select_song_cb=select_song,
             dance_cb=lambda: [player.play_special_song(), start_playback_thread()],
@@ -273,46 +528,71 @@ class JukeboxKivyApp(App):
             play_ambient_cb=None if self.no_ambient else start_ambient_music,
             stop_ambient_cb=None if self.no_ambient else stop_ambient_music,
         )
-        
-        # --- Populate GUI filters with available artists and genres ---
-        
-        # First, determine which song titles are currently unavailable.
-        played_titles = player.played_songs
-        primary_queued_titles = {song['title'] for song in player.primary_playlist}
-        special_queued_titles = {song['title'] for song in player.Special_playlist}
-        unavailable_titles = played_titles.union(primary_queued_titles, special_queued_titles)
-
-        # Get all unique artists from the entire library.
-        all_artists_in_library = set()
-        for song in all_songs_list:
-            all_artists_in_library.update(song.get('artists', []))
-
-        # Now, filter this list to include only artists with at least one available song.
-        available_artists = []
-        for artist in all_artists_in_library:
-            has_available_song = any(
-                song['title'] not in unavailable_titles
-                for song in all_songs_list if artist in song.get('artists', [])
-            )
-            if has_available_song:
-                available_artists.append(artist)
-        
-        # Populate the GUI with the filtered list of artists and all main genres.
-        gui.populate_artists(sorted(available_artists))
+        gui.populate_artists([])
         gui.populate_genres(MAIN_GENRES)
-
-        # 5. Perform initial GUI updates
-        gui.display_songs()
-        gui.update_upcoming_songs(get_upcoming_songs_for_display())
+        gui.update_upcoming_songs([])
+        Clock.schedule_interval(lambda dt: gui.update_upcoming_songs(get_upcoming_songs_for_display()),
+                                UPCOMING_REFRESH_SECONDS)
+
+        # 4. If no folder or playlist changed since last time, the whole library
+        # comes from the snapshot. Otherwise stream songs from disk (unchanged
+        # files come from the cache); the window fills in batch by batch
+        library_cache = MetadataCache(LIBRARY_CACHE_PATH, rescan=self.rescan)
+        snapshot_path = LIBRARY_SNAPSHOT_PATH
+        snapshot = None if self.rescan else load_snapshot(snapshot_path)
+        if snapshot is not None:
+            load_library_from_snapshot(snapshot)
+            Clock.schedule_once(lambda dt: self._on_library_loaded(snapshot.signatures))
+        else:
+            scan_library_in_background(library_cache, workers=self.scan_workers,
+                                       use_processes=self.scan_processes,
+                                       on_done=self._on_library_loaded)
 
         return RootWidget(gui)
 
+    def _on_library_loaded(self, file_signatures=None):
+        global library_watcher, analysis_enabled
+        # A fresh scan is saved for next time; a snapshot load is already current
+        if file_signatures is None:
+            save_library_snapshot()
+        # 5. Pick up songs copied into (or deleted from) the music folder while
+        # running. Starting from the snapshot's signatures also catches files
+        # edited in place since it was written.
+        if self.watch:
+            library_watcher = LibraryWatcher(MUSIC_DIR, on_library_changes)
+            library_watcher.start(initial_snapshot=file_signatures)
+        # 6. Level-match songs: analyze loudness of anything not yet in the cache
+        if self.analyze:
+            analysis_enabled = True
+            analyze_library_in_background(workers=self.analysis_workers,
+                                          on_done=reorder_default_playlist if self.smooth_transitions else None)
+
+    def on_stop(self):
+        if player:
+            print(player.gap_summary())
+            print(player.prefetcher.summary())
+            print(player.sound_cache.summary())
+        if analysis_process and analysis_process.poll() is None:
+            analysis_process.terminate()
+        if library_watcher:
+            library_watcher.stop()
+        if library_cache:
+            library_cache.close()
+
 if __name__ == "__main__":
     """
     python main.py                          # run normally
     python main.py -- --NoTest                 # hide only Test button
     python main.py -- --NoAmbient              # hide Ambient buttons
     python main.py -- --NoButtons              # hide BOTH Test + Ambient buttons
+    python main.py -- --rescan                 # ignore the metadata cache and snapshot, re-read every tag
+    python main.py -- --ScanWorkers 8          # parse tags on 8 threads (add --ScanProcesses for processes)
+    python main.py -- --NoWatch                # don't watch mp3/ for songs added while running
+    python main.py -- --NoAnalysis             # skip loudness analysis (play everything at full volume)
+    python main.py -- --SmoothOrder            # order the default playlist by tempo/key once analyzed
+    python main.py -- --SoundCacheMB 128       # memory for decoded crossfade/ambient audio
+    python main.py -- --CrossfadeCurve linear  # fade shape between songs (default equal_power)
+    python main.py -- --Gapless special        # join songs from these playlists without a gap or fade
     """
 
     import argparse
@@ -325,6 +605,28 @@ if __name__ == "__main__":
                         help="Hide Ambient Music buttons")
     parser.add_argument("--NoButtons", action="store_true",
                         help="Hide ALL extra buttons (same as NoTest + NoAmbient)")
+    parser.add_argument("--Rescan", "--rescan", action="store_true",
+                        help="Discard the metadata cache and library snapshot and re-read every MP3's tags")
+    parser.add_argument("--ScanWorkers", type=int, default=None,
+                        help="Number of parallel workers used to parse MP3 tags")
+    parser.add_argument("--ScanProcesses", action="store_true",
+                        help="Use a process pool instead of threads for --ScanWorkers")
+    parser.add_argument("--NoWatch", action="store_true",
+                        help="Don't watch the mp3 folder for added/removed songs")
+
+    parser.add_argument("--NoAnalysis", action="store_true",
+                        help="Don't analyze loudness or normalize song volumes")
+    parser.add_argument("--AnalysisWorkers", type=int, default=None,
+                        help="Number of processes used for audio analysis")
+    parser.add_argument("--SmoothOrder", action="store_true",
+                        help="Reorder the default playlist to minimise tempo/key jumps once analysis is done")
+    parser.add_argument("--SoundCacheMB", type=int, default=None,
+                        help="Memory budget in MB for decoded crossfade/ambient/test audio (default 256)")
+    parser.add_argument("--CrossfadeCurve", choices=CURVES, default=None,
+                        help="Shape of the crossfade between songs (default equal_power)")
+    parser.add_argument("--Gapless", nargs="+", choices=PLAYLIST_NAMES, default=(),
+                        help="Playlists whose songs follow the previous one gaplessly instead of crossfading "
+                             "(pairs of files can also be listed in playlists/gapless_pairs.json)")
 
     args = parser.parse_args()
 
@@ -338,5 +640,15 @@ if __name__ == "__main__":
     # pass flags into the app
     JukeboxKivyApp(
         no_test=args.NoTest,
-        no_ambient=args.NoAmbient
+        no_ambient=args.NoAmbient,
+        rescan=args.Rescan,
+        scan_workers=args.ScanWorkers,
+        scan_processes=args.ScanProcesses,
+        watch=not args.NoWatch,
+        analyze=not args.NoAnalysis,
+        analysis_workers=args.AnalysisWorkers,
+        smooth_transitions=args.SmoothOrder,
+        sound_cache_mb=args.SoundCacheMB,
+        crossfade_curve=args.CrossfadeCurve,
+        gapless_playlists=args.Gapless
     ).run()
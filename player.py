@@ -5,13 +5,49 @@ import pygame
 from kivy.clock import Clock
 import threading
 import time
+from collections import deque
 from mutagen import File as MutagenFile  # for duration lookup
-import random  # NEW
+import numpy as np
+from ambient_index import AmbientIndex
+from audio_analysis import gain_to_volume
+from fingerprint_index import FingerprintIndex
+from prefetch import TrackPrefetcher
+from song_queue import SongQueue, song_key
+from slot_scheduler import PLAYLIST_NAMES, SlotScheduler
+from sound_cache import DecodedAudioCache
+from channel_stream import ArraySource, ChannelStream, DecoderSource, CHUNK_SECONDS, PCM_FORMATS
+from crossfade_mixer import DEFAULT_CURVE, fade_gains, mix_overlap, render
 
 pygame.mixer.init()
 CROSSFADE_CHANNEL_IDX = 1
 AMBIENT_CHANNEL_IDX = 2  # NEW
 TEST_CHANNEL_IDX = 3
+MIN_CUE_IN = 0.1  # don't bother seeking past less leading silence than this
+
+# Playback threads sleep until something is due instead of polling get_busy().
+# The mixer can only post end events to pygame's own event queue (which Kivy
+# owns), so track ends are timed from the known duration: sleep until just
+# before the song should finish, then check every END_CHECK until it has.
+END_MARGIN = 0.5    # seconds before the expected end to start checking closely
+END_CHECK = 0.01    # how often to check in that last stretch
+MAX_WAIT = 0.5      # longest sleep otherwise (catches tracks shorter than their tag says)
+GAP_HISTORY = 100   # song-to-song gaps kept for gap_summary()
+BLOCK_SLACK = 0.05  # look this long after a channel block should have ended, to queue the next
+
+FADE_IN_SECONDS = 2.0  # fade-in for a song that starts on its own (not crossfaded into)
+AMBIENT_CROSSFADE_SECONDS = 6.0  # overlap between one ambient track and the next
+
+# How one song leads into the next. 'gapless' plays the next song's first
+# sample straight after the last sample of the current one (DJ mixes, live
+# albums); it is chosen per playlist or for a specific pair of files.
+CROSSFADE = 'crossfade'
+GAPLESS = 'gapless'
+TRANSITIONS = (CROSSFADE, GAPLESS)
+
+UPCOMING_DEPTH = 10  # songs shown in the GUI's upcoming list
+
+FIRST_DANCE_PATH = 'First Dance Song.mp3'
+
 pygame.mixer.set_num_channels(max(8, CROSSFADE_CHANNEL_IDX + 1, AMBIENT_CHANNEL_IDX + 1, TEST_CHANNEL_IDX + 1))
 
 def _fmt_mmss(seconds):
@@ -24,6 +60,11 @@ def _fmt_mmss(seconds):
 def _fmt_clock(ts):
     return time.strftime("%H:%M:%S", time.localtime(ts))
 
+def _sound_bytes(sound):
+    """Bytes of PCM held by a decoded pygame Sound, in the mixer's format."""
+    freq, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * freq) * (abs(size) // 8) * channels
+
 def _get_duration_seconds(path):
     try:
         mf = MutagenFile(path)
@@ -38,7 +79,106 @@ def _get_duration_seconds(path):
     except Exception:
         return None
 
+class _Wakeup:
+    """
+    Condition variable the playback threads sleep on. Anything that should
+    make them look again (a skip, a queue change, ambient stop) calls
+    notify(). The generation counter means a notify that lands between a
+    waiter's check and its wait is never lost.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.generation = 0
+
+    def notify(self):
+        with self._cond:
+            self.generation += 1
+            self._cond.notify_all()
+
+    def wait(self, generation, timeout):
+        """Sleep up to `timeout` seconds unless notify() was called since `generation` was read."""
+        with self._cond:
+            if self.generation == generation:
+                self._cond.wait(timeout)
+
+
+def _next_check(wake_ts=None, end_ts=None):
+    """
+    Seconds to sleep before looking again, given a wake-up time and an
+    expected track end. A wake-up time that has already passed (e.g. a
+    mix-out point with nothing queued yet) no longer shortens the sleep:
+    whatever the waiter is waiting for will come with a notify().
+    """
+    now = time.time()
+    timeout = MAX_WAIT
+    if wake_ts is not None and wake_ts > now:
+        timeout = min(timeout, wake_ts - now)
+    if end_ts is not None:
+        until_end = end_ts - now
+        timeout = min(timeout, END_CHECK if until_end <= END_MARGIN else until_end - END_MARGIN)
+    return max(timeout, 0.001)
+
+
+class _ChannelTrack:
+    """A song being fed to the crossfade channel. Positions are in frames from the start of the file."""
+    __slots__ = ('song', 'sound', 'source', 'start', 'volume', 'mix_out', 'fade_in')
+
+    def __init__(self, song, sound, source, volume, mix_out, fade_in=0):
+        self.song = song
+        self.sound = sound  # keeps the decoded samples alive while `source` reads them
+        self.source = source
+        self.start = source.pos
+        self.volume = volume
+        self.mix_out = mix_out  # where the next song starts mixing in (None: play to the end)
+        self.fade_in = fade_in
+
+
+class _AmbientRun:
+    """One start-to-stop run of ambient music: where its tracks come from, its stop event and its pinned tracks."""
+    __slots__ = ('index', 'stop', 'pinned')
+
+    def __init__(self, index, stop):
+        self.index = index
+        self.stop = stop
+        self.pinned = ()  # the playing and next track, kept decoded in the sound cache
+
+
+class _Projection:
+    """Where the upcoming-song simulation got to, so a deeper window can carry on from there."""
+    __slots__ = ('key', 'queues', 'songs', 'offsets', 'seen', 'iters', 'taken', 'counter', 'start', 'ts',
+                 'history', 'done')
+
+    def __init__(self, key, queues, counter, ts, history):
+        self.key = key
+        self.queues = queues  # name -> SongQueue (held so their ids in `key` stay unique)
+        self.songs = []
+        self.offsets = []  # seconds from `start` until each song in `songs` starts
+        self.seen = set()
+        self.iters = {name: iter(q) for name, q in queues.items()}
+        self.taken = dict.fromkeys(queues, 0)
+        self.counter = counter
+        self.start = ts
+        self.ts = ts            # estimated start of the next simulated slot
+        self.history = history  # the scheduler's max_per_hour history, simulated songs included
+        self.done = False
+
+
+def _queue_property(attr):
+    """A playlist attribute that is always a SongQueue; assigning a list of songs converts it."""
+    def get(self):
+        return getattr(self, attr)
+
+    def set(self, songs):
+        setattr(self, attr, songs if isinstance(songs, SongQueue) else SongQueue(songs))
+    return property(get, set)
+
+
 class JukeboxPlayer:
+    default_playlist = _queue_property('_default_queue')
+    Special_playlist = _queue_property('_special_queue')
+    primary_playlist = _queue_property('_primary_queue')
+
     def __init__(self, gui_update_now_playing, update_upcoming_songs_callback, start_playback_callback=None):
         self.update_now_playing = gui_update_now_playing
         self.update_upcoming_songs = update_upcoming_songs_callback
@@ -49,6 +189,7 @@ class JukeboxPlayer:
         self.primary_playlist = []
         
         self.played_songs = set()
+        self.played_paths = set()
         self.selected_songs = set()
 
         self.current_song = None
@@ -59,6 +200,10 @@ class JukeboxPlayer:
 
         # NEW: protects access to the 3 playlists and song_counter
         self.queue_lock = threading.Lock()
+        self._projection = None  # cached upcoming_songs() simulation
+        # Which playlist each song slot comes from (every 5th song is Special by default)
+        self.scheduler = SlotScheduler()
+        self.projection_builds = 0
         
         self.immediate_playback = False
         self.immediate_lock = threading.Lock()
@@ -68,11 +213,219 @@ class JukeboxPlayer:
         self.crossfade_lock = threading.Lock()
         self.crossfade_active = False
         self.crossfade_duration = 5.0  # seconds
-        self.crossfade_thread = None
+        self._mix_out_ts = None  # when the playing song should start fading out (see _set_mix_out)
+        self.crossfade_curve = DEFAULT_CURVE  # see crossfade_mixer.CURVES
+        # Transition into a song, by the playlist it comes from, and overrides
+        # for specific (from file, to file) pairs by base name
+        self.playlist_transitions = dict.fromkeys(PLAYLIST_NAMES, CROSSFADE)
+        self.pair_transitions = {}
+        self.skip_silence = True
+
+        # Wakes the playback threads (see _wait); song-to-song gaps in ms
+        self._wakeup = _Wakeup()
+        self._ended_at = None  # monotonic time the last song was last heard playing
+        self.gaps_ms = deque(maxlen=GAP_HISTORY)
+
+        # Decoded sounds shared by the crossfade, ambient and test channels
+        self.sound_cache = DecodedAudioCache(lambda path: pygame.mixer.Sound(path), _sound_bytes)
+
+        # Channel songs (crossfade, ambient, test) are fed to the mixer block by
+        # block, streamed through ffmpeg when it's installed so memory doesn't
+        # grow with track length; otherwise read from decoded sounds
+        self.stream_decode = DecoderSource.available()
+        self._deck = ChannelStream(self._crossfade_channel(), pygame.sndarray.make_sound,
+                                   pygame.mixer.get_init()[0])
+
+        # The next channel song is decoded in the background while the current one plays
+        self.prefetcher = TrackPrefetcher(self._load_crossfade_sound)
 
         # NEW: Ambient playback state
         self.ambient_thread = None
-        self.ambient_stop_event = threading.Event()        
+        self.ambient_stop_event = threading.Event()
+        # Feeding the ambient channel and stopping it exclude each other, so
+        # nothing is fed after a stop (see stop_ambient_music)
+        self._ambient_lock = threading.Lock()
+        self._ambient_indexes = {}  # folder -> AmbientIndex, kept between starts
+        self.ambient_crossfade = AMBIENT_CROSSFADE_SECONDS
+        # The next ambient track is decoded while the current one plays
+        self.ambient_prefetcher = TrackPrefetcher(self._load_crossfade_sound)
+
+        # Durations probed for hand-built songs that never went through the scan
+        self._probed_durations = {}
+
+        # Loudness normalization: path -> analysis dict (see audio_analysis)
+        self.track_analysis = {}
+        self.analysis_version = 0  # bumped by set_track_analysis, for the upcoming-song projection
+        self.normalize_volume = True
+        # Same recording stored under several names, matched by fingerprint
+        self.duplicates = FingerprintIndex()
+
+    def _song_duration(self, song):
+        """
+        Length of `song` in seconds. Scanned songs carry it from the library
+        scan, so this does no file I/O; anything else is probed once per path.
+        """
+        duration = song.get('duration')
+        if duration:
+            return duration
+        path = song.get('path')
+        if path not in self._probed_durations:
+            self._probed_durations[path] = _get_duration_seconds(path)
+        return self._probed_durations[path]
+
+    def set_track_analysis(self, path, data):
+        self.track_analysis[path] = data
+        with self.queue_lock:
+            self.analysis_version += 1  # cue points move the upcoming songs' start times
+        if data.get('fingerprint'):
+            self.duplicates.add(path, data['fingerprint'])
+
+    def hidden_duplicate_paths(self):
+        """Paths of songs that are copies of something already played or queued."""
+        with self.queue_lock:
+            queued = [s.get('path') for playlist in (self.primary_playlist, self.Special_playlist) for s in playlist]
+        return self.duplicates.duplicates_of_any(self.played_paths.union(queued))
+
+    def _track_volume(self, song):
+        """Playback volume for `song` with its analyzed gain applied (1.0 if unknown)."""
+        if not self.normalize_volume:
+            return 1.0
+        data = self.track_analysis.get(song.get('path'))
+        return gain_to_volume(data.get('gain_db')) if data else 1.0
+
+    def notify_queue_changed(self):
+        """Call after changing a playlist so an idle playback loop looks again."""
+        self._wakeup.notify()
+        if self.current_song is not None:
+            self._prefetch_next()
+
+    def _prefetch_next(self):
+        """
+        Point the prefetcher at the next song if it will be played from a
+        decoded sound: crossfaded into the current song at its mix-out point,
+        queued gaplessly behind it, or started on the crossfade channel itself. A song that will be
+        streamed with mixer.music isn't decoded.
+        """
+        if self._streams():
+            self.prefetcher.request(None)  # nothing to decode ahead: the decoder starts in milliseconds
+            return
+        nxt, playlist = self._peek_next()
+        follows = self._mix_out_ts is not None or (
+            self.current_song is not None and nxt is not None
+            and self._transition(self.current_song, nxt, playlist) == GAPLESS)
+        if nxt is not None and (follows or self._uses_channel(nxt)):
+            self.prefetcher.request(nxt)
+        else:
+            self.prefetcher.request(None)
+
+    def _load_crossfade_sound(self, song):
+        """Decoded sound for `song` (shared through the sound cache, never copied)."""
+        return self.sound_cache.get(song['path'])
+
+    def _streams(self):
+        """True if channel songs are streamed through the decoder instead of decoded whole."""
+        return self.stream_decode and pygame.mixer.get_init()[1] in PCM_FORMATS
+
+    def _decoder(self, path, start=0, duration=None):
+        """DecoderSource for `path` from frame `start`, in the mixer's sample format."""
+        rate, size, channels = pygame.mixer.get_init()
+        return DecoderSource(path, rate, channels, size, start, int(duration * rate) if duration else None)
+
+    def _file_source(self, path, duration=None):
+        """(source, sound) to play `path` from the start; sound is None when streamed."""
+        if self._streams():
+            return self._decoder(path, 0, duration), None
+        sound = self.sound_cache.get(path)
+        return ArraySource(pygame.sndarray.samples(sound)), sound
+
+    def _play_file(self, channel, path, duration=None, stop=None):
+        """
+        Play `path` on `channel` block by block (see ChannelStream) until it
+        ends or `stop` is set. Streamed, only the blocks in the channel and
+        the one being decoded are in memory.
+        """
+        source, sound = self._file_source(path, duration)  # `sound` keeps decoded samples alive
+        stream = ChannelStream(channel, pygame.sndarray.make_sound, pygame.mixer.get_init()[0])
+        stopped = stop.is_set if stop is not None else (lambda: False)
+        done = False
+        try:
+            while not stopped():
+                while not done and stream.room():
+                    frames = source.read(int(stream.rate * CHUNK_SECONDS))
+                    if len(frames):
+                        stream.feed(frames)
+                    else:
+                        done = True
+                if done and not stream.busy():
+                    break
+                due = stream.next_due()
+                if done:
+                    self._wait(lambda: stopped() or not stream.busy(), end_ts=due)
+                else:
+                    self._wait(lambda: stopped() or stream.room(), wake_ts=due and due + BLOCK_SLACK)
+        finally:
+            source.close()
+            if stopped():
+                stream.stop()
+
+    # -------- WAITING --------
+    def _wait(self, done, wake_ts=None, end_ts=None):
+        """
+        Sleep until done() is true. It is checked again whenever the player is
+        notified, at `wake_ts`, closely around `end_ts` (when the playing track
+        should finish), and at least every MAX_WAIT. Times are time.time().
+        """
+        while True:
+            generation = self._wakeup.generation
+            if done():
+                return
+            self._wakeup.wait(generation, _next_check(wake_ts, end_ts))
+
+    def _wait_for_track(self, busy, end_ts, stop=None, measure_gap=False):
+        """
+        Wait while a track plays. Returns 'stopped' if `stop` got set, or
+        'ended' when `busy()` goes false. With `measure_gap`, a natural end
+        is remembered for _record_gap.
+        """
+        result = []
+        last_busy = time.monotonic()
+
+        def done():
+            nonlocal last_busy
+            if stop is not None and stop.is_set():
+                result.append('stopped')
+            elif not busy():
+                result.append('ended')
+                if measure_gap:
+                    self._ended_at = last_busy
+            else:
+                last_busy = time.monotonic()
+            return bool(result)
+
+        self._wait(done, end_ts=end_ts)
+        return result[0]
+
+    def _expected_end(self):
+        """When the current song should finish (time.time()), or None if its length is unknown."""
+        if self.current_start_ts is None or not self.current_duration:
+            return None
+        return self.current_start_ts + self.current_duration
+
+    def _record_gap(self, song):
+        """Log the silence between the last song being heard and `song` starting."""
+        if self._ended_at is None:
+            return
+        gap_ms = (time.monotonic() - self._ended_at) * 1000
+        self._ended_at = None
+        self.gaps_ms.append(gap_ms)
+        title = song.get('title') or os.path.basename(song.get('path', ''))
+        print(f"[Playback] {gap_ms:.0f} ms gap before {title}")
+
+    def gap_summary(self):
+        if not self.gaps_ms:
+            return "[Playback] No song-to-song gaps measured"
+        return (f"[Playback] {len(self.gaps_ms)} gaps: avg {sum(self.gaps_ms) / len(self.gaps_ms):.0f} ms, "
+                f"max {max(self.gaps_ms):.0f} ms")
 
     # -------- PRINT HELPERS --------
     def _print_now_playing(self, song):
@@ -85,16 +438,17 @@ class JukeboxPlayer:
         print(f"Crossfading for {int(self.crossfade_duration)}s "
               f"→ Next: {title} (@ {_fmt_clock(time.time())})")
 
+    def _print_gapless_start(self, next_song):
+        title = next_song.get('title') or os.path.basename(next_song.get('path', ''))
+        print(f"Gapless → Next: {title} (@ {_fmt_clock(time.time())})")
+
     def _print_next_eta(self):
-        nxt = self._get_next_song()
-        if not nxt:
+        timeline = self.upcoming_timeline(1)
+        if not timeline:
             return
-        if self.current_start_ts is None or self.current_duration is None:
-            print(f"Next up (start time unknown): {nxt.get('title') or os.path.basename(nxt.get('path',''))}")
-            return
-        est_start = self.current_start_ts + max(0.0, self.current_duration - self.crossfade_duration)
+        nxt, eta = timeline[0]
         title = nxt.get('title') or os.path.basename(nxt.get('path', ''))
-        print(f"Next up at {_fmt_clock(est_start)}: {title}")
+        print(f"Next up at {_fmt_clock(eta)}: {title}")
 
     # -------- PUBLIC CONTROLS --------
     def play_song_immediately(self, song):
@@ -106,24 +460,26 @@ class JukeboxPlayer:
         pygame.mixer.music.stop()
         try:
             pygame.mixer.music.load(song['path'])
-            pygame.mixer.music.set_volume(1.0)
-            self.current_duration = _get_duration_seconds(song['path'])
+            pygame.mixer.music.set_volume(self._track_volume(song))
+            self.current_duration = self._song_duration(song)
             self.current_start_ts = time.time()
+            self._mix_out_ts = None
             pygame.mixer.music.play(fade_ms=2000)
 
             self.current_song = song
             self._print_now_playing(song)
 
             Clock.schedule_once(lambda dt: self.update_now_playing(song))
-            while pygame.mixer.music.get_busy() and not self.skip_flag.is_set():
-                time.sleep(0.1)
+            self._wait_for_track(pygame.mixer.music.get_busy, self._expected_end(), stop=self.skip_flag)
         except Exception as e:
             print(f"Error playing immediate song '{song.get('title','?')}': {e}")
         finally:
             pygame.mixer.music.stop()
             self.skip_flag.clear()
+            self._ended_at = None
             with self.immediate_lock:
                 self.immediate_playback = False
+            self._wakeup.notify()
             Clock.schedule_once(lambda dt: self.update_now_playing(self.current_song))
             Clock.schedule_once(lambda dt: self.update_upcoming_songs())
 
@@ -137,18 +493,23 @@ class JukeboxPlayer:
                     break
 
                 with self.immediate_lock:
-                    if self.immediate_playback:
-                        time.sleep(0.2)
-                        continue
-                    
-                if (not pygame.mixer.music.get_busy()) and (not self._crossfade_channel().get_busy()):
+                    immediate = self.immediate_playback
+                if immediate:
+                    # The immediate/special song notifies when it's done
+                    self._wait(lambda: not self.immediate_playback)
+                    continue
+
+                if self._ready_for_next():
                     next_song_to_play = self._get_next_song()
                     if next_song_to_play:
                         self._play_or_crossfade(next_song_to_play)
                     else:
-                        time.sleep(0.5)
+                        # Idle until something is queued; waiting isn't a gap
+                        self._ended_at = None
+                        self._wait(lambda: self._get_next_song() is not None)
                 else:
-                    time.sleep(0.1)
+                    # Something is still playing (e.g. a song started elsewhere): look again at its end
+                    self._wait(self._ready_for_next, end_ts=self._expected_end())
             except Exception as e:
                 print(f"FATAL Error in play_songs loop: {e}")
 
@@ -163,59 +524,154 @@ class JukeboxPlayer:
         self._cancel_crossfade_if_any()
         pygame.mixer.music.stop()
         self._crossfade_channel().stop()
+        self._wakeup.notify()
 
     # -------- AMBIENT MUSIC (separate from jukebox queues) --------
     def start_ambient_music(self, folder="ambiant"):
         """
-        Start looping random mp3 files from the given folder on a dedicated
-        mixer channel. This does NOT touch any jukebox playlists.
+        Start playing shuffled mp3 files from the given folder, crossfaded
+        into each other, on a dedicated mixer channel. This does NOT touch
+        any jukebox playlists.
         """
-        # Don't start twice
-        if self.ambient_thread and self.ambient_thread.is_alive():
-            return
-
-        self.ambient_stop_event.clear()
-        self.ambient_thread = threading.Thread(
-            target=self._ambient_loop, args=(folder,), daemon=True
-        )
-        self.ambient_thread.start()
+        with self._ambient_lock:
+            # Don't start twice (a run that is only winding down doesn't count)
+            if self.ambient_thread and self.ambient_thread.is_alive() and not self.ambient_stop_event.is_set():
+                return
+            # Each run gets its own stop event, so a stopped run that is still
+            # finishing a decode can't stop or feed the new one
+            self.ambient_stop_event = threading.Event()
+            self.ambient_thread = threading.Thread(
+                target=self._ambient_loop, args=(folder, self.ambient_stop_event), daemon=True
+            )
+            self.ambient_thread.start()
 
     def stop_ambient_music(self):
-        """Stop any ambient music currently playing."""
-        self.ambient_stop_event.set()
-        try:
-            pygame.mixer.Channel(AMBIENT_CHANNEL_IDX).stop()
-        except Exception:
-            pass
-
-    def _ambient_loop(self, folder):
-        """Internal loop that plays random ambient tracks until stopped."""
-        files = []
-        for root, _, fs in os.walk(folder):
-            for f in fs:
-                if f.lower().endswith(".mp3"):
-                    files.append(os.path.join(root, f))
-
+        """Stop any ambient music currently playing. It goes silent at once, mid-block."""
+        with self._ambient_lock:
+            self.ambient_stop_event.set()
+            try:
+                pygame.mixer.Channel(AMBIENT_CHANNEL_IDX).stop()
+            except Exception:
+                pass
+        self._wakeup.notify()
+
+    def _ambient_index(self, folder):
+        index = self._ambient_indexes.get(folder)
+        if index is None:
+            index = self._ambient_indexes[folder] = AmbientIndex(folder)
+        return index
+
+    def _ambient_loop(self, folder, stop=None):
+        """
+        Internal loop that plays ambient tracks until `stop` is set: shuffled
+        without repeats (see AmbientIndex), each mixed into the next over
+        `ambient_crossfade` seconds, and fed block by block like the
+        crossfade channel. The track after the playing one is decoded in the
+        background (streamed tracks need nothing: the decoder starts in
+        milliseconds).
+        """
+        stop = self.ambient_stop_event if stop is None else stop
+        index = self._ambient_index(folder)
+        files = index.files()
         if not files:
             print(f"[Ambient] No mp3 files found in folder '{folder}'")
             return
 
         ch = pygame.mixer.Channel(AMBIENT_CHANNEL_IDX)
+        stream = ChannelStream(ch, pygame.sndarray.make_sound, pygame.mixer.get_init()[0])
+        run = _AmbientRun(index, stop)
 
-        while not self.ambient_stop_event.is_set():
-            path = random.choice(files)
+        track = None
+        try:
+            track = self._next_ambient_track(run)
+            while not stop.is_set():
+                while track is not None and stream.room():
+                    frames, track = self._next_ambient_block(track, run, stream.rate)
+                    if frames is None or not len(frames):
+                        continue
+                    with self._ambient_lock:
+                        if stop.is_set():
+                            break
+                        stream.feed(frames)
+                if track is None and not stream.busy():
+                    break
+                due = stream.next_due()
+                if track is None:
+                    self._wait(lambda: stop.is_set() or not stream.busy(), end_ts=due)
+                else:
+                    self._wait(lambda: stop.is_set() or stream.room(), wake_ts=due and due + BLOCK_SLACK)
+        except Exception as e:
+            print(f"[Ambient] Error: {e}")
+        finally:
+            if track is not None:
+                track.source.close()
+            with self._ambient_lock:
+                if not stop.is_set():
+                    stream.stop()
+            self.sound_cache.unpin(*run.pinned)
+
+    def _next_ambient_track(self, run):
+        """
+        The next ambient track in shuffle order, opened, with the one after
+        it requested from the prefetcher. Decoded tracks pin just these two
+        in the sound cache, so the budget holds however big the folder is.
+        Unreadable files are skipped; None if nothing could be opened (or
+        ambient was stopped meanwhile).
+        """
+        index = run.index
+        for _ in range(len(index.files())):
+            if run.stop.is_set():
+                return None
+            path = index.next()
+            if path is None:
+                return None
             try:
-                snd = pygame.mixer.Sound(path)
+                song = {'path': path}
+                if self._streams():
+                    source, sound = self._decoder(path, 0, self._song_duration(song)), None
+                else:
+                    sound = self.ambient_prefetcher.take(song)
+                    if sound is None:
+                        sound = self._load_crossfade_sound(song)
+                    source = ArraySource(pygame.sndarray.samples(sound))
             except Exception as e:
                 print(f"[Ambient] Error loading '{path}': {e}")
                 continue
+            if not self._streams():
+                upcoming = index.peek()
+                self.ambient_prefetcher.request({'path': upcoming} if upcoming != path else None)
+                # Pin before unpinning, so a track in both pairs is never released
+                pinned, run.pinned = run.pinned, (path,) if upcoming in (None, path) else (path, upcoming)
+                self.sound_cache.pin(*run.pinned)
+                self.sound_cache.unpin(*pinned)
+            return _ChannelTrack(song, sound, source, 1.0, None)
+        return None
 
-            ch.play(snd)
-            # Wait until this track finishes or stop is requested
-            while ch.get_busy() and not self.ambient_stop_event.is_set():
-                time.sleep(0.1)
-
-        ch.stop()
+    def _next_ambient_block(self, track, run, rate):
+        """
+        The next block to feed for ambient `track`, as (frames, track to
+        read next). The last `ambient_crossfade` seconds of a track are one
+        block, mixed with the start of the next track; a track that ends
+        sooner than expected is followed without an overlap.
+        """
+        source = track.source
+        fade = int(self.ambient_crossfade * rate)
+        if 0 < source.remaining() <= fade:
+            incoming = self._next_ambient_track(run)
+            if incoming is not None:
+                n = source.remaining()
+                frames = mix_overlap(source.read(n), incoming.source.read(n), self.crossfade_curve)
+                source.close()
+                return frames, incoming
+            return source.read(source.remaining()), track  # nothing follows: play it out
+        n = int(rate * CHUNK_SECONDS)
+        if source.remaining() > fade:
+            n = min(n, source.remaining() - fade)  # end the block where the overlap starts
+        frames = source.read(n)
+        if not len(frames):
+            source.close()
+            return None, self._next_ambient_track(run)
+        return frames, track
 
     # -------- TEST MUSIC (separate from jukebox queues) --------
     def play_test_songs(self, songs):
@@ -242,92 +698,184 @@ class JukeboxPlayer:
             if not path:
                 continue
 
+            title = song.get("title") or os.path.basename(path)
+            print(f"[TEST] Playing: {title}")
+
             try:
-                snd = pygame.mixer.Sound(path)
+                # Plays until this test track finishes
+                self._play_file(ch, path, song.get("duration"))
             except Exception as e:
                 print(f"[TEST] Error loading '{path}': {e}")
                 continue
 
-            title = song.get("title") or os.path.basename(path)
-            print(f"[TEST] Playing: {title}")
-
-            ch.play(snd)
-
-            # Wait until this test track finishes
-            while ch.get_busy():
-                time.sleep(0.1)
-
         # When done, stop the test channel and DO NOTHING ELSE.
         ch.stop()
         print("[TEST] Finished 2-song test playback; jukebox NOT resumed.")
 
 
     # -------- CORE LOGIC --------
+    def _queues(self):
+        return {'special': self.Special_playlist, 'primary': self.primary_playlist,
+                'default': self.default_playlist}
+
+    def _next_playlist(self):
+        """(name, list) the next song comes from under the slot rules, or (None, None). Caller holds queue_lock."""
+        queues = self._queues()
+        name = self.scheduler.pick(self.song_counter, lambda n: bool(queues[n]))
+        return (name, queues[name]) if name else (None, None)
+
+    def _next_start_estimate(self):
+        """When (time.time()) the next song should start: the current song's mix-out point or end, or now."""
+        now = time.time()
+        if self.skip_flag.is_set():
+            return now
+        due = self._mix_out_ts if self._mix_out_ts is not None else self._expected_end()
+        return now if due is None else max(now, due)
+
+    def _slot_seconds(self, song):
+        """How long after it starts `song` hands over to the next one: at its mix-out point, else at its end."""
+        mix_out = self._mix_out_point(song)
+        end = mix_out if mix_out is not None else (self._song_duration(song) or 0.0)
+        return max(0.0, end - self._cue_in(song))
+
+    # -------- UPCOMING SONGS --------
+    def upcoming_songs(self, n=UPCOMING_DEPTH):
+        """The next `n` songs in the order the slot rules will play them (see upcoming_timeline)."""
+        return [song for song, _ in self.upcoming_timeline(n)]
+
+    def upcoming_timeline(self, n=UPCOMING_DEPTH):
+        """
+        The next `n` songs in the order the slot rules will play them, as
+        (song, estimated start time) pairs. Start times chain the songs'
+        lengths up to their mix-out points (so crossfade overlaps count)
+        and are kept relative to when the next song is due, so time passing
+        or the current song running long only moves them, without
+        recomputing anything. The projection itself is cached: it is only rebuilt after a playlist
+        changes, song_counter moves, the current song changes or analysis
+        results arrive (and each minute, if rules depend on the time), and a deeper window carries
+        on from where the last one stopped. Either way a call costs O(n),
+        however many songs are queued.
+        """
+        with self.queue_lock:
+            queues = self._queues()
+            scheduler = self.scheduler
+            key = ((self.song_counter, self.current_start_ts, self._mix_out_ts, id(scheduler), scheduler.version,
+                    int(time.time() // 60) if scheduler.timed else None,
+                    # what the songs' lengths up to their mix-out points depend on
+                    self.analysis_version, self.skip_silence, self.crossfade_duration)
+                   + tuple((id(q), q.version) for q in queues.values()))
+            proj = self._projection
+            if proj is None or proj.key != key:
+                proj = self._projection = _Projection(key, queues, self.song_counter, self._next_start_estimate(),
+                                                      scheduler.copy_history())
+                self.projection_builds += 1
+            self._extend_projection(proj, n)
+            anchor = self._next_start_estimate()
+            return [(song, anchor + offset) for song, offset in zip(proj.songs[:n], proj.offsets)]
+
+    def _extend_projection(self, proj, n):
+        """Simulate taking songs off the queues until `proj` has `n` (distinct) songs or they run out."""
+        available = lambda name: proj.taken[name] < len(proj.queues[name])
+        while len(proj.songs) < n and not proj.done:
+            name = self.scheduler.pick(proj.counter, available, proj.ts, proj.history)
+            if name is None:
+                proj.done = True
+                break
+            song = next(proj.iters[name])
+            proj.taken[name] += 1
+            proj.counter += 1
+            self.scheduler.record(name, proj.ts, proj.history)
+            key = song_key(song)
+            if key not in proj.seen:  # a song queued in two playlists is shown once
+                proj.seen.add(key)
+                proj.songs.append(song)
+                proj.offsets.append(proj.ts - proj.start)
+            proj.ts += self._slot_seconds(song)
+
     def _get_next_song(self):
         """Peek the next song WITHOUT removing it (thread-safe)."""
+        return self._peek_next()[0]
+
+    def _peek_next(self):
+        """(next song, name of its playlist) without removing it, or (None, None) (thread-safe)."""
         with self.queue_lock:
-            is_special_slot = (self.song_counter % 5 == 0 and self.song_counter != 0)
-            if is_special_slot and self.Special_playlist:
-                return self.Special_playlist[0]
-            if self.primary_playlist:
-                return self.primary_playlist[0]
-            if self.default_playlist:
-                return self.default_playlist[0]
-            if self.Special_playlist:
-                return self.Special_playlist[0]
-            return None
+            name, playlist = self._next_playlist()
+            return (playlist.first(), name) if playlist else (None, None)
 
     def _pop_next_song(self):
         """Pop and return the next song according to queueing rules (thread-safe)."""
         with self.queue_lock:
-            is_special_slot = (self.song_counter % 5 == 0 and self.song_counter != 0)
-            if is_special_slot and self.Special_playlist:
-                return self.Special_playlist.pop(0)
-            if self.primary_playlist:
-                return self.primary_playlist.pop(0)
-            if self.default_playlist:
-                return self.default_playlist.pop(0)
-            if self.Special_playlist:
-                return self.Special_playlist.pop(0)
-            return None
+            name, playlist = self._next_playlist()
+            if not playlist:
+                return None
+            self.scheduler.record(name)
+            return playlist.popleft()
+
+    # -------- TRANSITIONS --------
+    def set_playlist_transition(self, playlist, mode):
+        """Use `mode` ('crossfade' or 'gapless') for songs coming from `playlist` ('special', 'primary', 'default')."""
+        if playlist not in PLAYLIST_NAMES or mode not in TRANSITIONS:
+            raise ValueError(f"Unknown playlist {playlist!r} or transition {mode!r}")
+        self.playlist_transitions[playlist] = mode
+
+    def set_pair_transition(self, from_file, to_file, mode):
+        """Use `mode` whenever `to_file` directly follows `from_file` (base names, e.g. tracks of a live album)."""
+        if mode not in TRANSITIONS:
+            raise ValueError(f"Unknown transition {mode!r} (expected one of {TRANSITIONS})")
+        self.pair_transitions[(os.path.basename(from_file), os.path.basename(to_file))] = mode
+
+    def _transition(self, from_song, to_song, playlist):
+        """How `from_song` leads into `to_song`, which comes from `playlist`."""
+        pair = (os.path.basename(from_song.get('path', '')), os.path.basename(to_song.get('path', '')))
+        return self.pair_transitions.get(pair) or self.playlist_transitions.get(playlist, CROSSFADE)
+
+    def _may_continue_gapless(self, song):
+        """True if anything could follow `song` without a gap, so it must be played from a decoded sound."""
+        if GAPLESS in self.playlist_transitions.values():
+            return True
+        name = os.path.basename(song.get('path', ''))
+        return any(a == name and mode == GAPLESS for (a, _), mode in self.pair_transitions.items())
 
 
     def _play_or_crossfade(self, song):
         """
-        If something is already on the music channel, crossfade to the new song.
-        Otherwise, just play it immediately on the music channel.
+        Start the next song. Songs with a mix-out point play on the crossfade
+        channel, which then mixes each following song in by itself (see
+        _play_on_channel); anything else is streamed with mixer.music and
+        plays to its end.
         """
         try:
             # Actually consume the head of the queue for playback now
             song = self._pop_next_song() or song
+            self._count_played(song)
+
+            if self._uses_channel(song):
+                try:
+                    track = self._channel_track(song, fade_in=FADE_IN_SECONDS)
+                except Exception as e:
+                    print(f"[Crossfade] Could not load '{song.get('path')}' as a Sound; streaming it: {e}")
+                else:
+                    self._play_on_channel(track)
+                    return
 
-            if pygame.mixer.music.get_busy():
-                # Start crossfade to 'song' in a separate thread
-                if not self.crossfade_active:
-                    self._print_crossfade_start(song)
-                    self.crossfade_thread = threading.Thread(
-                        target=self._crossfade_to, args=(song, self.crossfade_duration), daemon=True
-                    )
-                    self.crossfade_thread.start()
+            # Normal start on the music stream, skipping the song's leading silence
+            cue_in = self._cue_in(song)
+            pygame.mixer.music.load(song['path'])
+            pygame.mixer.music.set_volume(self._track_volume(song))
+            self.current_duration = self._song_duration(song)
+            self.current_start_ts = time.time() - cue_in
+            self._mix_out_ts = None
+            if cue_in:
+                pygame.mixer.music.play(fade_ms=2000, start=cue_in)
             else:
-                # No music playing: normal start
-                pygame.mixer.music.load(song['path'])
-                pygame.mixer.music.set_volume(1.0)
-                self.current_duration = _get_duration_seconds(song['path'])
-                self.current_start_ts = time.time()
                 pygame.mixer.music.play(fade_ms=2000)
+            self._record_gap(song)
+            self._mark_now_playing(song)
+            self._print_now_playing(song)
+            self._prefetch_next()
 
-                self.song_counter += 1
-                self.played_songs.add(song.get('title', song.get('path', '')))
-                self.current_song = song
-
-                self._print_now_playing(song)
-
-                Clock.schedule_once(lambda dt: self.update_now_playing(song))
-                Clock.schedule_once(lambda dt: self.update_upcoming_songs())
-
-                while pygame.mixer.music.get_busy() and not self.skip_flag.is_set():
-                    time.sleep(0.1)
+            self._wait_for_track(pygame.mixer.music.get_busy, self._expected_end(),
+                                 stop=self.skip_flag, measure_gap=True)
         except Exception as e:
             print(f"Error playing song '{song.get('title','?')}': {e}")
         finally:
@@ -335,83 +883,219 @@ class JukeboxPlayer:
                 pygame.mixer.music.stop()
                 self.skip_flag.clear()
 
-    def _crossfade_to(self, next_song, duration):
+    # -------- CUE POINTS --------
+    def _cue_in(self, song):
+        """Seconds of leading silence to skip (0.0 if unknown or negligible)."""
+        if not self.skip_silence:
+            return 0.0
+        cue_in = (self.track_analysis.get(song.get('path')) or {}).get('cue_in') or 0.0
+        return cue_in if cue_in >= MIN_CUE_IN else 0.0
+
+    def _mix_out_point(self, song):
+        """
+        Seconds into `song` where the crossfade out of it should start, or
+        None without cue analysis (the song simply plays to its end).
+        """
+        data = self.track_analysis.get(song.get('path')) or {}
+        if data.get('mix_out') is None or data.get('cue_out') is None:
+            return None
+        mix_out = min(data['mix_out'], data['cue_out'] - self.crossfade_duration)
+        return max(mix_out, data.get('cue_in') or 0.0)
+
+    def _set_mix_out(self, song):
+        """Work out when the crossfade out of the song that just started is due."""
+        mix_out = self._mix_out_point(song)
+        self._mix_out_ts = None if mix_out is None else self.current_start_ts + mix_out
+
+    def _ready_for_next(self):
+        """True when nothing is playing on the music stream or the crossfade channel."""
+        if self.crossfade_active:
+            return False
+        return not pygame.mixer.music.get_busy() and not self._crossfade_channel().get_busy()
+
+    # -------- CHANNEL PLAYBACK --------
+    def _uses_channel(self, song):
+        """
+        Songs with a mix-out point go on the crossfade channel, so the next
+        one can be mixed into them; so do songs the next one may follow
+        gaplessly, so it can be queued right behind their last sample.
+        """
+        return self._mix_out_point(song) is not None or self._may_continue_gapless(song)
+
+    def _channel_track(self, song, fade_in=0.0, from_top=False):
+        """
+        Set `song` up for the crossfade channel (decoded by the prefetcher if
+        it got there first). `from_top` starts it at its first sample rather
+        than after its leading silence, for a gapless join.
         """
-        Crossfade from current pygame.mixer.music (out) to next_song (in) over `duration` seconds.
+        rate = self._deck.rate
+        mix_out = self._mix_out_point(song)
+        start = 0 if from_top else int(self._cue_in(song) * rate)
+        if self._streams():
+            sound, source = None, self._decoder(song['path'], start, self._song_duration(song))
+        else:
+            sound = self.prefetcher.take(song)
+            if sound is None:
+                sound = self._load_crossfade_sound(song)
+            source = ArraySource(pygame.sndarray.samples(sound), start)
+        return _ChannelTrack(song, sound, source,
+                             self._track_volume(song),
+                             None if mix_out is None else int(mix_out * rate),
+                             int(fade_in * rate))
+
+    def _play_on_channel(self, track):
+        """
+        Play `track` on the crossfade channel and keep going: at each mix-out
+        point the next queued song is mixed in (see _next_block), until a
+        song ends with nothing queued or playback is skipped. Blocks are
+        rendered a block ahead of the mixer, so a late wake-up here can't
+        change how the fade sounds.
         """
         with self.crossfade_lock:
             if self.crossfade_active:
+                track.source.close()
                 return
             self.crossfade_active = True
 
+        deck = self._deck
+        deck.stop()
+        self._crossfade_channel().set_volume(1.0)  # track gains are rendered into the samples
+        feeding = track
         try:
-            # Prepare next song as a Sound on a dedicated channel
-            try:
-                next_sound = pygame.mixer.Sound(next_song['path'])
-            except Exception as e:
-                print(f"[Crossfade] Could not load as Sound; falling back: {e}")
-                pygame.mixer.music.fadeout(int(duration * 2000))  # gentle but shorter
-                pygame.mixer.music.stop()
-                pygame.mixer.music.load(next_song['path'])
-                self.current_duration = _get_duration_seconds(next_song['path'])
-                self.current_start_ts = time.time()
-                pygame.mixer.music.set_volume(1.0)
-                pygame.mixer.music.play(fade_ms=2000)
-                self._mark_now_playing(next_song)
-                self._print_now_playing(next_song)
-                while pygame.mixer.music.get_busy() and not self.skip_flag.is_set():
-                    time.sleep(0.1)
-                return
-
-            out_start_vol = pygame.mixer.music.get_volume()
-            in_start_vol = 0.0
-
-            ch = self._crossfade_channel()
-            ch.stop()
-            ch.set_volume(in_start_vol)
-            ch.play(next_sound, loops=0)
-
-            # set track timing for the incoming song
-            self.current_duration = _get_duration_seconds(next_song['path'])
-            self.current_start_ts = time.time()
-
-            self._mark_now_playing(next_song)
-            self._print_now_playing(next_song)
-
-            steps = max(1, int(duration / 0.05))  # 50 ms per step
-            for i in range(steps):
-                if self.skip_flag.is_set():
+            while not self.skip_flag.is_set():
+                while feeding is not None and deck.room():
+                    frames, tag, feeding = self._next_block(feeding)
+                    if frames is not None:
+                        deck.feed(frames, tag)
+                for started in deck.poll():
+                    self._channel_started(started)
+                if feeding is None and not deck.busy():
+                    self._ended_at = time.monotonic()
                     break
-                t = (i + 1) / steps
-                pygame.mixer.music.set_volume(max(0.0, out_start_vol * (1.0 - t)))
-                ch.set_volume(min(1.0, t))
-                time.sleep(0.05)
-
-            pygame.mixer.music.set_volume(0.0)
-            ch.set_volume(1.0)
-
-            pygame.mixer.music.stop()
-            pygame.mixer.music.set_volume(1.0)
-
-            while ch.get_busy() and not self.skip_flag.is_set():
-                time.sleep(0.1)
-
+                due = deck.next_due()
+                if feeding is None:
+                    # Last block of the last song: watch closely for its end
+                    self._wait(lambda: self.skip_flag.is_set() or not deck.busy(), end_ts=due)
+                else:
+                    self._wait(lambda: self.skip_flag.is_set() or deck.room(),
+                               wake_ts=due and due + BLOCK_SLACK)
         except Exception as e:
             print(f"[Crossfade] Error: {e}")
         finally:
+            if feeding is not None:
+                feeding.source.close()
             if self.skip_flag.is_set():
-                self._crossfade_channel().stop()
+                deck.stop()
+                self._ended_at = None
             self.skip_flag.clear()
             with self.crossfade_lock:
                 self.crossfade_active = False
 
+    def _next_block(self, track):
+        """
+        The next block to feed for `track`, as (frames, tag, track to read
+        next). At the mix-out point, if a song is queued, the block is the
+        whole overlap rendered with the crossfade curve and reading carries
+        on in the incoming song. A song that follows gaplessly starts with
+        the block after `track`'s last one. (None, None, None) once the
+        track is over and nothing follows it on the channel.
+        """
+        source = track.source
+        if track.mix_out is not None and source.pos >= track.mix_out:
+            incoming = self._hand_over(track, CROSSFADE)
+            if incoming is not None:
+                n = int(self.crossfade_duration * self._deck.rate)
+                frames = mix_overlap(source.read(n), incoming.source.read(n), self.crossfade_curve,
+                                     track.volume, incoming.volume)
+                source.close()  # the rest of the outgoing song is never heard
+                return frames, incoming, incoming
+
+        n = self._deck.rate * CHUNK_SECONDS
+        if track.mix_out is not None and source.pos < track.mix_out:
+            n = min(n, track.mix_out - source.pos)  # end the block exactly at the mix-out point
+        offset = source.pos - track.start
+        frames = source.read(int(n))
+        if not len(frames):
+            source.close()
+            incoming = self._hand_over(track, GAPLESS)
+            if incoming is None:
+                return None, None, None
+            return self._next_block(incoming)
+
+        gains = track.volume
+        if offset < track.fade_in:
+            ramp = np.ones(len(frames))
+            k = min(len(frames), track.fade_in - offset)
+            ramp[:k] = fade_gains(track.fade_in, self.crossfade_curve)[1][offset:offset + k]
+            gains = ramp * track.volume
+        tag = None if offset else track
+        return render(frames, gains), tag, track
+
+    def _hand_over(self, track, mode):
+        """
+        The queued song to follow `track` with transition `mode`, taken off
+        the queue: mixed in at the mix-out point (CROSSFADE) or queued after
+        the last sample (GAPLESS). None to keep playing `track`, or to let
+        it end, if nothing is queued or the next song follows another way.
+        """
+        gapless = mode == GAPLESS
+        if not gapless and track.source.remaining() < int(self.crossfade_duration * self._deck.rate):
+            track.mix_out = None  # too close to the end for a full fade: let it play out
+            return None
+        song, playlist = self._peek_next()
+        if song is None:
+            return None
+        if self._transition(track.song, song, playlist) != mode:
+            track.mix_out = None  # play to the end; a gapless song is queued after it there
+            return None
+        incoming = None
+        try:
+            incoming = self._channel_track(song, from_top=gapless)
+            taken = self._pop_next_song()
+            if taken is not song:  # the queue changed while it was decoding
+                incoming.source.close()
+                incoming = None
+                if taken is None:  # ...and is empty now: play this one out
+                    track.mix_out = None
+                    return None
+                song = taken
+                incoming = self._channel_track(song, from_top=gapless)
+        except Exception as e:
+            # Play this one out; the next song then starts on its own
+            if incoming is not None:
+                incoming.source.close()
+            print(f"[Crossfade] Could not load '{song.get('path')}': {e}")
+            track.mix_out = None
+            return None
+        if gapless:
+            self._print_gapless_start(incoming.song)
+        else:
+            self._print_crossfade_start(incoming.song)
+        self._count_played(incoming.song)
+        return incoming
+
+    def _channel_started(self, track):
+        """A song's first block just became audible on the crossfade channel."""
+        song = track.song
+        self.current_duration = self._song_duration(song)
+        self.current_start_ts = time.time() - track.start / self._deck.rate
+        self._set_mix_out(song)
+        self._record_gap(song)
+        self._mark_now_playing(song)
+        self._print_now_playing(song)
+        self._prefetch_next()
+
     def _crossfade_channel(self):
         return pygame.mixer.Channel(CROSSFADE_CHANNEL_IDX)
 
-    def _mark_now_playing(self, song):
-        """Bookkeeping + GUI updates when switching to a new song."""
+    def _count_played(self, song):
+        """Queue bookkeeping for a song taken off the queue to be played."""
         self.song_counter += 1
         self.played_songs.add(song.get('title', song.get('path', '')))
+        self.played_paths.add(song.get('path'))
+
+    def _mark_now_playing(self, song):
+        """GUI updates when a new song becomes audible."""
         self.current_song = song
         Clock.schedule_once(lambda dt: self.update_now_playing(song))
         Clock.schedule_once(lambda dt: self.update_upcoming_songs())
@@ -430,7 +1114,7 @@ class JukeboxPlayer:
                 album_art_bytes = f.read()
 
         song = {
-            'path': 'First Dance Song.mp3',
+            'path': FIRST_DANCE_PATH,
             'title': 'The First Dance',
             'artists': ["Nicki's Mix"],
             'genres': ['Pop', 'Christmas'],
@@ -440,24 +1124,26 @@ class JukeboxPlayer:
         
         try:
             pygame.mixer.music.load(song['path'])
-            pygame.mixer.music.set_volume(1.0)
-            self.current_duration = _get_duration_seconds(song['path'])
+            pygame.mixer.music.set_volume(self._track_volume(song))
+            self.current_duration = self._song_duration(song)
             self.current_start_ts = time.time()
+            self._mix_out_ts = None
             pygame.mixer.music.play()
             self.current_song = song
 
             self._print_now_playing(song)
             Clock.schedule_once(lambda dt: self.update_now_playing(song))
 
-            while pygame.mixer.music.get_busy() and not self.skip_flag.is_set():
-                time.sleep(0.1)
+            self._wait_for_track(pygame.mixer.music.get_busy, self._expected_end(), stop=self.skip_flag)
         except Exception as e:
             print(f"Error playing special song: {e}")
         finally:
             pygame.mixer.music.stop()
             self.skip_flag.clear()
+            self._ended_at = None
             with self.immediate_lock:
                 self.immediate_playback = False
+            self._wakeup.notify()
         
         self.played_songs.add(song['title'])
         Clock.schedule_once(lambda dt: self.update_upcoming_songs())
@@ -468,6 +1154,7 @@ class JukeboxPlayer:
         with self.crossfade_lock:
             if self.crossfade_active:
                 self.skip_flag.set()
+                self._wakeup.notify()
 
 def _fmt_mmss(seconds):
     if seconds is None:
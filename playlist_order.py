@@ -0,0 +1,87 @@
+import math
+import random
+
+import numpy as np
+
+# One Camelot step (e.g. 8A -> 9A) costs about as much as a 6% tempo change.
+# Half/double time counts as the same tempo, so 70 -> 140 BPM is a free move.
+TEMPO_STEP = math.log(1.06)
+KEY_WEIGHT = 1.0
+UNKNOWN_COST = 2.0   # cost charged when either side of a transition wasn't analyzed
+JITTER = 0.5         # random slack so every party doesn't get the exact same order
+
+
+def _features(songs, analysis):
+    """Per-song arrays of log-tempo, Camelot number and Camelot letter (NaN where unknown)."""
+    n = len(songs)
+    log_bpm = np.full(n, np.nan)
+    number = np.full(n, np.nan)
+    minor = np.full(n, np.nan)
+    for i, song in enumerate(songs):
+        data = analysis.get(song.get('path')) or {}
+        if data.get('bpm'):
+            log_bpm[i] = math.log(data['bpm'])
+        code = data.get('camelot')
+        if code:
+            number[i] = int(code[:-1])
+            minor[i] = code[-1] == 'A'
+    return log_bpm, number, minor
+
+
+def _costs(log_bpm, number, minor, from_bpm, from_number, from_minor):
+    """Transition cost from one song (the from_* scalars) to every song in the arrays."""
+    d = np.abs(log_bpm - from_bpm)
+    d = np.minimum(d, np.abs(d - math.log(2)))
+    tempo = np.nan_to_num(d / TEMPO_STEP, nan=UNKNOWN_COST)
+
+    steps = np.abs(number - from_number) % 12
+    steps = np.minimum(steps, 12 - steps) + (minor != from_minor)
+    key = np.nan_to_num(steps, nan=UNKNOWN_COST)
+    return tempo + KEY_WEIGHT * key
+
+
+def transition_cost(a, b):
+    """Cost of playing analysis dict `b` right after `a` (lower mixes better)."""
+    songs = [{'path': 'a'}, {'path': 'b'}]
+    log_bpm, number, minor = _features(songs, {'a': a, 'b': b})
+    return float(_costs(log_bpm[1:], number[1:], minor[1:], log_bpm[0], number[0], minor[0])[0])
+
+
+def smooth_order(songs, analysis, rng=random):
+    """
+    Return `songs` reordered so consecutive tracks are close in tempo and key.
+
+    Greedy nearest neighbour from a random start: each step scores every
+    remaining song against the current one in a single NumPy pass, so even a
+    few thousand songs order in under a second. Songs with neither tempo
+    nor key analysis are put back in at random positions.
+    """
+    known, unknown = [], []
+    for song in songs:
+        data = analysis.get(song.get('path')) or {}
+        (known if data.get('bpm') or data.get('camelot') else unknown).append(song)
+    if len(known) < 3:
+        return list(songs)
+
+    # The candidates live in the first `left` slots of these arrays; a picked
+    # song is swapped with the last candidate, so each step is one NumPy pass
+    # over what's left and nothing is ever copied.
+    log_bpm, number, minor = _features(known, analysis)
+    index = np.arange(len(known))
+    jitter = np.random.default_rng(rng.randrange(2 ** 32)).random(len(known)) * JITTER
+    order = []
+    pick = rng.randrange(len(known))
+    for left in range(len(known), 0, -1):
+        last = left - 1
+        order.append(int(index[pick]))
+        at = (log_bpm[pick], number[pick], minor[pick])
+        for arr in (log_bpm, number, minor, index):
+            arr[pick], arr[last] = arr[last], arr[pick]
+        if last:
+            costs = _costs(log_bpm[:last], number[:last], minor[:last], *at) + jitter[:last]
+            pick = int(np.argmin(costs))
+
+    result = [known[i] for i in order]
+    for song in unknown:
+        result.insert(rng.randint(0, len(result)), song)
+    return result
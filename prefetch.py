@@ -0,0 +1,86 @@
+import threading
+
+
+class TrackPrefetcher:
+    """
+    Decodes the next queued song on a background thread, so a crossfade can
+    start on time instead of waiting for pygame to decode the whole file.
+
+    Only one song is kept ready. Asking for a different song re-targets the
+    prefetcher: a finished result for the old song is dropped, and one still
+    being decoded is thrown away when it completes (pygame can't interrupt
+    a decode half-way), after which the new target is decoded.
+    """
+
+    def __init__(self, load, key=None):
+        self._load = load  # song -> decoded sound (may raise)
+        self._key = key or (lambda song: song.get('path'))
+        self._cond = threading.Condition()
+        self._target = None
+        self._target_song = None
+        self._decoding = None
+        self._ready_key = None
+        self._ready = None
+        self._failed_key = None
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def request(self, song):
+        """Start decoding `song` (or stop prefetching if None), replacing any earlier request."""
+        key = self._key(song) if song else None
+        with self._cond:
+            if key == self._target:
+                return
+            self._target, self._target_song = key, song
+            self._failed_key = None
+            if self._ready_key != key:
+                self._ready_key = self._ready = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def take(self, song):
+        """
+        The decoded sound for `song` if it was prefetched, or None. If it was
+        requested but isn't ready yet, waits for it (never later than
+        starting the decode over).
+        """
+        key = self._key(song)
+        with self._cond:
+            while self._target == key and self._ready_key != key and self._failed_key != key:
+                self._cond.wait()
+            if self._ready_key == key and self._ready is not None:
+                sound = self._ready
+                self._ready_key = self._ready = self._target = self._target_song = None
+                self.hits += 1
+                return sound
+            self.misses += 1
+            return None
+
+    def summary(self):
+        return f"[Prefetch] {self.hits} ready in time, {self.misses} decoded late, {self.cancelled} cancelled"
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._target is None or self._target in (self._ready_key, self._failed_key):
+                    self._cond.wait()
+                key, song = self._target, self._target_song
+                self._decoding = key
+            try:
+                sound = self._load(song)
+            except Exception as e:
+                print(f"[Prefetch] Could not decode '{song.get('path')}': {e}")
+                sound = None
+            with self._cond:
+                self._decoding = None
+                if key != self._target:
+                    self.cancelled += 1
+                elif sound is None:
+                    self._failed_key = key
+                else:
+                    self._ready_key, self._ready = key, sound
+                self._cond.notify_all()
@@ -0,0 +1,194 @@
+import math
+import re
+import time
+from collections import deque
+
+# The player's playlists, by the names rules and fallback orders use
+PLAYLIST_NAMES = ('special', 'primary', 'default')
+
+# The jukebox's own rule: every 5th song comes from the Special playlist;
+# otherwise user picks (primary) go first, then the default rotation.
+DEFAULT_RULES = ({'playlist': 'special', 'every': 5},)
+DEFAULT_FALLBACK = ('primary', 'default', 'special')
+
+MAX_CYCLE = 100_000  # longest rule cycle compiled into a table (lcm of all the `every`s)
+HOUR = 3600.0
+
+_HHMM = re.compile(r'([01]?\d|2[0-3]):([0-5]\d)')
+
+
+def _minutes(hhmm):
+    match = _HHMM.fullmatch(hhmm) if isinstance(hhmm, str) else None
+    if match is None:
+        raise ValueError(f"Slot rule times must be \"HH:MM\" strings, got {hhmm!r}")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def _playlist(name):
+    if name not in PLAYLIST_NAMES:
+        raise ValueError(f"Unknown playlist {name!r} in slot rules (expected one of {PLAYLIST_NAMES})")
+    return name
+
+
+def _count(key, value, minimum):
+    """`value` if it is a whole number >= minimum (bools don't count)."""
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"Slot rule {key!r} must be a whole number of at least {minimum}, got {value!r}")
+    return value
+
+
+class SlotRule:
+    """
+    One declared slot rule. Every key but `playlist` is optional:
+
+        playlist      where the song comes from ('special', 'primary', 'default')
+        every, start  only slots start, start + every, ... (start defaults to every)
+        between       ["22:00", "23:30"]: only slots starting in this local time
+                      window (it may wrap past midnight)
+        max_per_hour  never take more than this many songs from the playlist in
+                      any hour, by this rule or the fallback order
+
+    A rule with neither `every` nor `between` only sets a cap. Anything
+    else malformed (an unknown playlist, a `between` that isn't two
+    "HH:MM" times, ...) raises ValueError.
+    """
+
+    def __init__(self, playlist, every=None, start=None, between=None, max_per_hour=None):
+        self.playlist = _playlist(playlist)
+        self.every = None if every is None else _count('every', every, 1)
+        if start is not None and every is None:
+            raise ValueError("Slot rule 'start' needs an 'every'")
+        self.start = every if start is None else _count('start', start, 0)
+        if between is not None and (not isinstance(between, (list, tuple)) or len(between) != 2):
+            raise ValueError(f"Slot rule 'between' must be two \"HH:MM\" times, got {between!r}")
+        self.window = tuple(_minutes(t) for t in between) if between is not None else None
+        self.max_per_hour = None if max_per_hour is None else _count('max_per_hour', max_per_hour, 0)
+
+    @property
+    def picks(self):
+        """True if the rule claims slots (as opposed to only capping a playlist)."""
+        return self.every is not None or self.window is not None
+
+    def matches(self, counter):
+        if self.every is None:
+            return True
+        return counter >= self.start and (counter - self.start) % self.every == 0
+
+    def in_window(self, ts):
+        if self.window is None:
+            return True
+        lt = time.localtime(ts)
+        now = lt.tm_hour * 60 + lt.tm_min
+        begin, end = self.window
+        return begin <= now < end if begin <= end else (now >= begin or now < end)
+
+
+class SlotScheduler:
+    """
+    Decides which playlist each song slot is filled from.
+
+    Rules are declared (see SlotRule; main.py loads them from
+    playlists/slot_rules.json) and compiled once into a table over one
+    cycle of their `every` periods: entry counter % cycle lists the rules
+    that claim that slot, in declaration order, followed by the fallback
+    order. Picking a slot is then a table lookup plus a check of the few
+    time windows and caps, with no dependence on how many songs are queued.
+
+    `history` keeps when songs were taken from capped playlists, for
+    max_per_hour. Look-ahead passes its own copy (copy_history()) so
+    simulated songs don't count as played.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, fallback=DEFAULT_FALLBACK):
+        self.rules = [self._rule(r) for r in rules]
+        if isinstance(fallback, str):
+            raise ValueError(f"Slot rule fallback must be a list of playlists, got {fallback!r}")
+        self.fallback = tuple(_playlist(name) for name in fallback)
+        self.caps = {r.playlist: r.max_per_hour for r in self.rules if r.max_per_hour is not None}
+        self.history = {name: deque() for name in self.caps}
+        self.version = 0  # bumped when history changes, so cached look-ahead can tell
+        self.timed = any(r.window is not None for r in self.rules) or bool(self.caps)
+        self._compile()
+
+    @classmethod
+    def from_config(cls, config):
+        """Scheduler from a parsed slot_rules.json: {"rules": [...], "fallback": [...]}. Raises ValueError if malformed."""
+        if not isinstance(config, dict):
+            raise ValueError(f"Slot rules must be a JSON object, got {type(config).__name__}")
+        rules = config.get('rules', DEFAULT_RULES)
+        if not isinstance(rules, (list, tuple)):
+            raise ValueError(f"Slot rules 'rules' must be a list, got {type(rules).__name__}")
+        return cls(rules, config.get('fallback', DEFAULT_FALLBACK))
+
+    @staticmethod
+    def _rule(rule):
+        if isinstance(rule, SlotRule):
+            return rule
+        if not isinstance(rule, dict):
+            raise ValueError(f"Each slot rule must be a JSON object, got {rule!r}")
+        unknown = set(rule) - {'playlist', 'every', 'start', 'between', 'max_per_hour'}
+        if unknown or 'playlist' not in rule:
+            raise ValueError(f"Slot rule {rule!r} needs a 'playlist' and no keys besides "
+                             f"'every', 'start', 'between' and 'max_per_hour'")
+        return SlotRule(**rule)
+
+    def _compile(self):
+        slot_rules = [r for r in self.rules if r.picks]
+        periods = [r.every for r in slot_rules if r.every is not None]
+        cycle = math.lcm(*periods) if periods else 1
+        if cycle > MAX_CYCLE:
+            raise ValueError(f"Slot rules repeat only every {cycle} songs; keep the periods' lcm under {MAX_CYCLE}")
+        self._cycle = cycle
+        # Slots before the last rule's start are looked up directly, not by cycle position
+        self._warmup = max((r.start for r in slot_rules if r.every is not None), default=0)
+        fallback = tuple((name, None) for name in self.fallback)
+
+        def candidates(counter):
+            return tuple((r.playlist, r) for r in slot_rules if r.matches(counter)) + fallback
+
+        self._early = [candidates(c) for c in range(self._warmup)]
+        base = self._warmup
+        self._table = [None] * cycle
+        for c in range(base, base + cycle):
+            self._table[c % cycle] = candidates(c)
+
+    def _candidates(self, counter):
+        if counter < self._warmup:
+            return self._early[counter]
+        return self._table[counter % self._cycle]
+
+    def pick(self, counter, available, ts=None, history=None):
+        """
+        Name of the playlist slot number `counter` is filled from, or None.
+        `available(name)` says whether a playlist still has songs; `ts` is
+        when the slot starts (now if None).
+        """
+        ts = time.time() if ts is None else ts
+        history = self.history if history is None else history
+        for name, rule in self._candidates(counter):
+            if rule is not None and not rule.in_window(ts):
+                continue
+            if name in self.caps and self._recent(history[name], ts) >= self.caps[name]:
+                continue
+            if available(name):
+                return name
+        return None
+
+    def record(self, name, ts=None, history=None):
+        """Note a song taken from playlist `name` at `ts` (for max_per_hour)."""
+        if name not in self.caps:
+            return
+        own = history is None
+        entries = (self.history if own else history)[name]
+        entries.append(time.time() if ts is None else ts)
+        while len(entries) > self.caps[name]:
+            entries.popleft()  # only the last max_per_hour entries can matter
+        if own:
+            self.version += 1
+
+    def copy_history(self):
+        return {name: deque(entries) for name, entries in self.history.items()}
+
+    @staticmethod
+    def _recent(entries, ts):
+        return sum(1 for t in entries if ts - t < HOUR)
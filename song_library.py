@@ -1,52 +1,374 @@
 import os
 import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from mutagen.id3 import ID3, TIT2, TPE1, TCON, APIC
+from mutagen.mp3 import MPEGInfo
+from library_cache import file_signature
+from id3_reader import read_fast_tags, art_hash
 
-def get_all_mp3_files_with_metadata(directory):
+# How many songs a streaming scan hands over at a time
+SCAN_BATCH_SIZE = 200
+
+def get_all_mp3_files_with_metadata(directory, cache=None, workers=None, use_processes=False, timings=None):
     """
     Fetches all MP3 files from a directory, extracts their metadata,
     and correctly handles multiple artists in a single tag.
+
+    If a MetadataCache is given, files whose size and mtime are unchanged
+    are served from it and only new or modified files are parsed.
+
+    With `workers` > 1 the tag parsing is spread over a thread pool (or a
+    process pool if `use_processes` is set). The result order only depends
+    on the sorted directory walk, never on which worker finishes first, so
+    keys assigned by index stay stable between runs.
+
+    If a `timings` dict is passed it is filled with per-stage seconds
+    ('walk', 'parse', 'art') plus file counts, for tuning worker counts.
     """
     mp3_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if not file.lower().endswith('.mp3'):
-                continue
+    for batch in iter_mp3_files_with_metadata(directory, cache=cache, workers=workers,
+                                              use_processes=use_processes, timings=timings):
+        mp3_files.extend(batch)
+    return mp3_files
+
+def iter_mp3_files_with_metadata(directory, batch_size=SCAN_BATCH_SIZE, cache=None, workers=None,
+                                 use_processes=False, timings=None):
+    """
+    Streaming version of get_all_mp3_files_with_metadata: yields lists of at
+    most `batch_size` song records, in walk order, as soon as each batch is
+    ready, so callers can show the first songs while the rest are scanned.
+    The cache is only pruned once the whole library has been yielded.
+    """
+    stats = timings if timings is not None else {}
 
-            full_path = os.path.join(root, file)
+    # Stage 1: walk the directory tree
+    t0 = time.perf_counter()
+    paths = _walk_mp3_paths(directory)
+    stats['walk'] = time.perf_counter() - t0
+
+    pool = None
+    if workers and workers > 1:
+        pool = (ProcessPoolExecutor if use_processes else ThreadPoolExecutor)(max_workers=workers)
+    seen_paths = []
+    try:
+        for start in range(0, len(paths), batch_size):
+            batch = load_songs(paths[start:start + batch_size], cache=cache, workers=workers,
+                               use_processes=use_processes, timings=stats, pool=pool)
+            seen_paths.extend(song['path'] for song in batch)
+            yield batch
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    if cache is not None:
+        cache.prune(seen_paths)
+        cache.commit()
+
+def load_songs(paths, cache=None, workers=None, use_processes=False, timings=None, pool=None):
+    """
+    Build song records for the given MP3 paths, in the same order.
+    Cached entries are reused; everything else is parsed (see
+    get_all_mp3_files_with_metadata for the worker and timing options).
+    Counts and timings are added to whatever `timings` already holds.
+    """
+    stats = timings if timings is not None else {}
+    stats['files'] = stats.get('files', 0) + len(paths)
+
+    # Stage 2: serve what we can from the cache
+    songs = [None] * len(paths)
+    signatures = {}
+    to_parse = []
+    for idx, full_path in enumerate(paths):
+        if cache is not None:
             try:
-                tags = ID3(full_path)
-                title = tags.get('TIT2', TIT2(text=[os.path.splitext(file)[0]])).text[0]
-                
-                # Handle single or multiple artists (split by common separators)
-                artist_str = tags.get('TPE1', TPE1(text=['Unknown Artist'])).text[0]
-                artists = [a.strip() for a in re.split(';|,|/', artist_str) if a.strip()]
-
-                genre_str = tags.get('TCON', TCON(text=['Unknown Genre'])).text[0]
-                genres = [g.strip().lower() for g in genre_str.split(';')]
-                
-                album_art_data = _extract_album_art(tags)
-
-            except Exception as e:
-                print(f"Metadata error for '{full_path}': {e}")
-                title = os.path.splitext(file)[0]
-                artists = ['Unknown Artist']
-                genres = ['unknown genre']
-                album_art_data = None
-            
-            mp3_files.append({
-                'path': full_path,
-                'title': title,
-                'artists': artists, # Use 'artists' (plural) to store the list
-                'genres': genres,
-                'album_art': album_art_data
-            })
-    return mp3_files
+                signatures[full_path] = file_signature(full_path)
+            except OSError as e:
+                print(f"Could not stat '{full_path}': {e}")
+                continue
+            songs[idx] = cache.lookup(full_path, *signatures[full_path])
+            if songs[idx] is not None:
+                continue
+        to_parse.append(idx)
+
+    # Stage 3: parse the remaining files, optionally in parallel
+    t0 = time.perf_counter()
+    parsed = _map_parse([paths[i] for i in to_parse], workers, use_processes, pool)
+    art_seconds = 0.0
+    for idx, (song, stage_times) in zip(to_parse, parsed):
+        songs[idx] = song
+        art_seconds += stage_times.get('art', 0.0)
+        if cache is not None:
+            cache.store(paths[idx], *signatures[paths[idx]], song)
+    stats['art'] = stats.get('art', 0.0) + art_seconds
+    stats['parse'] = stats.get('parse', 0.0) + time.perf_counter() - t0
+    stats['parsed'] = stats.get('parsed', 0) + len(to_parse)
+    stats['workers'] = max(1, workers or 1)
+
+    return [song for song in songs if song is not None]
+
+def _walk_mp3_paths(directory):
+    """Return every .mp3 under `directory` in a deterministic (sorted) order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith('.mp3'):
+                paths.append(os.path.join(root, file))
+    return paths
+
+def _map_parse(paths, workers, use_processes, pool=None):
+    """Parse `paths` in order, fanning out over a pool when workers > 1."""
+    if not paths:
+        return []
+    if not workers or workers <= 1 or len(paths) == 1:
+        return [_parse_one(p) for p in paths]
+    chunksize = 16 if use_processes else 1
+    if pool is not None:
+        # Executor.map yields results in submission order
+        return list(pool.map(_parse_one, paths, chunksize=chunksize))
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as new_pool:
+        return list(new_pool.map(_parse_one, paths, chunksize=chunksize))
+
+def _parse_one(full_path):
+    """Pool worker: parse one file and return (song, per-stage seconds)."""
+    stage_times = {}
+    song = _read_song_metadata(full_path, stage_times)
+    return song, stage_times
+
+def format_scan_timings(timings):
+    """One-line summary of the stage timings filled in by a library scan."""
+    return (f"[Library] scanned {timings.get('files', 0)} files "
+            f"({timings.get('parsed', 0)} parsed, {timings.get('workers', 1)} workers): "
+            f"walk {timings.get('walk', 0.0):.2f}s, parse {timings.get('parse', 0.0):.2f}s, "
+            f"art {timings.get('art', 0.0):.2f}s summed over workers")
+
+def _read_song_metadata(full_path, stage_times=None):
+    """
+    Parse the ID3 tags of a single MP3 into a song record. Time spent on
+    album art extraction is added to stage_times['art'] if a dict is given.
+
+    Plain ID3v2.3/2.4 tags go through the header-only reader, which skips
+    over the cover image and just notes where it is; anything else is
+    parsed with mutagen.
+    """
+    file = os.path.basename(full_path)
+    art_offset = art_length = None
+    fast = read_fast_tags(full_path)
+    try:
+        if fast is not None:
+            title = fast.text.get('TIT2', os.path.splitext(file)[0])
+            artist_str = fast.text.get('TPE1', 'Unknown Artist')
+            genre_str = fast.text.get('TCON', 'Unknown Genre')
+            art_ref = (fast.art_key, fast.art_hash)
+            art_offset, art_length = fast.art_offset, fast.art_length
+        else:
+            tags = ID3(full_path)
+            title = tags.get('TIT2', TIT2(text=[os.path.splitext(file)[0]])).text[0]
+            artist_str = tags.get('TPE1', TPE1(text=['Unknown Artist'])).text[0]
+            genre_str = tags.get('TCON', TCON(text=['Unknown Genre'])).text[0]
+
+            # Only keep a cheap reference to the cover; the bytes are loaded on
+            # demand by album_art.get_album_art when the song is played.
+            t0 = time.perf_counter()
+            art_frame = _find_album_art_frame(tags)
+            art_ref = (art_frame.HashKey, art_hash(art_frame.data)) if art_frame is not None else (None, None)
+            if stage_times is not None:
+                stage_times['art'] = stage_times.get('art', 0.0) + time.perf_counter() - t0
+
+        # Handle single or multiple artists (split by common separators)
+        artists = [a.strip() for a in re.split(';|,|/', artist_str) if a.strip()]
+        genres = [g.strip().lower() for g in genre_str.split(';')]
+
+    except Exception as e:
+        print(f"Metadata error for '{full_path}': {e}")
+        title = os.path.splitext(file)[0]
+        artists = ['Unknown Artist']
+        genres = ['unknown genre']
+        art_ref = (None, None)
+
+    song = {
+        'path': full_path,
+        'title': title,
+        'artists': artists, # Use 'artists' (plural) to store the list
+        'genres': genres,
+        'art_frame': art_ref[0],
+        'art_hash': art_ref[1],
+        'art_offset': art_offset,
+        'art_length': art_length,
+    }
+    song.update(_read_audio_info(full_path))
+    return song
+
+def _read_audio_info(full_path):
+    """
+    Duration, bitrate and sample rate from the MPEG frame headers (no audio
+    is decoded). Values are None if the stream can't be read.
+    """
+    try:
+        with open(full_path, 'rb') as f:
+            info = MPEGInfo(f)
+        return {'duration': float(info.length), 'bitrate': info.bitrate, 'sample_rate': info.sample_rate}
+    except Exception:
+        return {'duration': None, 'bitrate': None, 'sample_rate': None}
 
 def _extract_album_art(tags):
     """Helper to extract album art data (APIC frame) from ID3 tags."""
-    return next((tag.data for tag in tags.values() if tag.FrameID == 'APIC'), None)
+    frame = _find_album_art_frame(tags)
+    return frame.data if frame is not None else None
+
+def _find_album_art_frame(tags):
+    """Return the first APIC frame in the tags, or None."""
+    return next((tag for tag in tags.values() if tag.FrameID == 'APIC'), None)
 
 def is_abba_song(song):
     """Checks if 'ABBA' is one of the artists for the given song."""
-    return any(artist.strip().lower() == 'abba' for artist in song.get('artists', []))
\ No newline at end of file
+    if isinstance(song, Song):
+        return song.is_abba
+    return any(artist.strip().lower() == 'abba' for artist in song.get('artists', []))
+
+
+# -------- COMPACT SONG RECORDS --------
+class StringPool:
+    """Interns strings to small integer ids so songs can share them."""
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        sid = self._ids.get(name)
+        if sid is None:
+            with self._lock:
+                sid = self._ids.get(name)
+                if sid is None:
+                    sid = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._ids[name] = sid
+        return sid
+
+    def id_of(self, name):
+        """Id of an already interned name, or None."""
+        return self._ids.get(name)
+
+    def name(self, sid):
+        return self._names[sid]
+
+    def __len__(self):
+        return len(self._names)
+
+
+ARTISTS = StringPool()
+GENRES = StringPool()
+
+
+class Song:
+    """
+    Compact, immutable song record used once the library is loaded.
+
+    Artists and genres are stored as interned ids, and the flags the queue
+    rules care about (ABBA, Special, Christmas) are worked out once up front.
+    Equality and hashing go by the integer key, so membership checks never
+    compare whole records. Mapping-style access (song['title'],
+    song.get('genres')) still works for code written against plain dicts.
+    """
+    __slots__ = ('key', 'path', 'title', 'artist_ids', 'genre_ids', 'flags', 'art_frame', 'art_hash',
+                 'art_offset', 'art_length', 'duration', 'bitrate', 'sample_rate')
+
+    FLAG_ABBA = 1
+    FLAG_SPECIAL = 2
+    FLAG_CHRISTMAS = 4
+
+    def __init__(self, key, path, title, artists=(), genres=(), art_frame=None, art_hash=None,
+                 duration=None, bitrate=None, sample_rate=None, art_offset=None, art_length=None):
+        artist_ids = tuple(ARTISTS.intern(a) for a in artists)
+        genre_ids = tuple(GENRES.intern(g) for g in genres)
+        flags = 0
+        if any(a.strip().lower() == 'abba' for a in artists):
+            flags |= Song.FLAG_ABBA
+        if 'Special' in genres:
+            flags |= Song.FLAG_SPECIAL
+        if 'Christmas' in genres:
+            flags |= Song.FLAG_CHRISTMAS
+        for name, value in (('key', key), ('path', path), ('title', title),
+                            ('artist_ids', artist_ids), ('genre_ids', genre_ids), ('flags', flags),
+                            ('art_frame', art_frame), ('art_hash', art_hash),
+                            ('art_offset', art_offset), ('art_length', art_length), ('duration', duration),
+                            ('bitrate', bitrate), ('sample_rate', sample_rate)):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_record(cls, record, key, genres=None):
+        """Build a Song from a scanned (dict) record, optionally overriding its genres."""
+        return cls(
+            key=key,
+            path=record['path'],
+            title=record.get('title'),
+            artists=record.get('artists') or (),
+            genres=record.get('genres', ()) if genres is None else genres,
+            art_frame=record.get('art_frame'),
+            art_hash=record.get('art_hash'),
+            duration=record.get('duration'),
+            bitrate=record.get('bitrate'),
+            sample_rate=record.get('sample_rate'),
+            art_offset=record.get('art_offset'),
+            art_length=record.get('art_length'),
+        )
+
+    def replace(self, **changes):
+        """Return a copy of this song with some fields changed."""
+        fields = {'key': self.key, 'path': self.path, 'title': self.title,
+                  'artists': self.artists, 'genres': self.genres,
+                  'art_frame': self.art_frame, 'art_hash': self.art_hash,
+                  'art_offset': self.art_offset, 'art_length': self.art_length, 'duration': self.duration,
+                  'bitrate': self.bitrate, 'sample_rate': self.sample_rate}
+        fields.update(changes)
+        return Song(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Song records are immutable; use replace()")
+
+    @property
+    def artists(self):
+        return tuple(ARTISTS.name(i) for i in self.artist_ids)
+
+    @property
+    def genres(self):
+        return tuple(GENRES.name(i) for i in self.genre_ids)
+
+    @property
+    def is_abba(self):
+        return bool(self.flags & Song.FLAG_ABBA)
+
+    @property
+    def is_special(self):
+        return bool(self.flags & Song.FLAG_SPECIAL)
+
+    @property
+    def is_christmas(self):
+        return bool(self.flags & Song.FLAG_CHRISTMAS)
+
+    # Dict-style access for code that still treats songs as mappings
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __eq__(self, other):
+        if isinstance(other, Song):
+            return self.key == other.key
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Song(key={self.key!r}, title={self.title!r})"
@@ -0,0 +1,265 @@
+import random
+import time
+
+
+def song_key(song):
+    """Library key of `song`; hand-built songs without one go by path."""
+    key = song.get('key')
+    if key is None:
+        key = song.get('path', id(song))
+    return key
+
+
+class _Node:
+    __slots__ = ('song', 'key', 'prev', 'next', 'slot', 'picked')
+
+    def __init__(self, song, key, picked=False):
+        self.song = song
+        self.key = key
+        self.prev = self.next = None
+        self.slot = -1
+        self.picked = picked
+
+
+class SongQueue:
+    """
+    One of the player's playlists: a doubly linked list of songs with a
+    key -> node index, so the things playback and song picking do all the
+    time are O(1) however long the queue is:
+
+    - popleft() / first() to play the next song
+    - `song in queue`, remove(song) and replace(old, new) by key
+    - insert_after_picks(song) to queue a user pick behind earlier picks
+    - insert_random(song) to shuffle a new song into the default rotation
+
+    Each song is queued at most once; adding one that is already queued
+    does nothing. insert(index, song) and queue[i] walk from the nearer end
+    and are only meant for short playlists and tests. Not thread-safe on
+    its own: the player's queue_lock guards every change.
+
+    `version` goes up with every change, so views computed from the queue
+    (the player's upcoming-song projection) know when to recompute.
+    """
+
+    def __init__(self, songs=(), key=song_key):
+        self._key = key
+        self._nodes = {}   # key -> node
+        self._slots = []   # the same nodes in no particular order, for random positions
+        self._head = self._tail = None
+        self._last_pick = None  # user picks sit together at the front; this is the last of them
+        self.version = 0
+        for song in songs:
+            self.append(song)
+
+    # -------- READING --------
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, song):
+        return self._key(song) in self._nodes
+
+    def __iter__(self):
+        node = self._head
+        while node is not None:
+            yield node.song
+            node = node.next
+
+    def __getitem__(self, index):
+        n = len(self._nodes)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("SongQueue index out of range")
+        if index < n - index:
+            node = self._head
+            for _ in range(index):
+                node = node.next
+        else:
+            node = self._tail
+            for _ in range(n - 1 - index):
+                node = node.prev
+        return node.song
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"SongQueue({list(self)!r})"
+
+    def first(self):
+        """The song at the front, or None if the queue is empty."""
+        return self._head.song if self._head is not None else None
+
+    # -------- ADDING --------
+    def append(self, song):
+        return self._link(song, before=None)
+
+    def appendleft(self, song):
+        return self._link(song, before=self._head)
+
+    def insert(self, index, song):
+        """Insert `song` before position `index` (list.insert semantics; walks the queue)."""
+        n = len(self._nodes)
+        index = max(0, min(n, index + n if index < 0 else index))
+        before = None
+        if index < n:
+            before = self._nodes[self._key(self[index])]
+        return self._link(song, before)
+
+    def insert_before(self, anchor, song):
+        """Insert `song` just before the queued song `anchor` (at the end if `anchor` is None)."""
+        before = None if anchor is None else self._nodes[self._key(anchor)]
+        return self._link(song, before)
+
+    def insert_random(self, song, rng=random):
+        """Insert `song` at a uniformly random position (any of the len + 1 gaps)."""
+        i = rng.randrange(len(self._slots) + 1)
+        return self._link(song, before=self._slots[i] if i < len(self._slots) else None)
+
+    def insert_after_picks(self, song):
+        """Queue a user pick after the other picks still queued (at the front if there are none)."""
+        before = self._head if self._last_pick is None else self._last_pick.next
+        if not self._link(song, before, picked=True):
+            return False
+        self._last_pick = self._nodes[self._key(song)]
+        return True
+
+    # -------- REMOVING --------
+    def popleft(self):
+        if self._head is None:
+            raise IndexError("pop from an empty SongQueue")
+        node = self._head
+        self._unlink(node)
+        return node.song
+
+    def remove(self, song):
+        if not self.discard(song):
+            raise ValueError(f"{song!r} is not queued")
+
+    def discard(self, song):
+        """Remove `song` if it is queued; True if it was."""
+        node = self._nodes.get(self._key(song))
+        if node is None:
+            return False
+        self._unlink(node)
+        return True
+
+    def replace(self, old, new):
+        """Put `new` where `old` is queued (same position, pick or not); True if `old` was queued."""
+        node = self._nodes.get(self._key(old))
+        if node is None:
+            return False
+        key = self._key(new)
+        if key != node.key:
+            if key in self._nodes:
+                self._unlink(node)  # `new` is queued already: keep that one
+                return True
+            del self._nodes[node.key]
+            self._nodes[key] = node
+            node.key = key
+        node.song = new
+        self.version += 1
+        return True
+
+    def clear(self):
+        self._nodes.clear()
+        self._slots.clear()
+        self._head = self._tail = self._last_pick = None
+        self.version += 1
+
+    # -------- INTERNALS --------
+    def _link(self, song, before, picked=False):
+        key = self._key(song)
+        if key in self._nodes:
+            return False
+        node = _Node(song, key, picked)
+        node.next = before
+        node.prev = self._tail if before is None else before.prev
+        if node.prev is None:
+            self._head = node
+        else:
+            node.prev.next = node
+        if before is None:
+            self._tail = node
+        else:
+            before.prev = node
+        node.slot = len(self._slots)
+        self._slots.append(node)
+        self._nodes[key] = node
+        self.version += 1
+        return True
+
+    def _unlink(self, node):
+        if node.prev is None:
+            self._head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self._tail = node.prev
+        else:
+            node.next.prev = node.prev
+        if node is self._last_pick:
+            self._last_pick = node.prev if node.prev is not None and node.prev.picked else None
+        # Swap-remove from the slot array; node.next is left alone so an
+        # iterator standing on this node can still move on
+        last = self._slots.pop()
+        if last is not node:
+            self._slots[node.slot] = last
+            last.slot = node.slot
+        del self._nodes[node.key]
+        self.version += 1
+
+
+def _benchmark(n=50_000, ops=2_000):
+    """Time the queue operations playback and song picking use, on `n` queued songs, against a plain list."""
+    songs = [{'key': i, 'title': f'Song {i}'} for i in range(n)]
+    probes = random.Random(0).sample(songs, ops)
+    results = {}
+    for name, make in (('list', list), ('SongQueue', SongQueue)):
+        timings = {}
+        q = make(songs)
+        t0 = time.perf_counter()
+        for song in probes:
+            song in q
+        timings['contains'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for song in probes:
+            q.remove(song)
+        timings['remove'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for song in probes:
+            if name == 'list':
+                q.insert(0, song)  # the old select_song counted picks first, so this flatters the list
+            else:
+                q.insert_after_picks(song)
+        timings['insert pick'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(ops):
+            q.pop(0) if name == 'list' else q.popleft()
+        timings['pop front'] = time.perf_counter() - t0
+        results[name] = timings
+    return results
+
+
+if __name__ == "__main__":
+    """
+    Compare the queue with a plain list at 50k queued songs:
+
+    python song_queue.py
+    python song_queue.py 200000
+    """
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    ops = 2_000
+    results = _benchmark(n, ops)
+    print(f"{n} queued songs, {ops} operations each (µs per operation)")
+    for op in results['list']:
+        print(f"  {op:12s} list {results['list'][op] / ops * 1e6:9.2f}   "
+              f"SongQueue {results['SongQueue'][op] / ops * 1e6:7.2f}")
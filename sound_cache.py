@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+
+# Decoded PCM is big (~50 MB for five minutes of 44.1 kHz stereo), so the
+# cache is bounded by bytes, not by entry count.
+DEFAULT_SOUND_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class DecodedAudioCache:
+    """
+    Thread-safe LRU of decoded sounds, keyed by path + mtime and bounded by
+    a byte budget.
+
+    `load(path)` decodes a file and `sizeof(sound)` says how many bytes it
+    holds; both come from the caller so this module doesn't depend on the
+    mixer. Pinned paths (the playing and next ambient track) are never
+    evicted, even if that takes the cache over budget; once unpinned they
+    are trimmed like everything else. Pins are counted, so a path pinned
+    twice (say by an ambient run that is stopping and one that is starting)
+    stays pinned until both unpin it.
+    """
+
+    def __init__(self, load, sizeof, budget_bytes=DEFAULT_SOUND_CACHE_BYTES):
+        self.load = load
+        self.sizeof = sizeof
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._items = OrderedDict()  # (path, mtime_ns) -> (sound, nbytes)
+        self._pinned = Counter()  # path -> pin count
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return the decoded sound for `path`, decoding (and caching) it on a miss."""
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+        except OSError:
+            key = None
+        if key is not None:
+            with self._lock:
+                entry = self._items.get(key)
+                if entry is not None:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+        # Decode outside the lock so other threads aren't held up
+        sound = self.load(path)
+        if key is not None:
+            self._put(key, sound, self.sizeof(sound))
+        return sound
+
+    def pin(self, *paths):
+        with self._lock:
+            self._pinned.update(paths)  # Counter.update adds one per path
+
+    def unpin(self, *paths):
+        with self._lock:
+            self._pinned.subtract(paths)
+            for path in paths:
+                if self._pinned[path] <= 0:
+                    del self._pinned[path]
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def summary(self):
+        return (f"[Sound cache] {self.hits} hits, {self.misses} misses, {self.evictions} evicted, "
+                f"{len(self._items)} sounds / {self.bytes / 2 ** 20:.0f} of "
+                f"{self.budget_bytes / 2 ** 20:.0f} MB")
+
+    def _put(self, key, sound, nbytes):
+        if nbytes > self.budget_bytes:
+            return  # would push out everything else and still not fit
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            # A file rewritten in place leaves its old version behind under another mtime
+            for stale in [k for k in self._items if k[0] == key[0]]:
+                self.bytes -= self._items.pop(stale)[1]
+            self._items[key] = (sound, nbytes)
+            self.bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used unpinned sounds until within budget. Caller holds the lock."""
+        for key in list(self._items):
+            if self.bytes <= self.budget_bytes:
+                return
+            if key[0] in self._pinned:
+                continue
+            self.bytes -= self._items.pop(key)[1]
+            self.evictions += 1
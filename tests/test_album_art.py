@@ -0,0 +1,103 @@
+import io
+import os
+import pytest
+import allure
+from unittest.mock import MagicMock, patch
+from PIL import Image as PILImage
+from album_art import AlbumArtCache, get_album_art, get_thumbnail, build_thumbnails, thumbnail_path
+
+def _jpeg_bytes(size=(1000, 800)):
+    buf = io.BytesIO()
+    PILImage.new('RGB', size, (200, 30, 30)).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Album Art")
+@allure.feature("LRU Cache")
+class TestAlbumArtCache:
+
+    @allure.story("Eviction")
+    @allure.title("Least recently used cover is evicted first")
+    def test_lru_eviction(self):
+        cache = AlbumArtCache(max_items=2)
+        cache.put('a', b'A')
+        cache.put('b', b'B')
+        cache.get('a')          # 'a' is now most recently used
+        cache.put('c', b'C')    # evicts 'b'
+
+        assert cache.get('b') is None
+        assert cache.get('a') == b'A'
+        assert cache.get('c') == b'C'
+        assert len(cache) == 2
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Album Art")
+@allure.feature("On-Demand Loading")
+class TestGetAlbumArt:
+
+    @allure.story("Lazy Read")
+    @allure.title("Cover is read from disk once, then served from cache")
+    @patch('album_art.ID3')
+    def test_reads_once(self, mock_id3_class):
+        frame = MagicMock()
+        frame.data = b'jpegbytes'
+        mock_tags = MagicMock()
+        mock_tags.get.return_value = frame
+        mock_id3_class.return_value = mock_tags
+
+        cache = AlbumArtCache()
+        song = {'path': '/m/a.mp3', 'art_frame': 'APIC:', 'art_hash': 'h1'}
+
+        assert get_album_art(song, cache) == b'jpegbytes'
+        assert get_album_art(song, cache) == b'jpegbytes'
+        mock_id3_class.assert_called_once_with('/m/a.mp3')
+        mock_tags.get.assert_called_with('APIC:')
+
+    @allure.story("No Art")
+    @allure.title("Songs without an art reference never touch the disk")
+    @patch('album_art.ID3')
+    def test_no_reference(self, mock_id3_class):
+        assert get_album_art({'path': '/m/a.mp3', 'art_frame': None}, AlbumArtCache()) is None
+        assert get_album_art(None) is None
+        mock_id3_class.assert_not_called()
+
+    @allure.story("Inline Bytes")
+    @allure.title("Hand-built songs with raw bytes are returned directly")
+    def test_inline_bytes(self):
+        assert get_album_art({'album_art': b'raw'}, AlbumArtCache()) == b'raw'
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Album Art")
+@allure.feature("Thumbnail Cache")
+class TestThumbnails:
+
+    @allure.story("Downscaling")
+    @allure.title("Large covers are rendered once into a small PNG")
+    @patch('album_art.read_album_art')
+    def test_build_and_reuse(self, mock_read, tmp_path):
+        mock_read.return_value = _jpeg_bytes()
+        songs = [
+            {'path': '/m/a.mp3', 'art_frame': 'APIC:', 'art_hash': 'h1'},
+            {'path': '/m/b.mp3', 'art_frame': 'APIC:', 'art_hash': 'h1'},  # same cover
+            {'path': '/m/c.mp3', 'art_frame': None, 'art_hash': None},
+        ]
+
+        assert build_thumbnails(songs, size=200, thumb_dir=str(tmp_path)) == 1
+        assert mock_read.call_count == 1
+
+        path = thumbnail_path('h1', 200, str(tmp_path))
+        with PILImage.open(path) as img:
+            assert max(img.size) == 200
+
+        # Second build finds it on disk and does no work
+        assert build_thumbnails(songs, size=200, thumb_dir=str(tmp_path)) == 0
+        assert get_thumbnail(songs[0], size=200, thumb_dir=str(tmp_path)) == path
+
+    @allure.story("No Art")
+    @allure.title("Songs without a content hash have no thumbnail")
+    def test_no_hash(self, tmp_path):
+        assert get_thumbnail({'album_art': b'raw'}, thumb_dir=str(tmp_path)) is None
+        assert os.listdir(tmp_path) == []
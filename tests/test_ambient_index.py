@@ -0,0 +1,82 @@
+import os
+import random
+import pytest
+import allure
+from unittest.mock import patch
+from ambient_index import AmbientIndex
+
+
+def _touch(folder, *names):
+    for name in names:
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb'):
+            pass
+
+
+def _bump(folder):
+    """Move the folder's mtime on, as adding or removing a file would on a coarse-clocked filesystem."""
+    st = os.stat(folder)
+    os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    _touch(str(tmp_path), 'a.mp3', 'b.MP3', 'notes.txt', 'sub/c.mp3')
+    return str(tmp_path)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Ambient Mode")
+@allure.feature("Ambient Index")
+class TestAmbientIndex:
+
+    @allure.story("File Discovery")
+    @allure.title("Tracks are found in subfolders too, and only once while the folder is unchanged")
+    def test_cached(self, folder):
+        index = AmbientIndex(folder)
+        assert [os.path.relpath(p, folder) for p in index.files()] == ['a.mp3', 'b.MP3', os.path.join('sub', 'c.mp3')]
+        with patch('ambient_index.os.walk') as walk:
+            index.files()
+            index.next()
+            walk.assert_not_called()
+        assert index.scans == 1
+
+    @allure.story("File Discovery")
+    @allure.title("A track added to or removed from the folder is picked up")
+    def test_rescan(self, folder):
+        index = AmbientIndex(folder)
+        index.files()
+        _touch(folder, 'sub/d.mp3')
+        os.remove(os.path.join(folder, 'a.mp3'))
+        _bump(os.path.join(folder, 'sub'))
+        _bump(folder)
+        names = sorted(os.path.basename(p) for p in index.files())
+        assert names == ['b.MP3', 'c.mp3', 'd.mp3'] and index.scans == 2
+
+    @allure.story("Shuffle")
+    @allure.title("Every track plays once per round and none plays twice in a row")
+    def test_no_repeats(self, folder):
+        index = AmbientIndex(folder, rng=random.Random(1))
+        dealt = [index.next() for _ in range(30)]
+        for i in range(0, 30, 3):
+            assert sorted(dealt[i:i + 3]) == sorted(index.files())
+        assert all(a != b for a, b in zip(dealt, dealt[1:]))
+
+    @allure.story("Shuffle")
+    @allure.title("peek() shows the next track, even when a track is added part-way through a round")
+    def test_peek(self, folder):
+        index = AmbientIndex(folder, rng=random.Random(2))
+        index.next()
+        upcoming = index.peek()
+        _touch(folder, 'e.mp3')
+        _bump(folder)
+        assert index.next() == upcoming
+        rest = {index.next(), index.next()}
+        assert os.path.join(folder, 'e.mp3') in rest
+
+    @allure.story("File Discovery")
+    @allure.title("An empty or missing folder has nothing to deal")
+    def test_empty(self, tmp_path):
+        index = AmbientIndex(str(tmp_path / 'missing'))
+        assert index.files() == [] and index.next() is None
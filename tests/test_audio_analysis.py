@@ -0,0 +1,301 @@
+import os
+import shutil
+import pytest
+import allure
+import numpy as np
+from unittest.mock import patch
+from library_cache import MetadataCache
+from audio_analysis import (analyze_cues, analyze_loudness, analyze_tempo_key, camelot, fingerprint, analyze_library, block_power, decode_pcm,
+                            gain_to_volume, measure_loudness, read_analysis_results,
+                            run_analysis_process, TARGET_LOUDNESS_DB)
+
+TEST_MP3 = os.path.join(os.path.dirname(__file__), '..', 'I_am_a_test.mp3')
+RATE = 8000
+
+def _sine(amplitude, seconds=3.0, freq=440.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Audio Analysis")
+@allure.feature("Loudness")
+class TestLoudness:
+
+    @allure.story("Level")
+    @allure.title("A full-scale sine measures about -3 dBFS")
+    def test_full_scale_sine(self):
+        assert measure_loudness(_sine(1.0), RATE) == pytest.approx(-3.01, abs=0.05)
+
+    @allure.story("Level")
+    @allure.title("Halving the amplitude lowers loudness by 6 dB")
+    def test_relative_level(self):
+        loud = measure_loudness(_sine(0.8), RATE)
+        quiet = measure_loudness(_sine(0.4), RATE)
+        assert loud - quiet == pytest.approx(6.02, abs=0.05)
+
+    @allure.story("Gating")
+    @allure.title("Silent lead-in does not drag the measurement down")
+    def test_gating_ignores_silence(self):
+        padded = np.concatenate([np.zeros(RATE * 5, dtype=np.float32), _sine(0.5)])
+        # Averaging in the silence would read ~4 dB low
+        assert measure_loudness(padded, RATE) == pytest.approx(measure_loudness(_sine(0.5), RATE), abs=0.5)
+
+    @allure.story("Gating")
+    @allure.title("Pure silence has no loudness and no gain")
+    def test_silence(self):
+        assert measure_loudness(np.zeros(RATE, dtype=np.float32), RATE) is None
+        assert analyze_loudness(np.zeros(RATE, dtype=np.float32), RATE)['gain_db'] == 0.0
+
+    @allure.story("Blocks")
+    @allure.title("Blocks overlap every 100 ms")
+    def test_block_count(self):
+        power = block_power(np.ones(RATE, dtype=np.float32), RATE)
+        assert len(power) == 7   # 400 ms blocks starting at 0, 100 ... 600 ms
+        assert np.allclose(power, 1.0)
+
+    @allure.story("Gain")
+    @allure.title("Gain brings loud tracks down to the target and never clips quiet ones")
+    def test_gain(self):
+        loud = analyze_loudness(_sine(1.0), RATE)
+        assert loud['gain_db'] == pytest.approx(TARGET_LOUDNESS_DB + 3.01, abs=0.05)
+
+        quiet = _sine(0.01)
+        quiet[100] = 0.5    # one click near full scale
+        assert analyze_loudness(quiet, RATE)['gain_db'] == pytest.approx(6.02, abs=0.05)  # limited by the peak
+
+    @allure.story("Volume")
+    @allure.title("Gains turn into pygame volumes that never exceed 1.0")
+    def test_gain_to_volume(self):
+        assert gain_to_volume(-6.0206) == pytest.approx(0.5, abs=1e-4)
+        assert gain_to_volume(4.0) == 1.0
+        assert gain_to_volume(None) == 1.0
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Audio Analysis")
+@allure.feature("Cue Points")
+class TestCuePoints:
+
+    @allure.story("Silence")
+    @allure.title("Leading and trailing silence are found to the frame")
+    def test_silence_trimmed(self):
+        track = np.concatenate([np.zeros(RATE * 2, dtype=np.float32), _sine(0.5, seconds=20),
+                                np.zeros(RATE * 3, dtype=np.float32)])
+        cues = analyze_cues(track, RATE)
+        assert cues['cue_in'] == pytest.approx(2.0, abs=0.05)
+        assert cues['cue_out'] == pytest.approx(22.0, abs=0.05)
+        # Hard ending: leave room for a full transition before the music stops
+        assert cues['mix_out'] == pytest.approx(17.0, abs=0.05)
+
+    @allure.story("Outro")
+    @allure.title("A long fade-out moves the mix-out point to where the fade begins")
+    def test_fade_out(self):
+        track = _sine(0.5, seconds=60)
+        fade = np.ones_like(track)
+        fade[RATE * 30:] = np.linspace(1.0, 0.0, RATE * 30)
+        cues = analyze_cues(track * fade, RATE)
+        # ~12 dB down once the amplitude is at a quarter: 30 s + 0.75 * 30 s, a bit
+        # later since the fade itself pulls the track's loudness down
+        assert 52.0 < cues['mix_out'] < 54.0
+        assert cues['mix_out'] < cues['cue_out'] - 5
+
+    @allure.story("Silence")
+    @allure.title("A silent file gets cues that change nothing")
+    def test_silent_file(self):
+        cues = analyze_cues(np.zeros(RATE * 10, dtype=np.float32), RATE)
+        assert cues == {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 5.0}
+
+
+def _clicks(bpm, seconds=60.0):
+    """Noise bursts on every beat, like a bare drum track."""
+    rng = np.random.default_rng(0)
+    track = np.zeros(int(RATE * seconds), dtype=np.float32)
+    burst = (rng.standard_normal(200) * np.exp(-np.arange(200) / 40)).astype(np.float32) * 0.5
+    for t in np.arange(0, seconds - 0.1, 60.0 / bpm):
+        track[int(t * RATE):int(t * RATE) + 200] += burst
+    return track
+
+def _chord(freqs, seconds=20.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (0.1 * sum(np.sin(2 * np.pi * f * t) for f in freqs)).astype(np.float32)
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Audio Analysis")
+@allure.feature("Tempo and Key")
+class TestTempoKey:
+
+    @allure.story("Tempo")
+    @allure.title("Beat tempo is recovered within 1.5%")
+    @pytest.mark.parametrize("bpm", [75, 100, 128, 150])
+    def test_bpm(self, bpm):
+        assert analyze_tempo_key(_clicks(bpm), RATE)['bpm'] == pytest.approx(bpm, rel=0.015)
+
+    @allure.story("Tempo")
+    @allure.title("Music without a beat has no tempo")
+    def test_no_beat(self):
+        assert analyze_tempo_key(_chord([220.0, 261.63, 329.63]), RATE)['bpm'] is None
+
+    @allure.story("Key")
+    @allure.title("Triads are matched to their key")
+    @pytest.mark.parametrize("freqs, key, code", [
+        ([110.0, 220.0, 261.63, 329.63], 'A minor', '8A'),
+        ([196.0, 246.94, 293.66, 392.0], 'G major', '9B'),
+    ])
+    def test_key(self, freqs, key, code):
+        result = analyze_tempo_key(_chord(freqs), RATE)
+        assert (result['key'], result['camelot']) == (key, code)
+
+    @allure.story("Key")
+    @allure.title("Camelot codes follow the wheel")
+    def test_camelot(self):
+        assert camelot(0, False) == '8B'    # C major
+        assert camelot(9, True) == '8A'     # A minor, its relative
+        assert camelot(2, False) == '10B'   # D major
+
+
+def _overlap(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / min(len(a), len(b))
+
+@pytest.fixture(scope="module")
+def song():
+    # A minute of random chords with percussive attacks
+    rng = np.random.default_rng(1)
+    t = np.arange(int(22050 * 0.5)) / 22050
+    notes = []
+    for _ in range(120):
+        freqs = 440.0 * 2 ** (rng.integers(-12, 12, 3) / 12)
+        note = sum(np.sin(2 * np.pi * f * t) * rng.uniform(0.2, 0.5) for f in freqs) * np.exp(-t * 3)
+        note[:300] += rng.standard_normal(300) * 0.5
+        notes.append(note)
+    return (np.concatenate(notes) * 0.3).astype(np.float32)
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Audio Analysis")
+@allure.feature("Fingerprints")
+class TestFingerprint:
+
+    @allure.story("Robustness")
+    @allure.title("Copies at another level, offset or sample rate still match")
+    def test_copies_match(self, song):
+        base = fingerprint(song, 22050)
+        assert len(base) > 30
+        assert _overlap(base, fingerprint(song * 0.5, 22050)) > 0.9
+        assert _overlap(base, fingerprint(song[37:], 22050)) > 0.4
+        assert _overlap(base, fingerprint(np.repeat(song, 2), 44100)) > 0.8
+
+    @allure.story("Robustness")
+    @allure.title("Different songs share almost nothing")
+    def test_different_songs(self, song):
+        other = np.roll(song[::-1], 12345)
+        assert _overlap(fingerprint(song, 22050), fingerprint(other, 22050)) < 0.1
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Audio Analysis")
+@allure.feature("Library Analysis")
+class TestAnalyzeLibrary:
+
+    @allure.story("Decoding")
+    @allure.title("Real MP3s decode to mono samples in range")
+    def test_decode_real_file(self):
+        samples, rate = decode_pcm(TEST_MP3)
+        assert samples.ndim == 1 and samples.dtype == np.float32
+        assert len(samples) / rate == pytest.approx(1.22, abs=0.1)
+        assert 0 < np.max(np.abs(samples)) <= 1.0
+
+    @allure.story("Incremental")
+    @allure.title("Only new or changed files are decoded again")
+    @patch('audio_analysis.decode_pcm')
+    def test_incremental(self, mock_decode, tmp_path):
+        mock_decode.return_value = (_sine(0.5), RATE)
+        paths = []
+        for name in ('a.mp3', 'b.mp3'):
+            path = tmp_path / name
+            path.write_bytes(b'x')
+            paths.append(str(path))
+        cache = MetadataCache(':memory:')
+
+        stats = {}
+        first = analyze_library(paths, cache=cache, workers=1, stats=stats)
+        assert mock_decode.call_count == 2
+        assert (stats['analyzed'], stats['cached']) == (2, 0)
+        assert first[paths[0]]['gain_db'] < 0
+
+        (tmp_path / 'b.mp3').write_bytes(b'changed')
+        stats = {}
+        second = analyze_library(paths, cache=cache, workers=1, stats=stats)
+        assert mock_decode.call_count == 3
+        assert (stats['analyzed'], stats['cached']) == (1, 1)
+        assert second[paths[0]] == first[paths[0]]
+
+    @allure.story("Incremental")
+    @allure.title("Each result is committed at once, so the app's writes never wait behind the analyzer")
+    @patch('audio_analysis.decode_pcm')
+    def test_commits_each_result(self, mock_decode, tmp_path):
+        mock_decode.return_value = (_sine(0.5), RATE)
+        paths = []
+        for name in ('a.mp3', 'b.mp3'):
+            path = tmp_path / name
+            path.write_bytes(b'x')
+            paths.append(str(path))
+        db = str(tmp_path / 'lib.sqlite3')
+        with patch('library_cache.BUSY_TIMEOUT', 0.1):
+            cache = MetadataCache(db)
+            app = MetadataCache(db)
+        app_writes = []
+
+        def on_result(path, data):
+            app.store('/m/new.mp3', 1, 1, {'title': 'New'})
+            app.commit()
+            app_writes.append(path)
+
+        analyze_library(paths, cache=cache, workers=1, on_result=on_result)
+        assert app_writes == paths
+        cache.close()
+        app.close()
+
+    @allure.story("Errors")
+    @allure.title("Undecodable files are reported, not fatal")
+    @patch('audio_analysis.decode_pcm', side_effect=RuntimeError('bad mp3'))
+    def test_failure(self, mock_decode, tmp_path):
+        path = tmp_path / 'bad.mp3'
+        path.write_bytes(b'x')
+        stats = {}
+        assert analyze_library([str(path)], workers=1, stats=stats) == {}
+        assert stats['failed'] == 1
+
+    @allure.story("Process Pool")
+    @allure.title("Worker processes analyze real files")
+    def test_process_pool(self, tmp_path):
+        paths = []
+        for i in range(3):
+            path = str(tmp_path / f'{i}.mp3')
+            shutil.copy(TEST_MP3, path)
+            paths.append(path)
+        received = []
+        stats = {}
+        results = analyze_library(paths, workers=2, stats=stats,
+                                  on_result=lambda p, d: received.append(p))
+        assert sorted(received) == sorted(paths)
+        assert stats['tracks_per_sec'] > 0
+        assert len({results[p]['gain_db'] for p in paths}) == 1
+
+    @allure.story("Analyzer Process")
+    @allure.title("The app's analyzer process streams every song's result, cached or not")
+    def test_analysis_process(self, tmp_path):
+        music = tmp_path / 'mp3'
+        music.mkdir()
+        for i in range(2):
+            shutil.copy(TEST_MP3, music / f'{i}.mp3')
+        db = str(tmp_path / 'lib.sqlite3')
+
+        for _ in range(2):   # second run is served from the cache
+            proc = run_analysis_process(str(music), db, workers=1)
+            results = dict(read_analysis_results(proc.stdout))
+            assert proc.wait() == 0
+            assert sorted(os.path.basename(p) for p in results) == ['0.mp3', '1.mp3']
+            assert all('gain_db' in d and 'cue_in' in d for d in results.values())
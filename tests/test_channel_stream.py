@@ -0,0 +1,188 @@
+import io
+import pytest
+import allure
+import numpy as np
+from unittest.mock import patch
+from channel_stream import ArraySource, ChannelStream, DecoderSource
+
+
+class _Channel:
+    """Mixer channel stand-in; finish() ends the playing sound like the mixer would."""
+
+    def __init__(self):
+        self.playing = self.queued = None
+        self.log = []
+
+    def play(self, sound):
+        self.log.append(('play', sound))
+        self.playing, self.queued = sound, None
+
+    def queue(self, sound):
+        self.log.append(('queue', sound))
+        self.queued = sound
+
+    def get_queue(self):
+        return self.queued
+
+    def get_busy(self):
+        return self.playing is not None
+
+    def stop(self):
+        self.playing = self.queued = None
+
+    def finish(self):
+        self.playing, self.queued = self.queued, None
+
+
+def _stream():
+    ch = _Channel()
+    return ChannelStream(ch, make_sound=lambda frames: len(frames), rate=1000), ch
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Channel Stream")
+class TestChannelStream:
+
+    @allure.story("Queueing")
+    @allure.title("The first block plays and the next waits in the channel's queue")
+    def test_play_then_queue(self):
+        stream, ch = _stream()
+        stream.feed(np.zeros(500), tag='a')
+        assert stream.room()
+        stream.feed(np.zeros(300))
+        assert not stream.room()
+        assert ch.log == [('play', 500), ('queue', 300)]
+
+    @allure.story("Progress")
+    @allure.title("Tags are reported as their blocks start playing")
+    def test_tags(self):
+        stream, ch = _stream()
+        stream.feed(np.zeros(500), tag='a')
+        stream.feed(np.zeros(300), tag='b')
+        assert stream.poll() == ['a']
+        assert stream.poll() == []
+        ch.finish()
+        assert stream.room() and stream.poll() == ['b']
+        ch.finish()
+        assert not stream.busy()
+
+    @allure.story("Progress")
+    @allure.title("The end of the playing block is known from the frames handed over")
+    def test_next_due(self):
+        stream, ch = _stream()
+        assert stream.next_due() is None
+        stream.feed(np.zeros(500))
+        stream.feed(np.zeros(300))
+        first_due = stream.next_due()
+        ch.finish()
+        stream.room()
+        assert stream.next_due() == pytest.approx(first_due + 0.3)
+
+    @allure.story("Underrun")
+    @allure.title("A queued block that started and ended unseen is still reported")
+    def test_missed_block(self):
+        stream, ch = _stream()
+        stream.feed(np.zeros(500), tag='a')
+        stream.feed(np.zeros(300), tag='b')
+        stream.poll()
+        ch.finish()
+        ch.finish()
+        assert stream.poll() == ['b'] and not stream.busy()
+
+    @allure.story("Stopping")
+    @allure.title("Stopping empties the channel and the stream")
+    def test_stop(self):
+        stream, ch = _stream()
+        stream.feed(np.zeros(500))
+        stream.feed(np.zeros(300))
+        stream.stop()
+        assert not stream.busy() and ch.playing is None
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Channel Stream")
+class TestArraySource:
+
+    @allure.story("Reading")
+    @allure.title("Blocks are views into the decoded samples, read from the start frame")
+    def test_read(self):
+        samples = np.arange(10)
+        src = ArraySource(samples, start=3)
+        block = src.read(4)
+        assert block.tolist() == [3, 4, 5, 6] and block.base is samples
+        assert src.remaining() == 3
+        assert src.read(10).tolist() == [7, 8, 9]
+        assert len(src.read(10)) == 0
+
+
+class _Decoder:
+    """ffmpeg stand-in: `pcm` comes out of stdout, then it exits with `returncode`."""
+
+    def __init__(self, pcm, returncode=0, error=b''):
+        self.stdout = io.BytesIO(pcm)
+        self.stderr = io.BytesIO(error)
+        self.returncode = None
+        self._exit = returncode
+        self.killed = False
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        self.returncode = self._exit
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Channel Stream")
+class TestDecoderSource:
+
+    @allure.story("Reading")
+    @allure.title("Blocks come from the decoder in the mixer's format, starting at the requested frame")
+    @patch('channel_stream.subprocess.Popen')
+    def test_read(self, mock_popen):
+        pcm = np.arange(20, dtype=np.int16).reshape(-1, 2)
+        mock_popen.return_value = _Decoder(pcm.tobytes())
+        src = DecoderSource('/a.mp3', rate=1000, start=500, end=600)
+
+        cmd = mock_popen.call_args[0][0]
+        assert cmd[cmd.index('-ss') + 1] == '0.500000' and cmd[cmd.index('-f') + 1] == 's16le'
+        assert src.read(4).tolist() == pcm[:4].tolist()
+        assert src.pos == 504 and src.remaining() == 96
+        assert src.read(100).tolist() == pcm[4:].tolist()
+        assert src.remaining() == 0 and len(src.read(100)) == 0
+
+    @allure.story("Reading")
+    @allure.title("A track longer than its tags said is read to its real end")
+    @patch('channel_stream.subprocess.Popen')
+    def test_longer_than_tagged(self, mock_popen):
+        mock_popen.return_value = _Decoder(np.zeros((30, 2), dtype=np.int16).tobytes())
+        src = DecoderSource('/a.mp3', rate=1000, end=10)
+        assert len(src.read(20)) == 20
+        assert len(src.read(20)) == 10 and src.remaining() == 0
+
+    @allure.story("Errors")
+    @allure.title("A file the decoder can't read raises instead of playing as silence")
+    @patch('channel_stream.subprocess.Popen')
+    def test_decode_error(self, mock_popen):
+        mock_popen.return_value = _Decoder(b'', returncode=1, error=b'Invalid data found')
+        src = DecoderSource('/bad.mp3', rate=1000)
+        with pytest.raises(RuntimeError, match='Invalid data'):
+            src.read(10)
+
+    @allure.story("Stopping")
+    @allure.title("Closing a source part-way stops its decoder")
+    @patch('channel_stream.subprocess.Popen')
+    def test_close(self, mock_popen):
+        proc = _Decoder(np.zeros((30, 2), dtype=np.int16).tobytes())
+        mock_popen.return_value = proc
+        src = DecoderSource('/a.mp3', rate=1000)
+        src.read(5)
+        src.close()
+        assert proc.killed and len(src.read(5)) == 0
@@ -0,0 +1,120 @@
+import pytest
+import allure
+import numpy as np
+from crossfade_mixer import envelope, fade_gains, mix_overlap, render
+
+RATE = 8000
+BLOCK = 80  # 10 ms
+
+
+def _level(seconds, value):
+    """Stereo int16 block at a constant level, so a block's envelope is its gain."""
+    return np.full((int(RATE * seconds), 2), value, dtype=np.int16)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Crossfade Mixer")
+class TestCurves:
+
+    @allure.story("Equal Power")
+    @allure.title("Equal-power gains keep the summed power constant through the fade")
+    def test_equal_power(self):
+        out, inn = fade_gains(1000)
+        assert np.allclose(out ** 2 + inn ** 2, 1.0)
+        assert out[500] == pytest.approx(np.sqrt(0.5), abs=0.01)
+
+    @allure.story("Linear")
+    @allure.title("A linear crossfade dips to half gain on each side halfway")
+    def test_linear(self):
+        out, inn = fade_gains(1000, 'linear')
+        assert np.allclose(out + inn, 1.0)
+        assert out[500] == pytest.approx(0.5, abs=0.01)
+
+    @allure.story("Errors")
+    @allure.title("Unknown curve names are rejected")
+    def test_unknown_curve(self):
+        with pytest.raises(ValueError):
+            fade_gains(10, 'log')
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Crossfade Mixer")
+class TestRenderedFade:
+
+    @allure.story("Overlap")
+    @allure.title("The rendered overlap follows the curve block by block on both sides")
+    def test_overlap_envelope(self):
+        out_env = envelope(mix_overlap(_level(1, 10000), _level(1, 0)), BLOCK) / 10000
+        in_env = envelope(mix_overlap(_level(1, 0), _level(1, 10000)), BLOCK) / 10000
+        # The loudest frame of each 10 ms block sits at its start (fading out) or end (fading in)
+        starts = (np.arange(len(out_env)) * BLOCK + 0.5) / RATE
+        ends = ((np.arange(len(in_env)) + 1) * BLOCK - 0.5) / RATE
+        assert np.allclose(out_env, np.cos(starts * np.pi / 2), atol=0.001)
+        assert np.allclose(in_env, np.sin(ends * np.pi / 2), atol=0.001)
+
+    @allure.story("Overlap")
+    @allure.title("Uncorrelated songs keep their power through an equal-power overlap")
+    def test_overlap_power(self):
+        rng = np.random.default_rng(0)
+        a = (rng.standard_normal((RATE, 2)) * 3000).astype(np.int16)
+        b = (rng.standard_normal((RATE, 2)) * 3000).astype(np.int16)
+        mixed = mix_overlap(a, b).astype(np.float64)
+        power = (mixed[:, 0] ** 2).reshape(-1, 800).mean(axis=1)
+        assert np.allclose(power, 3000 ** 2, rtol=0.15)
+
+        linear = mix_overlap(a, b, curve='linear').astype(np.float64)
+        assert (linear[3600:4400, 0] ** 2).mean() < 0.6 * 3000 ** 2  # the dip equal-power avoids
+
+    @allure.story("Volume")
+    @allure.title("Each side of the overlap is rendered at its own song's volume")
+    def test_volumes(self):
+        mixed = mix_overlap(_level(1, 8000), _level(1, 8000), out_volume=0.5, in_volume=0.25)
+        assert mixed[0, 0] == pytest.approx(4000, abs=2)
+        assert mixed[-1, 0] == pytest.approx(2000, abs=2)
+
+    @allure.story("Overlap")
+    @allure.title("An incoming song shorter than the fade is padded with silence")
+    def test_short_incoming(self):
+        mixed = mix_overlap(_level(1, 0), _level(0.5, 10000))
+        assert len(mixed) == RATE
+        assert (mixed[RATE // 2:] == 0).all()
+
+    @allure.story("Clipping")
+    @allure.title("Integer samples are rounded and clipped, not wrapped")
+    def test_integer_clip(self):
+        out = render(np.full(4, 32767, dtype=np.int16), np.array([1.5, 1.0, 0.5, 0.0]))
+        assert out.tolist() == [32767, 32767, 16384, 0]
+
+    @allure.story("Sources")
+    @allure.title("Rendering never writes to the source samples")
+    def test_source_untouched(self):
+        src = _level(1, 1000)
+        render(src)[:] = 0
+        render(src, 0.5)
+        mix_overlap(src, src)
+        assert (src == 1000).all()
+
+    @allure.story("Overlap")
+    @allure.title("An outgoing song that runs out early is padded, so none of the incoming block is lost")
+    def test_short_outgoing(self):
+        mixed = mix_overlap(_level(0.5, 0), _level(1, 10000))
+        assert len(mixed) == RATE
+        assert mixed[-1, 0] == pytest.approx(10000, abs=2)
+
+    @allure.story("Sample Formats")
+    @allure.title("Unsigned samples are faded and mixed around their midpoint, so silence stays silent")
+    def test_unsigned(self):
+        silence = np.full((RATE, 2), 32768, dtype=np.uint16)
+        loud = np.full((RATE, 2), 32768 + 10000, dtype=np.uint16)
+        assert render(loud, 0.5)[0, 0] == 32768 + 5000
+        assert (render(silence, 0.3) == 32768).all()
+
+        mixed = mix_overlap(loud[:RATE // 2], silence)  # the outgoing song runs out half-way
+        assert mixed[0, 0] == pytest.approx(32768 + 10000, abs=2)
+        assert (mixed[RATE // 2:] == 32768).all()  # padding is silence, not full-scale negative
+        assert mixed[-RATE // 2 - 1, 0] > 32768 and mixed.dtype == np.uint16
+
+        u8 = mix_overlap(np.full(100, 128, dtype=np.uint8), np.full(100, 128, dtype=np.uint8))
+        assert (u8 == 128).all()
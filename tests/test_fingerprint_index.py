@@ -0,0 +1,52 @@
+import pytest
+import allure
+from fingerprint_index import FingerprintIndex
+
+def _hashes(start, count=100):
+    return list(range(start, start + count))
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Duplicate Detection")
+@allure.feature("Fingerprint Index")
+class TestFingerprintIndex:
+
+    @allure.story("Matching")
+    @allure.title("Songs sharing most of their hashes are grouped, unrelated ones are not")
+    def test_grouping(self):
+        index = FingerprintIndex()
+        index.add('/m/original.mp3', _hashes(0))
+        index.add('/m/copy.mp3', _hashes(30))       # 70% overlap
+        index.add('/m/other.mp3', _hashes(125))     # only 5 hashes shared with the copy: not enough
+
+        assert index.duplicates_of('/m/original.mp3') == {'/m/copy.mp3'}
+        assert index.duplicates_of('/m/other.mp3') == set()
+        assert index.groups() == [{'/m/original.mp3', '/m/copy.mp3'}]
+
+    @allure.story("Matching")
+    @allure.title("Groups are transitive through a shared copy")
+    def test_transitive(self):
+        index = FingerprintIndex()
+        index.add('/m/a.mp3', _hashes(0))
+        index.add('/m/c.mp3', _hashes(140))
+        index.add('/m/b.mp3', _hashes(70))   # overlaps both a and c
+        assert index.duplicates_of('/m/a.mp3') == {'/m/b.mp3', '/m/c.mp3'}
+
+    @allure.story("Removal")
+    @allure.title("Removing the linking copy splits the group again")
+    def test_remove(self):
+        index = FingerprintIndex()
+        index.add('/m/a.mp3', _hashes(0))
+        index.add('/m/c.mp3', _hashes(140))
+        index.add('/m/b.mp3', _hashes(70))
+        index.remove('/m/b.mp3')
+        assert index.groups() == []
+        assert len(index) == 2
+
+    @allure.story("Lookup")
+    @allure.title("Hidden copies exclude the songs that were asked about")
+    def test_duplicates_of_any(self):
+        index = FingerprintIndex()
+        for name in ('a', 'b', 'c'):
+            index.add(f'/m/{name}.mp3', _hashes(0))
+        assert index.duplicates_of_any(['/m/a.mp3', '/m/b.mp3']) == {'/m/c.mp3'}
@@ -0,0 +1,71 @@
+import pytest
+import allure
+from mutagen.id3 import ID3, TIT2, TPE1, TCON, APIC, TXXX
+from id3_reader import read_fast_tags, art_hash
+from album_art import read_album_art
+from song_library import _read_song_metadata
+
+COVER = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 2000  # ~500 KB "JPEG"
+
+def _mp3(path, version=4, encoding=3, title='Title', artist='A/B', genre='Rock', cover=COVER, desc=''):
+    path.write_bytes(b'\xff\xfb\x90\x00' + b'\0' * 413)
+    tags = ID3()
+    tags.add(TXXX(encoding=3, desc='note', text=['x' * 3000]))  # a frame to skip over
+    if cover is not None:
+        tags.add(APIC(encoding=encoding, mime='image/jpeg', type=3, desc=desc, data=cover))
+    tags.add(TIT2(encoding=encoding, text=[title]))
+    tags.add(TPE1(encoding=encoding, text=[artist]))
+    tags.add(TCON(encoding=encoding, text=[genre]))
+    tags.save(str(path), v2_version=version)
+    return str(path)
+
+
+@allure.epic("Song Library Management")
+@allure.suite("ID3 Reader")
+@allure.feature("Fast Tag Path")
+class TestFastTags:
+
+    @allure.story("Parity")
+    @allure.title("Fast path matches mutagen for v2.3 and v2.4 tags in every text encoding")
+    @pytest.mark.parametrize("version, encoding", [(3, 0), (3, 1), (4, 0), (4, 1), (4, 3)])  # no UTF-8 in v2.3
+    def test_matches_mutagen(self, tmp_path, version, encoding):
+        path = _mp3(tmp_path / 'song.mp3', version, encoding, title='Café', genre='(17)', desc='Front')
+        fast = read_fast_tags(path)
+        tags = ID3(path)
+        assert fast.text == {'TIT2': tags['TIT2'].text[0], 'TPE1': tags['TPE1'].text[0],
+                             'TCON': tags['TCON'].text[0]}
+        assert fast.text['TCON'] == 'Rock'
+        assert fast.art_key == 'APIC:Front' == tags.getall('APIC')[0].HashKey
+        assert fast.art_hash == art_hash(COVER)
+        with open(path, 'rb') as f:
+            f.seek(fast.art_offset)
+            assert f.read(fast.art_length) == COVER
+
+    @allure.story("Bytes Read")
+    @allure.title("The cover payload is skipped instead of read")
+    def test_skips_cover(self, tmp_path):
+        fast = read_fast_tags(_mp3(tmp_path / 'song.mp3'))
+        assert fast.bytes_read < 10_000 < len(COVER)
+
+    @allure.story("Fallback")
+    @allure.title("Files without an ID3v2 tag are left to mutagen")
+    def test_no_tag(self, tmp_path):
+        path = tmp_path / 'bare.mp3'
+        path.write_bytes(b'\xff\xfb\x90\x00' + b'\0' * 413)
+        assert read_fast_tags(str(path)) is None
+        assert read_fast_tags(str(tmp_path / 'missing.mp3')) is None
+
+    @allure.story("Records")
+    @allure.title("Scanned records carry the cover location and load it directly")
+    def test_record_and_direct_read(self, tmp_path):
+        path = _mp3(tmp_path / 'song.mp3', title='Hello', artist='Ann; Bob', genre='Pop')
+        song = _read_song_metadata(path)
+        assert (song['title'], song['artists'], song['genres']) == ('Hello', ['Ann', 'Bob'], ['pop'])
+        assert song['art_frame'] == 'APIC:' and song['art_hash'] == art_hash(COVER)
+        assert read_album_art(path, song['art_frame'], song['art_offset'], song['art_length']) == COVER
+
+    @allure.story("Records")
+    @allure.title("A stale cover offset falls back to parsing the tag")
+    def test_stale_offset(self, tmp_path):
+        path = _mp3(tmp_path / 'song.mp3')
+        assert read_album_art(path, 'APIC:', 5, 100) == COVER
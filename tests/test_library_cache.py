@@ -0,0 +1,113 @@
+import pytest
+import allure
+from unittest.mock import patch
+from library_cache import MetadataCache
+from song_library import get_all_mp3_files_with_metadata
+
+@pytest.fixture
+def cache(tmp_path):
+    c = MetadataCache(str(tmp_path / 'library.sqlite3'))
+    yield c
+    c.close()
+
+def _song(path, title='Song'):
+    return {'path': path, 'title': title, 'artists': ['A'], 'genres': ['pop'], 'art_frame': 'APIC:', 'art_hash': 'abc'}
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Metadata Cache")
+@allure.feature("Cache Validation")
+class TestMetadataCache:
+
+    @allure.story("Hit")
+    @allure.title("Unchanged size and mtime serve the cached record")
+    def test_lookup_hit(self, cache):
+        cache.store('/m/a.mp3', 100, 5, _song('/m/a.mp3', 'Alpha'))
+        song = cache.lookup('/m/a.mp3', 100, 5)
+        assert song['title'] == 'Alpha'
+        assert song['art_frame'] == 'APIC:'
+        assert (cache.hits, cache.misses) == (1, 0)
+
+    @allure.story("Miss")
+    @allure.title("Changed mtime or size invalidates the entry")
+    @pytest.mark.parametrize("size, mtime", [(100, 6), (101, 5)])
+    def test_lookup_stale(self, cache, size, mtime):
+        cache.store('/m/a.mp3', 100, 5, _song('/m/a.mp3'))
+        assert cache.lookup('/m/a.mp3', size, mtime) is None
+        assert cache.misses == 1
+
+    @allure.story("Pruning")
+    @allure.title("Entries for deleted files are removed")
+    def test_prune(self, cache):
+        cache.store('/m/a.mp3', 1, 1, _song('/m/a.mp3'))
+        cache.store('/m/b.mp3', 1, 1, _song('/m/b.mp3'))
+        assert cache.prune(['/m/a.mp3']) == 1
+        assert cache.lookup('/m/b.mp3', 1, 1) is None
+
+    @allure.story("Persistence")
+    @allure.title("Records survive reopening; rescan discards them")
+    def test_reopen_and_rescan(self, tmp_path):
+        db = str(tmp_path / 'lib.sqlite3')
+        c = MetadataCache(db)
+        c.store('/m/a.mp3', 1, 1, _song('/m/a.mp3'))
+        c.close()
+
+        c = MetadataCache(db)
+        assert c.lookup('/m/a.mp3', 1, 1) is not None
+        c.close()
+
+        c = MetadataCache(db, rescan=True)
+        assert c.lookup('/m/a.mp3', 1, 1) is None
+        c.close()
+
+    @allure.story("Analysis")
+    @allure.title("Analysis results are validated like records and pruned with them")
+    def test_analysis_table(self, cache):
+        cache.store_analysis('/m/a.mp3', 100, 5, {'gain_db': -4.5})
+        assert cache.lookup_analysis('/m/a.mp3', 100, 5) == {'gain_db': -4.5}
+        assert cache.lookup_analysis('/m/a.mp3', 100, 6) is None
+
+        assert cache.prune([]) == 1
+        assert cache.lookup_analysis('/m/a.mp3', 100, 5) is None
+
+    @allure.story("Concurrency")
+    @allure.title("The catalog can be opened and read while another connection is writing")
+    def test_read_during_write(self, tmp_path):
+        db = str(tmp_path / 'lib.sqlite3')
+        writer = MetadataCache(db)
+        writer.store('/m/a.mp3', 1, 1, _song('/m/a.mp3'))
+        writer.commit()
+        writer.store('/m/b.mp3', 1, 1, _song('/m/b.mp3'))  # transaction left open
+
+        reader = MetadataCache(db)
+        assert reader.lookup('/m/a.mp3', 1, 1) is not None
+        assert reader.lookup('/m/b.mp3', 1, 1) is None
+        writer.close()
+        reader.close()
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Metadata Cache")
+@allure.feature("Incremental Scan")
+class TestIncrementalScan:
+
+    @allure.story("Second Launch")
+    @allure.title("Only modified files are re-parsed")
+    @patch('song_library._read_song_metadata')
+    @patch('song_library.file_signature')
+    @patch('song_library.os.walk')
+    def test_only_changed_files_parsed(self, mock_walk, mock_sig, mock_read, cache):
+        mock_walk.return_value = [('/m', [], ['a.mp3', 'b.mp3'])]
+        mock_read.side_effect = lambda path, stage_times=None: _song(path)
+        mock_sig.return_value = (10, 1)
+
+        get_all_mp3_files_with_metadata('/m', cache=cache)
+        assert mock_read.call_count == 2
+
+        mock_read.reset_mock()
+        mock_sig.side_effect = lambda path: (10, 2) if path.endswith('b.mp3') else (10, 1)
+        results = get_all_mp3_files_with_metadata('/m', cache=cache)
+
+        mock_read.assert_called_once_with('/m/b.mp3', {})
+        assert [s['path'] for s in results] == ['/m/a.mp3', '/m/b.mp3']
+        assert cache.hits == 1
@@ -0,0 +1,86 @@
+import os
+import time
+import pytest
+import allure
+from library_snapshot import write_snapshot, load_snapshot, snapshot_validators
+from song_library import Song
+
+@pytest.fixture
+def library(tmp_path):
+    music = tmp_path / 'mp3'
+    (music / 'sub').mkdir(parents=True)
+    playlist = tmp_path / 'default_playlist.json'
+    playlist.write_text('["b.mp3"]')
+    paths = [music / 'a.mp3', music / 'sub' / 'b.mp3']
+    for p in paths:
+        p.write_bytes(b'ID3' + b'\0' * 10)
+    songs = [
+        Song(0, str(paths[0]), 'Alpha', ['Ann', 'Bob'], ['Pop'], art_frame='APIC:', art_hash='h1',
+             duration=181.5, bitrate=320000, sample_rate=44100),
+        Song(1, str(paths[1]), 'Beta', ['Bob'], ['Rock']),
+    ]
+    validators = snapshot_validators(str(music), [str(playlist)])
+    path = str(tmp_path / 'library.snapshot')
+    write_snapshot(path, songs, {'primary': [songs[1]], 'default': [songs[0]]}, ['Ann', 'Bob'], validators)
+    return path, songs, music, playlist
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Library Snapshot")
+@allure.feature("Startup Snapshot")
+class TestLibrarySnapshot:
+
+    @allure.story("Round Trip")
+    @allure.title("Songs, playlists and artists come back exactly as written")
+    def test_round_trip(self, library):
+        path, songs, _, _ = library
+        snap = load_snapshot(path)
+        assert [s.key for s in snap.songs] == [0, 1]
+        alpha, beta = snap.songs
+        assert (alpha.title, alpha.artists, alpha.genres) == ('Alpha', ('Ann', 'Bob'), ('Pop',))
+        assert (alpha.art_frame, alpha.art_hash, alpha.duration) == ('APIC:', 'h1', 181.5)
+        assert (alpha.bitrate, alpha.sample_rate) == (320000, 44100)
+        assert (beta.art_frame, beta.duration, beta.bitrate) == (None, None, None)
+        assert snap.playlists['primary'] == [beta] and snap.playlists['default'] == [alpha]
+        assert snap.artists == ['Ann', 'Bob']
+        assert snap.signatures[songs[0].path] == (13, os.stat(songs[0].path).st_mtime_ns)
+
+    @allure.story("Validation")
+    @allure.title("A song added to any folder makes the snapshot stale")
+    def test_stale_on_new_file(self, library):
+        path, _, music, _ = library
+        time.sleep(0.01)
+        (music / 'sub' / 'c.mp3').write_bytes(b'x')
+        assert load_snapshot(path) is None
+        assert load_snapshot(path, validate=False) is not None
+
+    @allure.story("Validation")
+    @allure.title("Editing a playlist file makes the snapshot stale")
+    def test_stale_on_playlist_edit(self, library):
+        path, _, _, playlist = library
+        st = os.stat(playlist)
+        os.utime(playlist, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        assert load_snapshot(path) is None
+
+    @allure.story("Validation")
+    @allure.title("Missing or corrupt snapshots are ignored")
+    def test_missing_or_corrupt(self, tmp_path):
+        assert load_snapshot(str(tmp_path / 'none.snapshot')) is None
+        bad = tmp_path / 'bad.snapshot'
+        bad.write_bytes(b'not a snapshot at all')
+        assert load_snapshot(str(bad)) is None
+
+    @allure.story("Performance")
+    @allure.title("20k songs load in well under a second")
+    def test_large_library_load_time(self, tmp_path):
+        songs = [Song(i, f'/m/artist{i % 900}/song{i}.mp3', f'Song {i}', [f'Artist {i % 900}'],
+                      ['Pop' if i % 3 else 'Rock'], art_frame='APIC:', art_hash=f'{i:032x}', duration=200.0)
+                 for i in range(20000)]
+        path = str(tmp_path / 'big.snapshot')
+        write_snapshot(path, songs, {'default': songs}, [], {},
+                       signatures={s.path: (1000, i) for i, s in enumerate(songs)})
+        t0 = time.perf_counter()
+        snap = load_snapshot(path)
+        elapsed = time.perf_counter() - t0
+        assert len(snap.songs) == 20000 and snap.songs[-1].title == 'Song 19999'
+        assert elapsed < 1.0
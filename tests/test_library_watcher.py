@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+import pytest
+import allure
+from library_watcher import LibraryWatcher
+
+
+def _touch(path, data=b'x'):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Library Watcher")
+@allure.feature("Snapshot Diffing")
+class TestSnapshotDiff:
+
+    @allure.story("Classification")
+    @allure.title("Detect added, modified and removed files")
+    def test_diff(self):
+        old = {'/m/a.mp3': (1, 1), '/m/b.mp3': (1, 1), '/m/c.mp3': (1, 1)}
+        new = {'/m/a.mp3': (1, 1), '/m/b.mp3': (2, 5), '/m/d.mp3': (1, 1)}
+        added, modified, removed = LibraryWatcher.diff(old, new)
+        assert added == ['/m/d.mp3']
+        assert modified == ['/m/b.mp3']
+        assert removed == ['/m/c.mp3']
+
+    @allure.story("Filtering")
+    @allure.title("Snapshot only contains MP3 files")
+    def test_snapshot(self, tmp_path):
+        _touch(tmp_path / 'a.mp3')
+        _touch(tmp_path / 'notes.txt')
+        watcher = LibraryWatcher(str(tmp_path), on_changes=lambda *a: None)
+        assert list(watcher.snapshot()) == [os.path.join(str(tmp_path), 'a.mp3')]
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Library Watcher")
+@allure.feature("Debounced Batches")
+class TestDebounce:
+
+    @allure.story("Bulk Copy")
+    @allure.title("Many files copied in a burst arrive as one batch")
+    @pytest.mark.parametrize("use_inotify", [False, True])
+    def test_single_batch(self, tmp_path, use_inotify):
+        _touch(tmp_path / 'existing.mp3')
+        batches = []
+        done = threading.Event()
+
+        def on_changes(added, modified, removed):
+            batches.append((sorted(added), modified, removed))
+            done.set()
+
+        watcher = LibraryWatcher(str(tmp_path), on_changes, poll_interval=0.05,
+                                 debounce=0.3, use_inotify=use_inotify)
+        watcher.start()
+        try:
+            for i in range(20):
+                _touch(tmp_path / f'new{i:02d}.mp3')
+                time.sleep(0.01)
+            os.remove(tmp_path / 'existing.mp3')
+            assert done.wait(5.0)
+            time.sleep(0.5)  # no second batch should follow
+        finally:
+            watcher.stop()
+
+        assert len(batches) == 1
+        added, modified, removed = batches[0]
+        assert len(added) == 20
+        assert removed == [os.path.join(str(tmp_path), 'existing.mp3')]
+
+    @allure.story("Errors")
+    @allure.title("A batch that fails to apply is offered again instead of being dropped")
+    def test_failed_batch_retried(self, tmp_path):
+        batches = []
+        done = threading.Event()
+
+        def on_changes(added, modified, removed):
+            batches.append(sorted(added))
+            if len(batches) == 1:
+                raise RuntimeError('database is locked')
+            done.set()
+
+        watcher = LibraryWatcher(str(tmp_path), on_changes, poll_interval=0.05,
+                                 debounce=0.1, use_inotify=False)
+        watcher.start()
+        try:
+            _touch(tmp_path / 'new.mp3')
+            assert done.wait(5.0)
+        finally:
+            watcher.stop()
+
+        assert batches == [[os.path.join(str(tmp_path), 'new.mp3')]] * 2
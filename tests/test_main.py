@@ -1,5 +1,6 @@
 import sys
 import importlib
+import threading
 from unittest.mock import MagicMock, patch, mock_open
 import pytest
 import allure
@@ -15,6 +16,7 @@ def main_module():
     modules_to_patch = {
         'kivy': mock_kivy,
         'kivy.config': MagicMock(),
+        'kivy.clock': MagicMock(),
         'kivy.app': MagicMock(),
         'kivy.core.window': MagicMock(),
         'kivy.uix.floatlayout': MagicMock(),
@@ -39,9 +41,9 @@ def reset_globals(main_module):
     """Reset main.player and main.gui before every test."""
     main_module.player = MagicMock()
     main_module.gui = MagicMock()
-    main_module.player.primary_playlist = []
-    main_module.player.Special_playlist = []
-    main_module.player.default_playlist = []
+    main_module.player.primary_playlist = main_module.SongQueue()
+    main_module.player.Special_playlist = main_module.SongQueue()
+    main_module.player.default_playlist = main_module.SongQueue()
     main_module.player.played_songs = set()
     main_module.player.selected_songs = set()
     main_module.player.song_counter = 1
@@ -55,15 +57,13 @@ def reset_globals(main_module):
 class TestUpcomingSongsDisplay:
 
     @allure.story("Queue Mixing")
-    @allure.title("Interleave Primary and Default playlists")
-    def test_upcoming_interleaving(self, main_module, reset_globals):
-        main_module.player.primary_playlist = [{'title': 'P1', 'id': 1}]
-        main_module.player.default_playlist = [{'title': 'D1', 'id': 3}]
-        
-        result = main_module.get_upcoming_songs_for_display()
-        titles = [s['title'] for s in result]
-        assert 'P1' in titles
-        assert 'D1' in titles
+    @allure.title("The upcoming list and its times come from the player's projection")
+    def test_upcoming_from_player(self, main_module, reset_globals):
+        timeline = [({'title': 'P1', 'id': 1}, 1000.0), ({'title': 'D1', 'id': 3}, 1200.0)]
+        main_module.player.upcoming_timeline.return_value = timeline
+
+        assert main_module.get_upcoming_songs_for_display() == timeline
+        main_module.player.upcoming_timeline.assert_called_once_with(10)
 
     @allure.story("Empty State")
     @allure.title("Handle empty player gracefully")
@@ -88,6 +88,24 @@ class TestSongSelection:
             mock_dialog.assert_called_once()
             assert "already been played" in mock_dialog.call_args[0][1]
 
+    @allure.story("Queueing")
+    @allure.title("A confirmed pick queues behind earlier picks and leaves the other playlists")
+    def test_pick_after_picks(self, main_module, reset_globals):
+        main_module.player.queue_lock = threading.Lock()
+        earlier = {'title': 'Earlier Pick', 'key': 1}
+        json_song = {'title': 'From JSON', 'key': 2}
+        song = {'title': 'New Pick', 'key': 3}
+        main_module.player.primary_playlist.insert_after_picks(earlier)
+        main_module.player.primary_playlist.append(json_song)
+        main_module.player.default_playlist.append(song)
+
+        with patch('main.confirm_dialog', side_effect=lambda parent, msg, cb: cb(True)):
+            main_module.select_song(song)
+
+        assert [s['title'] for s in main_module.player.primary_playlist] == ['Earlier Pick', 'New Pick', 'From JSON']
+        assert song not in main_module.player.default_playlist
+        main_module.player.notify_queue_changed.assert_called_once()
+
 @allure.epic("Main Application")
 @allure.suite("Data Management")
 @allure.feature("File Loading")
@@ -100,4 +118,148 @@ class TestDataLoading:
         with patch("builtins.open", mock_open(read_data=json_content)):
             with patch("json.load", return_value=["song1.mp3", "song2.mp3"]):
                 result = main_module.load_song_filenames_from_json("dummy.json")
-                assert result == ["song1.mp3", "song2.mp3"]
\ No newline at end of file
+                assert result == ["song1.mp3", "song2.mp3"]
+
+    @allure.story("Slot Rules")
+    @allure.title("Malformed slot rules fall back to the built-in rule instead of failing at playback")
+    def test_bad_slot_rules(self, main_module):
+        config = '{"rules": [{"playlist": "Special", "every": 3}]}'
+        with patch("os.path.exists", return_value=True), patch("builtins.open", mock_open(read_data=config)):
+            assert main_module.load_slot_rules() is None
+@allure.epic("Main Application")
+@allure.suite("Data Management")
+@allure.feature("Live Library Updates")
+class TestLibraryChanges:
+
+    @allure.story("Batch Apply")
+    @allure.title("Added and removed songs update library, queues and GUI once")
+    def test_apply_changes(self, main_module, reset_globals):
+        old = main_module.Song(0, 'mp3/old.mp3', 'Old', ['A'], ['Pop'])
+        main_module.all_songs_list = [old]
+        main_module.all_songs_path_map = {'mp3/old.mp3': old}
+        main_module.next_song_key = 1
+        main_module.player.default_playlist = main_module.SongQueue([old])
+
+        new_records = [
+            {'path': 'mp3/new1.mp3', 'title': 'New 1', 'artists': ['B'], 'genres': ['rock']},
+            {'path': 'mp3/new2.mp3', 'title': 'New 2', 'artists': ['C'], 'genres': ['disco']},
+        ]
+        with patch.object(main_module, 'build_thumbnails_in_background') as thumbs:
+            main_module.apply_library_changes(new_records, ['mp3/old.mp3'])
+
+        thumbs.assert_called_once_with(new_records)
+        assert [s['title'] for s in main_module.all_songs_list] == ['New 1', 'New 2']
+        assert {s['key'] for s in main_module.all_songs_list} == {1, 2}
+        assert main_module.all_songs_list[0].genres == ('Rock',)
+        assert sorted(s['title'] for s in main_module.player.default_playlist) == ['New 1', 'New 2']
+        assert 'mp3/old.mp3' not in main_module.all_songs_path_map
+        main_module.gui.display_songs.assert_called_once()
+        main_module.gui.populate_artists.assert_called_once_with(['B', 'C'])
+
+    @allure.story("Batch Apply")
+    @allure.title("A modified file keeps its key and queue position")
+    def test_apply_modified(self, main_module, reset_globals):
+        old = main_module.Song(7, 'mp3/a.mp3', 'A', ['A'], ['Pop'])
+        other = main_module.Song(8, 'mp3/b.mp3', 'B', ['B'], ['Pop'])
+        main_module.all_songs_list = [old, other]
+        main_module.all_songs_path_map = {'mp3/a.mp3': old, 'mp3/b.mp3': other}
+        main_module.player.primary_playlist = main_module.SongQueue([other, old])
+
+        main_module.apply_library_changes(
+            [{'path': 'mp3/a.mp3', 'title': 'A (retagged)', 'artists': ['A'], 'genres': ['pop']}], [])
+
+        assert [s['title'] for s in main_module.player.primary_playlist] == ['B', 'A (retagged)']
+        assert main_module.all_songs_path_map['mp3/a.mp3'].key == 7
+        assert main_module.player.primary_playlist[1] is not old
+
+@allure.epic("Main Application")
+@allure.suite("Data Management")
+@allure.feature("Streaming Library Scan")
+class TestStreamingScan:
+
+    @allure.story("Incremental Batches")
+    @allure.title("Batches fill playlists in JSON order and append to the GUI")
+    def test_batches_fill_playlists(self, main_module, reset_globals):
+        main_module.all_songs_list = []
+        main_module.all_songs_path_map = {}
+        main_module.next_song_key = 0
+        main_module.available_artists = set()
+        main_module.special_playlist_order = main_module._playlist_order(['xmas.mp3'])
+        main_module.primary_playlist_order = main_module._playlist_order(['first.mp3', 'second.mp3'])
+
+        def rec(name, artist='A'):
+            return {'path': f'mp3/{name}', 'title': name, 'artists': [artist], 'genres': ['pop']}
+
+        # 'second' arrives before 'first' but must still queue after it
+        main_module.add_scanned_songs([rec('second.mp3'), rec('free.mp3', 'Free Artist')])
+        main_module.add_scanned_songs([rec('first.mp3'), rec('xmas.mp3')])
+
+        player = main_module.player
+        assert [s.title for s in player.primary_playlist] == ['first.mp3', 'second.mp3']
+        assert [s.title for s in player.Special_playlist] == ['xmas.mp3']
+        assert player.Special_playlist[0].is_special
+        assert [s.title for s in player.default_playlist] == ['free.mp3']
+        assert [s.key for s in main_module.all_songs_list] == [0, 1, 2, 3]
+
+        # Each batch is appended, never a full rebuild
+        assert main_module.gui.add_songs.call_count == 2
+        main_module.gui.display_songs.assert_not_called()
+        main_module.gui.populate_artists.assert_called_once_with(['Free Artist'])
+
+@allure.epic("Main Application")
+@allure.suite("Playlist Display Logic")
+@allure.feature("Smooth Ordering")
+class TestSmoothOrdering:
+
+    @allure.story("Reorder")
+    @allure.title("The default playlist is reordered from the player's analysis")
+    def test_reorder_default_playlist(self, main_module, reset_globals):
+        songs = [{'path': f'/m/{bpm}.mp3', 'title': str(bpm)} for bpm in (90, 150, 92, 148)]
+        main_module.player.default_playlist = list(songs)
+        main_module.player.track_analysis = {s['path']: {'bpm': int(s['title']), 'camelot': '8A'} for s in songs}
+
+        main_module.reorder_default_playlist()
+
+        order = [int(s['title']) for s in main_module.player.default_playlist]
+        # Slow and fast songs end up grouped together, whichever comes first
+        assert abs(order[0] - order[1]) <= 2 and abs(order[2] - order[3]) <= 2
+        main_module.gui.update_upcoming_songs.assert_called_once()
+
+@allure.epic("Main Application")
+@allure.suite("Data Management")
+@allure.feature("Startup Snapshot")
+class TestLibrarySnapshot:
+
+    @allure.story("Load")
+    @allure.title("A snapshot fills the library and playlists without a scan")
+    def test_load_from_snapshot(self, main_module, reset_globals):
+        a = main_module.Song(3, 'mp3/a.mp3', 'A', ['Ann'], ['Pop'])
+        b = main_module.Song(5, 'mp3/b.mp3', 'B', ['Bob'], ['Pop'])
+        snapshot = MagicMock(songs=[a, b], playlists={'primary': [b], 'default': [a]}, artists=['Ann'])
+        main_module.all_songs_path_map = {}
+        main_module.available_artists = set()
+
+        with patch.object(main_module, 'build_thumbnails_in_background') as thumbs:
+            main_module.load_library_from_snapshot(snapshot)
+
+        thumbs.assert_called_once_with([a, b])
+        assert main_module.all_songs_list == [a, b]
+        assert main_module.all_songs_path_map['mp3/b.mp3'] is b
+        assert main_module.next_song_key == 6
+        assert main_module.player.primary_playlist == [b]
+        assert main_module.player.default_playlist == [a]
+        main_module.gui.populate_artists.assert_called_once_with(['Ann'])
+
+    @allure.story("Save")
+    @allure.title("Saved playlists match what a fresh start would build")
+    def test_snapshot_playlists(self, main_module, reset_globals):
+        main_module.special_playlist_order = main_module._playlist_order(['xmas.mp3'])
+        main_module.primary_playlist_order = main_module._playlist_order(['second.mp3', 'first.mp3', 'xmas.mp3'])
+        songs = [main_module.Song(i, f'mp3/{name}', name) for i, name in
+                 enumerate(['first.mp3', 'free.mp3', 'xmas.mp3', 'second.mp3'])]
+
+        playlists = main_module._snapshot_playlists(songs)
+
+        assert [s.title for s in playlists['primary']] == ['second.mp3', 'first.mp3']
+        assert [s.title for s in playlists['special']] == ['xmas.mp3']
+        assert [s.title for s in playlists['default']] == ['free.mp3']
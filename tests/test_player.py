@@ -1,11 +1,15 @@
 import pytest
 import allure
 import time
+import threading
+import numpy as np
 from unittest.mock import MagicMock, patch, ANY
 # Import the class to test. 
 # Note: We patch modules BEFORE importing if they have import-time side effects, 
 # but here the side effects are protected by checks or are manageable.
-from player import JukeboxPlayer, _fmt_mmss, _get_duration_seconds
+from player import JukeboxPlayer, _fmt_mmss, _get_duration_seconds, _Wakeup, _next_check, END_CHECK, MAX_WAIT
+from crossfade_mixer import envelope
+from slot_scheduler import SlotScheduler
 
 # --- Fixtures ---
 
@@ -13,6 +17,7 @@ from player import JukeboxPlayer, _fmt_mmss, _get_duration_seconds
 def mock_pygame():
     """Mocks the entire pygame module to prevent audio device errors."""
     with patch('player.pygame') as mock_pg:
+        mock_pg.mixer.get_init.return_value = (44100, -16, 2)
         # Mock mixer.music
         mock_pg.mixer.music.get_busy.return_value = False
         
@@ -20,6 +25,8 @@ def mock_pygame():
         mock_channel = MagicMock()
         mock_channel.get_busy.return_value = False
         mock_pg.mixer.Channel.return_value = mock_channel
+        mock_pg.sndarray.make_sound.side_effect = lambda frames: np.array(frames, copy=True)
+        mock_pg.sndarray.samples.side_effect = lambda sound: sound  # tests decode to arrays
         
         # Mock mixer.Sound
         mock_sound = MagicMock()
@@ -41,11 +48,68 @@ def player(mock_pygame, mock_kivy_clock):
     mock_update_upcoming = MagicMock()
     mock_start_playback = MagicMock()
     
-    return JukeboxPlayer(
+    p = JukeboxPlayer(
         gui_update_now_playing=mock_update_now,
         update_upcoming_songs_callback=mock_update_upcoming,
         start_playback_callback=mock_start_playback
     )
+    p.stream_decode = False  # tests hand the player decoded arrays, whether or not ffmpeg is installed
+    return p
+
+class _FakeChannel:
+    """
+    Stands in for a mixer Channel fed by a ChannelStream. Every sound played
+    or queued is kept in `sounds`; checking the queue finishes the playing
+    sound, and the last one ends once it has been seen playing.
+    """
+
+    def __init__(self):
+        self.sounds = []
+        self.playing = self.queued = None
+        self._seen = False
+
+    def play(self, sound, loops=0):
+        self.sounds.append(sound)
+        self.playing, self.queued, self._seen = sound, None, False
+
+    def queue(self, sound):
+        self.sounds.append(sound)
+        if self.playing is None:
+            self.playing = sound
+        else:
+            self.queued = sound
+        self._seen = False
+
+    def get_queue(self):
+        self.playing, self.queued = self.queued, None
+        return None
+
+    def get_busy(self):
+        if self.queued is None and self._seen:
+            self.playing = None
+        self._seen = self.playing is not None
+        return self.playing is not None
+
+    def stop(self):
+        self.playing = self.queued = None
+
+    def set_volume(self, volume):
+        pass
+
+    def rendered(self):
+        return np.concatenate(self.sounds)
+
+
+def _chain(player, tracks):
+    """Give the player decoded songs ({path: samples}) and a fake crossfade channel; returns the channel."""
+    ch = _FakeChannel()
+    player._deck.channel = ch
+    player._load_crossfade_sound = lambda song: tracks[song['path']]
+    player.prefetcher.take = lambda song: None
+    return ch
+
+def _level(seconds, value, rate=44100):
+    return np.full((int(seconds * rate), 2), value, dtype=np.int16)
 
 # --- Tests ---
 
@@ -114,6 +178,100 @@ class TestQueuePriority:
         assert len(player.primary_playlist) == 0
 
 
+def _named(prefix, n):
+    return [{'title': f'{prefix}{i}', 'path': f'/{prefix}{i}.mp3'} for i in range(1, n + 1)]
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Queue Management")
+@allure.feature("Upcoming Songs")
+class TestUpcomingSongs:
+
+    @allure.story("Queue Mixing")
+    @allure.title("The projection interleaves the playlists with a special song every 5th slot")
+    def test_order(self, player):
+        player.song_counter = 3
+        player.primary_playlist = _named('P', 1)
+        player.default_playlist = _named('D', 10)
+        player.Special_playlist = _named('S', 2)
+
+        titles = [s['title'] for s in player.upcoming_songs(8)]
+        assert titles == ['P1', 'D1', 'S1', 'D2', 'D3', 'D4', 'D5', 'S2']
+
+    @allure.story("Caching")
+    @allure.title("Repeated and deeper queries reuse the projection until the queue changes")
+    def test_cached(self, player):
+        player.default_playlist = _named('D', 1000)
+        first = player.upcoming_songs(5)
+        assert player.upcoming_songs(5) == first
+        assert [s['title'] for s in player.upcoming_songs(20)][-1] == 'D20'
+        assert player.projection_builds == 1
+
+        player._pop_next_song()  # takes D1 (song_counter is unchanged until it is counted)
+        assert player.upcoming_songs(1)[0]['title'] == 'D2'
+        player.song_counter += 1
+        player.upcoming_songs(1)
+        player.default_playlist = _named('X', 3)
+        assert player.upcoming_songs(1)[0]['title'] == 'X1'
+        assert player.projection_builds == 4
+
+    @allure.story("Slot Rules")
+    @allure.title("Look-ahead applies the slot rules at each song's estimated start time")
+    def test_rules_over_time(self, player):
+        player.scheduler = SlotScheduler([{'playlist': 'special', 'max_per_hour': 1}], fallback=['special', 'default'])
+        player.Special_playlist = [dict(s, duration=1200.0) for s in _named('S', 2)]
+        player.default_playlist = [dict(s, duration=1200.0) for s in _named('D', 5)]
+
+        titles = [s['title'] for s in player.upcoming_songs(5)]
+        assert titles == ['S1', 'D1', 'D2', 'S2', 'D3']  # 20-minute songs: the next Special fits an hour later
+        assert player._pop_next_song()['title'] == 'S1'
+        assert player._pop_next_song()['title'] == 'D1'  # the real history now holds S1
+
+    @allure.story("ETA")
+    @allure.title("Each upcoming song's start time chains the songs before it, overlaps included")
+    def test_timeline(self, player):
+        player.current_start_ts, player.current_duration = 1000.0, 300.0  # ends at 1300
+        player.default_playlist = [dict(s, duration=200.0) for s in _named('D', 3)]
+        player.set_track_analysis('/D1.mp3', {'cue_in': 10.0, 'cue_out': 200.0, 'mix_out': 190.0})
+
+        with patch('player.time.time', return_value=1100.0):
+            etas = [eta for _, eta in player.upcoming_timeline(3)]
+        assert etas == [1300.0, 1300.0 + 180.0, 1300.0 + 180.0 + 200.0]
+
+    @allure.story("ETA")
+    @allure.title("Time passing or a song running long moves the times without rebuilding the projection")
+    def test_timeline_moves(self, player):
+        player.current_start_ts, player.current_duration = 1000.0, 300.0
+        player.default_playlist = [dict(s, duration=200.0) for s in _named('D', 2)]
+        with patch('player.time.time', return_value=1100.0):
+            player.upcoming_timeline(2)
+        with patch('player.time.time', return_value=1400.0):  # the current song overran its tag
+            etas = [eta for _, eta in player.upcoming_timeline(2)]
+        assert etas == [1400.0, 1600.0] and player.projection_builds == 1
+
+        player.skip_flag.set()
+        with patch('player.time.time', return_value=1150.0):
+            assert player.upcoming_timeline(1)[0][1] == 1150.0  # skipped: the next song starts now
+
+    @allure.story("ETA")
+    @allure.title("New analysis results move the start times of the songs after the analyzed one")
+    def test_timeline_after_analysis(self, player):
+        player.current_start_ts, player.current_duration = 1000.0, 300.0
+        player.default_playlist = [dict(s, duration=200.0) for s in _named('D', 2)]
+        with patch('player.time.time', return_value=1100.0):
+            assert [eta for _, eta in player.upcoming_timeline(2)] == [1300.0, 1500.0]
+            player.set_track_analysis('/D1.mp3', {'cue_in': 0.0, 'cue_out': 200.0, 'mix_out': 150.0})
+            assert [eta for _, eta in player.upcoming_timeline(2)] == [1300.0, 1450.0]
+
+    @allure.story("Queue Mixing")
+    @allure.title("A song queued in two playlists is listed once and the list stops when the queues run out")
+    def test_duplicates_and_end(self, player):
+        song = {'title': 'Both', 'path': '/both.mp3'}
+        player.primary_playlist = [song]
+        player.default_playlist = [song, {'title': 'Other', 'path': '/o.mp3'}]
+        assert [s['title'] for s in player.upcoming_songs(10)] == ['Both', 'Other']
+
+
 @allure.epic("Jukebox Player")
 @allure.suite("Playback Controls")
 @allure.feature("Immediate Playback")
@@ -183,24 +341,87 @@ class TestAmbientMusic:
         assert player.ambient_thread is not None
 
     @allure.story("Playback Loop")
-    @allure.title("Ambient loop plays random file")
-    @patch('player.os.walk')
-    @patch('player.random.choice')
-    def test_ambient_loop_logic(self, mock_choice, mock_walk, player, mock_pygame):
+    @allure.title("Ambient tracks are played in blocks and crossfaded into each other")
+    def test_ambient_loop_logic(self, player, mock_pygame):
         """
-        Scenario: Run the internal loop method directly.
-        Expectation: Plays sound on AMBIENT channel.
+        Scenario: Run the internal loop over two ten-second tracks with a two-second crossfade.
+        Expectation: The AMBIENT channel gets each track in blocks, with one overlap block between them.
         """
-        mock_walk.return_value = [('/ambiant', [], ['calm.mp3'])]
-        mock_choice.return_value = '/ambiant/calm.mp3'
-        
-        # Set stop event immediately so the loop runs only once
-        player.ambient_stop_event.set()
-        
-        player._ambient_loop("dummy_folder")
-        
-        mock_pygame.mixer.Channel.assert_called_with(2) # AMBIENT_CHANNEL_IDX is 2
-        mock_pygame.mixer.Sound.assert_called_with('/ambiant/calm.mp3')
+        ch = _FakeChannel()
+        mock_pygame.mixer.Channel.return_value = ch
+        tracks = {'/ambiant/a.mp3': _level(10, 1000), '/ambiant/b.mp3': _level(10, 3000)}
+        player.sound_cache.get = MagicMock(side_effect=tracks.get)
+        player._ambient_indexes['/ambiant'] = _FakeIndex(['/ambiant/a.mp3', '/ambiant/b.mp3'])
+        player.ambient_crossfade = 2.0
+
+        player._ambient_loop('/ambiant', threading.Event())
+
+        mock_pygame.mixer.Channel.assert_called_with(2)  # AMBIENT_CHANNEL_IDX is 2
+        assert [len(s) for s in ch.sounds] == [2 * 44100] * 9
+        overlap = ch.sounds[4]
+        assert overlap[0, 0] == pytest.approx(1000, abs=2) and overlap[-1, 0] == pytest.approx(3000, abs=2)
+        assert (ch.sounds[3] == 1000).all() and (ch.sounds[5] == 3000).all()
+
+    @allure.story("Memory")
+    @allure.title("Only the playing and the next ambient track are pinned in the sound cache")
+    def test_pins_two_tracks(self, player, mock_pygame):
+        mock_pygame.mixer.Channel.return_value = _FakeChannel()
+        paths = [f'/ambiant/{name}.mp3' for name in 'abcd']
+        player.sound_cache.get = MagicMock(return_value=_level(3, 1000))
+        player._ambient_indexes['/ambiant'] = _FakeIndex(paths)
+        pinned = []
+        pin = player.sound_cache.pin
+        player.sound_cache.pin = lambda *p: (pin(*p), pinned.append(set(player.sound_cache._pinned)))
+
+        player._ambient_loop('/ambiant', threading.Event())
+
+        assert pinned[0] == {paths[0], paths[1]} and max(len(p) for p in pinned) <= 3
+        assert not player.sound_cache._pinned  # released when the run ends
+
+    @allure.story("Start and Stop")
+    @allure.title("Stopping silences the channel at once and a restart doesn't wait for the old run")
+    def test_stop_and_restart(self, player, mock_pygame):
+        ch = mock_pygame.mixer.Channel.return_value
+        ch.get_busy.return_value = True   # the mixer never gets through a block
+        ch.get_queue.return_value = object()
+        player.sound_cache.get = MagicMock(return_value=_level(60, 1000))
+        player._ambient_indexes['ambiant'] = _FakeIndex(['/ambiant/a.mp3'] * 3)
+
+        player.start_ambient_music()
+        _until(lambda: ch.queue.called)
+        first = player.ambient_thread
+        player.stop_ambient_music()
+        ch.stop.assert_called()
+        player.start_ambient_music()  # even if the stopped run hasn't exited yet
+        assert player.ambient_thread is not first
+        first.join(2)
+        assert not first.is_alive()
+        player.stop_ambient_music()
+        player.ambient_thread.join(2)
+        assert ch.play.call_count <= 2 and ch.queue.call_count <= 2  # nothing fed after a stop
+
+
+class _FakeIndex:
+    """AmbientIndex stand-in that deals `paths` once, in order."""
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def files(self):
+        return self.paths
+
+    def peek(self):
+        return self.paths[0] if self.paths else None
+
+    def next(self):
+        return self.paths.pop(0) if self.paths else None
+
+
+def _until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
 
 
 @allure.epic("Jukebox Player")
@@ -239,4 +460,450 @@ class TestDuration:
         mock_sound.return_value = mock_sound_obj
         
         duration = _get_duration_seconds("song.mp3")
-        assert duration == 120.5
\ No newline at end of file
+        assert duration == 120.5
+
+@allure.epic("Jukebox Player")
+@allure.suite("Metadata")
+@allure.feature("Stored Durations")
+class TestStoredDuration:
+
+    @allure.story("No Probing")
+    @allure.title("Scanned songs use their stored duration without file I/O")
+    @patch('player._get_duration_seconds')
+    def test_uses_stored_duration(self, mock_probe, player, mock_pygame):
+        mock_pygame.mixer.music.get_busy.return_value = False
+        player.play_song_immediately({'title': 'Scanned', 'path': '/s.mp3', 'duration': 201.5})
+
+        assert player.current_duration == 201.5
+        mock_probe.assert_not_called()
+
+    @allure.story("Hand-built Songs")
+    @allure.title("Songs without a duration are probed once per path")
+    @patch('player._get_duration_seconds', return_value=99.0)
+    def test_probes_once(self, mock_probe, player):
+        song = {'title': 'First Dance', 'path': '/first.mp3'}
+        assert player._song_duration(song) == 99.0
+        assert player._song_duration(song) == 99.0
+        mock_probe.assert_called_once_with('/first.mp3')
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Loudness Normalization")
+class TestNormalization:
+
+    @allure.story("Music Channel")
+    @allure.title("Analyzed gain sets the music volume")
+    def test_music_volume(self, player, mock_pygame):
+        player.set_track_analysis('/loud.mp3', {'gain_db': -6.0206})
+        player.play_song_immediately({'title': 'Loud', 'path': '/loud.mp3', 'duration': 100.0})
+        mock_pygame.mixer.music.set_volume.assert_called_with(pytest.approx(0.5, abs=1e-4))
+
+    @allure.story("Music Channel")
+    @allure.title("Unanalyzed songs and disabled normalization play at full volume")
+    def test_default_volume(self, player):
+        assert player._track_volume({'path': '/new.mp3'}) == 1.0
+        player.set_track_analysis('/loud.mp3', {'gain_db': -6.0})
+        player.normalize_volume = False
+        assert player._track_volume({'path': '/loud.mp3'}) == 1.0
+
+    @allure.story("Crossfade Channel")
+    @allure.title("Channel songs have their own gain rendered into the samples")
+    def test_crossfade_volume(self, player, mock_pygame):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 10.0}
+        loud = {'title': 'Loud', 'path': '/loud.mp3', 'duration': 5.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 4.0})
+        player.set_track_analysis('/loud.mp3', {'gain_db': -6.0206})
+        player.crossfade_duration = 1.0
+        player.default_playlist = [first, loud]
+        ch = _chain(player, {'/1.mp3': _level(10, 8000), '/loud.mp3': _level(5, 8000)})
+
+        player._play_or_crossfade(first)
+
+        out = ch.rendered()[:, 0]
+        assert out[-1] == 4000  # the incoming song ends up at its own gain
+        assert mock_pygame.mixer.Channel.return_value.set_volume.call_args.args == (1.0,)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Cue Points")
+class TestCuePoints:
+
+    @allure.story("Leading Silence")
+    @allure.title("Songs start after their leading silence, fading in on the channel")
+    def test_starts_at_cue_in(self, player, mock_pygame):
+        song = {'title': 'Quiet Intro', 'path': '/q.mp3', 'duration': 10.0}
+        player.set_track_analysis('/q.mp3', {'cue_in': 2.5, 'cue_out': 9.5, 'mix_out': 8.0})
+        player.default_playlist = [song]
+        ch = _chain(player, {'/q.mp3': _level(10, 8000)})
+
+        player._play_or_crossfade(song)
+
+        out = ch.rendered()
+        assert len(out) == int(7.5 * 44100)  # nothing queued at the mix-out point: plays to the end
+        assert out[0, 0] < 50 and out[int(2.5 * 44100), 0] == 8000  # 2 s fade-in, then full level
+        mock_pygame.mixer.music.play.assert_not_called()
+        assert player.current_song is song and not player.crossfade_active
+
+    @allure.story("Leading Silence")
+    @allure.title("Songs without cue analysis start from the top")
+    def test_no_cues(self, player, mock_pygame):
+        song = {'title': 'Plain', 'path': '/p.mp3', 'duration': 200.0}
+        player.default_playlist = [song]
+        player._play_or_crossfade(song)
+        mock_pygame.mixer.music.play.assert_called_once_with(fade_ms=2000)
+        assert player._mix_out_ts is None
+
+    @allure.story("Mix-out")
+    @allure.title("The crossfade is due at the mix-out point, leaving room to finish")
+    def test_mix_out_time(self, player):
+        player.current_start_ts = 1000.0
+        player.set_track_analysis('/a.mp3', {'cue_in': 1.0, 'cue_out': 180.0, 'mix_out': 170.0})
+        player._set_mix_out({'path': '/a.mp3'})
+        assert player._mix_out_ts == 1170.0
+
+        player.set_track_analysis('/b.mp3', {'cue_in': 1.0, 'cue_out': 180.0, 'mix_out': 178.0})
+        player._set_mix_out({'path': '/b.mp3'})
+        assert player._mix_out_ts == 1000.0 + 180.0 - player.crossfade_duration
+
+    @allure.story("Mix-out")
+    @allure.title("At the mix-out point the queued song is mixed in and taken off the queue")
+    def test_hands_off_at_mix_out(self, player, mock_pygame):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 10.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 5.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 4.0})
+        player.crossfade_duration = 1.0
+        player.default_playlist = [first, second]
+        ch = _chain(player, {'/1.mp3': _level(10, 8000), '/2.mp3': _level(5, 2000)})
+
+        player._play_or_crossfade(first)
+
+        assert player.default_playlist == []
+        assert player.current_song is second and player.song_counter == 3
+        assert len(ch.rendered()) == (4 + 5) * 44100  # first song up to its mix-out, then all of the second
+        mock_pygame.mixer.music.load.assert_not_called()
+
+    @allure.story("Mix-out")
+    @allure.title("Nothing new starts while a song is playing before its mix-out point")
+    def test_not_ready_before_mix_out(self, player, mock_pygame):
+        mock_pygame.mixer.music.get_busy.return_value = True
+        player._mix_out_ts = time.time() + 60
+        assert not player._ready_for_next()
+        player._mix_out_ts = None
+        assert not player._ready_for_next()
+
+    @allure.story("Leading Silence")
+    @allure.title("Crossfaded songs come in from their cue-in point")
+    def test_crossfade_from_cue_in(self, player):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 10.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 5.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 4.0})
+        player.set_track_analysis('/2.mp3', {'cue_in': 1.0})
+        player.crossfade_duration = 1.0
+        player.default_playlist = [first, second]
+        ch = _chain(player, {'/1.mp3': _level(10, 8000), '/2.mp3': _level(5, 2000)})
+
+        player._play_or_crossfade(first)
+        assert len(ch.rendered()) == (4 + 4) * 44100
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Duplicate Songs")
+class TestDuplicates:
+
+    @allure.story("Hiding")
+    @allure.title("Copies of played and queued songs are reported for hiding")
+    def test_hidden_duplicate_paths(self, player):
+        player.set_track_analysis('/a.mp3', {'fingerprint': list(range(100))})
+        player.set_track_analysis('/a (copy).mp3', {'fingerprint': list(range(10, 110))})
+        player.set_track_analysis('/b.mp3', {'fingerprint': list(range(500, 600))})
+        player.set_track_analysis('/b remix.mp3', {'fingerprint': list(range(520, 620))})
+        assert player.hidden_duplicate_paths() == set()
+
+        player.played_paths.add('/a.mp3')
+        player.primary_playlist = [{'title': 'B', 'path': '/b.mp3'}]
+        assert player.hidden_duplicate_paths() == {'/a (copy).mp3', '/b remix.mp3'}
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Event-driven Waiting")
+class TestWaiting:
+
+    @allure.story("Wake-ups")
+    @allure.title("A notify that lands before the wait is not lost")
+    def test_no_lost_wakeup(self):
+        wakeup = _Wakeup()
+        generation = wakeup.generation
+        wakeup.notify()
+        t0 = time.monotonic()
+        wakeup.wait(generation, 5.0)
+        assert time.monotonic() - t0 < 0.1
+
+    @allure.story("Timers")
+    @allure.title("Sleeps run until just before the track ends, then check closely")
+    def test_next_check(self):
+        now = time.time()
+        assert _next_check(end_ts=now + 0.3) == END_CHECK
+        assert _next_check(end_ts=now + 0.8) == pytest.approx(0.3, abs=0.01)
+        assert _next_check(end_ts=now + 600) == MAX_WAIT
+        assert _next_check(wake_ts=now + 0.2, end_ts=now + 600) == pytest.approx(0.2, abs=0.01)
+
+    @allure.story("Timers")
+    @allure.title("A mix-out point that has passed with nothing queued doesn't make the loop spin")
+    def test_past_wake_ignored(self, player):
+        now = time.time()
+        assert _next_check(wake_ts=now - 5, end_ts=now + 600) == MAX_WAIT
+        calls = []
+        player._wait(lambda: calls.append(1) or time.time() > now + 0.3, wake_ts=now - 5, end_ts=now + 600)
+        assert len(calls) < 5
+
+    @allure.story("Wake-ups")
+    @allure.title("Skipping wakes a waiting playback thread straight away")
+    def test_skip_wakes_waiter(self, player):
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(
+            player._wait_for_track(lambda: True, time.time() + 100, stop=player.skip_flag)))
+        waiter.start()
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        player.skip_current_song()
+        waiter.join(1.0)
+        assert result == ['stopped']
+        assert time.monotonic() - t0 < 0.1
+
+    @allure.story("Wake-ups")
+    @allure.title("Queueing a song wakes an idle playback loop")
+    def test_queue_change_wakes_idle_loop(self, player):
+        waiter = threading.Thread(target=player._wait, args=(lambda: player._get_next_song() is not None,))
+        waiter.start()
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        with player.queue_lock:
+            player.primary_playlist.append({'title': 'New', 'path': '/new.mp3'})
+        player.notify_queue_changed()
+        waiter.join(1.0)
+        assert not waiter.is_alive()
+        assert time.monotonic() - t0 < 0.1
+
+    @allure.story("Gap Measurement")
+    @allure.title("The gap between a track ending and the next starting is measured")
+    def test_gap_measured(self, player):
+        end = time.time() + 0.2
+        calls = []
+        busy = lambda: calls.append(1) or time.time() < end
+        assert player._wait_for_track(busy, end, measure_gap=True) == 'ended'
+        player._record_gap({'title': 'Next', 'path': '/next.mp3'})
+        assert len(player.gaps_ms) == 1 and player.gaps_ms[0] < 50
+        assert len(calls) < 40  # 10 ms checks only near the end, not a busy loop
+        assert '1 gaps' in player.gap_summary()
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Prefetch")
+class TestPrefetch:
+
+    @allure.story("Crossfade")
+    @allure.title("The crossfade uses the song decoded while the previous one played")
+    def test_crossfade_uses_prefetched_sound(self, player, mock_pygame):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 200.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 200.0}
+        player.default_playlist = [first, second]
+        player.current_song = first
+        player._mix_out_ts = time.time() + 60
+        prefetched = _level(1, 100)
+        player.prefetcher = MagicMock()
+        player.prefetcher.take.return_value = prefetched
+
+        player.notify_queue_changed()
+        player.prefetcher.request.assert_called_with(first)
+
+        track = player._channel_track(second)
+        player.prefetcher.take.assert_called_once_with(second)
+        mock_pygame.mixer.Sound.assert_not_called()
+        assert track.source.samples is prefetched
+
+    @allure.story("Music Stream")
+    @allure.title("Nothing is decoded for a song that will be streamed with mixer.music")
+    def test_no_prefetch_for_music(self, player):
+        song = {'title': 'Next', 'path': '/next.mp3', 'duration': 100.0}
+        player.primary_playlist = [song]
+        player.current_song = {'title': 'Now', 'path': '/now.mp3'}
+        player.prefetcher = MagicMock()
+
+        player._mix_out_ts = None  # plays to its end and the next song isn't analyzed
+        player.notify_queue_changed()
+        player.prefetcher.request.assert_called_with(None)
+
+        player.set_track_analysis('/next.mp3', {'cue_in': 0.0, 'cue_out': 100.0, 'mix_out': 90.0})
+        player.notify_queue_changed()  # it will start on the channel by itself
+        player.prefetcher.request.assert_called_with(song)
+
+        player.track_analysis.clear()
+        player._mix_out_ts = time.time() + 60  # it will be crossfaded in
+        player.notify_queue_changed()
+        player.prefetcher.request.assert_called_with(song)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Crossfade Mixer")
+class TestRenderedCrossfade:
+
+    @allure.story("Envelope")
+    @allure.title("The overlap in the rendered output follows the equal-power curve sample by sample")
+    def test_overlap_envelope(self, player):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 10.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 5.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 4.0})
+        player.crossfade_duration = 1.0
+        player.default_playlist = [first, second]
+        ch = _chain(player, {'/1.mp3': _level(10, 8000), '/2.mp3': _level(5, 0)})
+
+        player._play_or_crossfade(first)
+
+        out = ch.rendered()[:, 0].astype(float)
+        rate = 44100
+        assert (out[2 * rate:4 * rate] == 8000).all()   # full level up to the mix-out point
+        env = envelope(out[4 * rate:5 * rate], 441) / 8000  # 10 ms blocks across the 1 s overlap
+        t = (np.arange(len(env)) * 441 + 0.5) / rate
+        assert np.allclose(env, np.cos(t * np.pi / 2), atol=0.01)
+        assert (out[5 * rate:] == 0).all()              # the outgoing song is gone after the fade
+
+    @allure.story("Skipping")
+    @allure.title("Skipping stops the channel and leaves the rest of the song unplayed")
+    def test_skip(self, player):
+        song = {'title': 'Long', 'path': '/l.mp3', 'duration': 10.0}
+        player.set_track_analysis('/l.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 8.0})
+        player.default_playlist = [song]
+        ch = _chain(player, {'/l.mp3': _level(10, 8000)})
+        player.skip_flag.set()
+
+        player._play_or_crossfade(song)
+
+        assert len(ch.sounds) <= 2 and ch.playing is None
+        assert not player.skip_flag.is_set() and not player.crossfade_active
+
+    @allure.story("Hand-over")
+    @allure.title("A queue emptied or changed while the next song loads never leaves a decoder open")
+    def test_queue_changed_during_load(self, player):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 10.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 5.0}
+        other = {'title': 'Other', 'path': '/3.mp3', 'duration': 5.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.0, 'cue_out': 10.0, 'mix_out': 4.0})
+        player.crossfade_duration = 1.0
+        player.default_playlist = [second]
+        _chain(player, {'/1.mp3': _level(10, 8000)})
+        track = player._channel_track(first)
+
+        loaded = MagicMock()
+        with patch.object(player, '_channel_track', return_value=loaded), \
+                patch.object(player, '_pop_next_song', return_value=None):
+            assert player._hand_over(track, 'crossfade') is None
+        loaded.source.close.assert_called_once()
+        assert track.mix_out is None  # the current song plays out
+
+        track.mix_out = 4 * 44100
+        loaded = MagicMock()
+        with patch.object(player, '_channel_track', side_effect=[loaded, RuntimeError("bad file")]), \
+                patch.object(player, '_pop_next_song', return_value=other):
+            assert player._hand_over(track, 'crossfade') is None
+        loaded.source.close.assert_called_once()
+        assert track.mix_out is None
+
+
+def _ramp(seconds, first_value, rate=44100):
+    """Stereo block whose samples count up, so a join shows up sample for sample."""
+    values = (np.arange(int(seconds * rate)) % 20000 + first_value).astype(np.int16)
+    return np.repeat(values[:, None], 2, axis=1)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Gapless Playback")
+class TestGapless:
+
+    @allure.story("Playlists")
+    @allure.title("A gapless playlist's song starts on the sample after the last one, from its first sample")
+    def test_gapless_join(self, player, mock_pygame):
+        first = {'title': 'First', 'path': '/1.mp3', 'duration': 3.0}
+        second = {'title': 'Second', 'path': '/2.mp3', 'duration': 3.0}
+        player.set_track_analysis('/1.mp3', {'cue_in': 0.5, 'cue_out': 3.0, 'mix_out': 1.5})
+        player.set_track_analysis('/2.mp3', {'cue_in': 1.0, 'cue_out': 3.0, 'mix_out': 1.5})
+        player.set_playlist_transition('default', 'gapless')
+        player.default_playlist = [first, second]
+        a, b = _ramp(3, 0), _ramp(3, -10000)
+        ch = _chain(player, {'/1.mp3': a, '/2.mp3': b})
+
+        player._play_or_crossfade(first)
+
+        out = ch.rendered()
+        rate = 44100
+        assert len(out) == int(2.5 * rate) + 3 * rate  # the first from its cue-in, the second whole
+        assert (out[-3 * rate:] == b).all()             # no fade, no trimmed silence
+        assert (out[2 * rate:int(2.5 * rate)] == a[int(2.5 * rate):]).all()
+        assert player.current_song is second and player.default_playlist == []
+        mock_pygame.mixer.music.load.assert_not_called()
+
+    @allure.story("Pairs")
+    @allure.title("A gapless pair overrides the playlist's crossfade, and songs without cues use the channel")
+    def test_pair_override(self, player, mock_pygame):
+        first = {'title': 'Part 1', 'path': '/live/1.mp3', 'duration': 3.0}
+        second = {'title': 'Part 2', 'path': '/live/2.mp3', 'duration': 3.0}
+        third = {'title': 'Other', 'path': '/3.mp3', 'duration': 3.0}
+        player.set_pair_transition('1.mp3', '2.mp3', 'gapless')
+        player.default_playlist = [first, second, third]
+        ch = _chain(player, {'/live/1.mp3': _ramp(3, 0), '/live/2.mp3': _ramp(3, 0)})
+
+        assert player._uses_channel(first) and not player._uses_channel(third)
+        player._play_or_crossfade(first)
+
+        assert len(ch.rendered()) == 6 * 44100
+        assert player.current_song is second and player.default_playlist == [third]
+
+    @allure.story("Errors")
+    @allure.title("Unknown transition modes and playlists are rejected")
+    def test_bad_mode(self, player):
+        with pytest.raises(ValueError):
+            player.set_playlist_transition('default', 'fade')
+        with pytest.raises(ValueError):
+            player.set_playlist_transition('jazz', 'gapless')
+        with pytest.raises(ValueError):
+            player.set_pair_transition('a.mp3', 'b.mp3', 'cut')
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Streaming Decode")
+class TestStreamingDecode:
+
+    @allure.story("Crossfade Channel")
+    @allure.title("With the decoder available, channel songs are streamed from their cue-in, not decoded whole")
+    @patch('player.DecoderSource')
+    def test_channel_song_streamed(self, mock_decoder, player, mock_pygame):
+        song = {'title': 'Long Mix', 'path': '/mix.mp3', 'duration': 3600.0}
+        player.set_track_analysis('/mix.mp3', {'cue_in': 2.0, 'cue_out': 3600.0, 'mix_out': 3590.0})
+        player.stream_decode = True
+        player.prefetcher = MagicMock()
+
+        track = player._channel_track(song)
+
+        mock_decoder.assert_called_once_with('/mix.mp3', 44100, 2, -16, 2 * 44100, 3600 * 44100)
+        assert track.sound is None
+        player.prefetcher.take.assert_not_called()
+        mock_pygame.mixer.Sound.assert_not_called()
+
+    @allure.story("Test Channel")
+    @allure.title("Test songs are played block by block on the test channel")
+    def test_test_songs_in_blocks(self, player, mock_pygame):
+        ch = _FakeChannel()
+        mock_pygame.mixer.Channel.return_value = ch
+        player.sound_cache.get = MagicMock(side_effect=lambda path: _level(5, 1000))
+
+        player._play_test_songs_worker([{'title': 'T1', 'path': '/t1.mp3'}, {'title': 'T2', 'path': '/t2.mp3'}])
+
+        assert [len(s) for s in ch.sounds] == [2 * 44100, 2 * 44100, 44100] * 2
+        assert ch.playing is None
@@ -0,0 +1,67 @@
+import random
+import time
+import pytest
+import allure
+from playlist_order import smooth_order, transition_cost
+
+def _library(n, seed=0):
+    rng = random.Random(seed)
+    songs = [{'path': f'/m/{i}.mp3'} for i in range(n)]
+    analysis = {s['path']: {'bpm': rng.uniform(70, 175), 'camelot': f"{rng.randint(1, 12)}{rng.choice('AB')}"}
+                for s in songs}
+    return songs, analysis
+
+def _average_cost(songs, analysis):
+    pairs = list(zip(songs, songs[1:]))
+    return sum(transition_cost(analysis[a['path']], analysis[b['path']]) for a, b in pairs) / len(pairs)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playlist Ordering")
+@allure.feature("Transition Cost")
+class TestTransitionCost:
+
+    @allure.story("Tempo")
+    @allure.title("Half and double time are free moves")
+    def test_double_time(self):
+        assert transition_cost({'bpm': 70, 'camelot': '8A'}, {'bpm': 140, 'camelot': '8A'}) == pytest.approx(0.0)
+        assert transition_cost({'bpm': 100, 'camelot': '8A'}, {'bpm': 130, 'camelot': '8A'}) > 4
+
+    @allure.story("Key")
+    @allure.title("Neighbours on the Camelot wheel are cheap, the far side is expensive")
+    def test_key_distance(self):
+        near = transition_cost({'bpm': 120, 'camelot': '12A'}, {'bpm': 120, 'camelot': '1A'})
+        far = transition_cost({'bpm': 120, 'camelot': '12A'}, {'bpm': 120, 'camelot': '6B'})
+        assert near == pytest.approx(1.0)
+        assert far == pytest.approx(7.0)
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playlist Ordering")
+@allure.feature("Smooth Ordering")
+class TestSmoothOrder:
+
+    @allure.story("Ordering")
+    @allure.title("Reordering keeps every song and smooths transitions")
+    def test_smoother(self):
+        songs, analysis = _library(300)
+        ordered = smooth_order(songs, analysis, rng=random.Random(1))
+        assert sorted(s['path'] for s in ordered) == sorted(s['path'] for s in songs)
+        assert _average_cost(ordered, analysis) < _average_cost(songs, analysis) / 3
+
+    @allure.story("Ordering")
+    @allure.title("Songs that weren't analyzed are kept")
+    def test_unanalyzed(self):
+        songs, analysis = _library(10)
+        extra = [{'path': '/m/new.mp3'}, {'path': '/m/other.mp3'}]
+        ordered = smooth_order(songs + extra, analysis, rng=random.Random(1))
+        assert len(ordered) == 12
+        assert all(s in ordered for s in extra)
+
+    @allure.story("Performance")
+    @allure.title("Five thousand songs order in a few seconds at most")
+    def test_scales(self):
+        songs, analysis = _library(5000)
+        t0 = time.perf_counter()
+        smooth_order(songs, analysis, rng=random.Random(1))
+        assert time.perf_counter() - t0 < 5.0
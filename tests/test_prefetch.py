@@ -0,0 +1,75 @@
+import threading
+import pytest
+import allure
+from prefetch import TrackPrefetcher
+
+def _song(name):
+    return {'title': name, 'path': f'/m/{name}.mp3'}
+
+
+class _Loader:
+    """Fake decoder; songs listed in `blocked` wait until released."""
+
+    def __init__(self, blocked=()):
+        self.calls = []
+        self.gates = {name: threading.Event() for name in blocked}
+        self.started = {name: threading.Event() for name in blocked}
+
+    def __call__(self, song):
+        self.calls.append(song['title'])
+        if song['title'] in self.gates:
+            self.started[song['title']].set()
+            self.gates[song['title']].wait(2)
+        if song['title'] == 'broken':
+            raise RuntimeError("bad file")
+        return f"sound:{song['title']}"
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Prefetch")
+class TestTrackPrefetcher:
+
+    @allure.story("Ready in Time")
+    @allure.title("A requested song is decoded in the background and handed over once")
+    def test_request_and_take(self):
+        loader = _Loader()
+        prefetcher = TrackPrefetcher(loader)
+        prefetcher.request(_song('a'))
+        assert prefetcher.take(_song('a')) == 'sound:a'
+        assert prefetcher.take(_song('a')) is None
+        assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+
+    @allure.story("Re-targeting")
+    @allure.title("A queue change cancels the old decode and prefetches the new head")
+    def test_retarget(self):
+        loader = _Loader(blocked=['a'])
+        prefetcher = TrackPrefetcher(loader)
+        prefetcher.request(_song('a'))
+        assert loader.started['a'].wait(1)
+        prefetcher.request(_song('b'))
+        loader.gates['a'].set()
+        assert prefetcher.take(_song('b')) == 'sound:b'
+        assert prefetcher.take(_song('a')) is None
+        assert loader.calls == ['a', 'b']
+        assert prefetcher.cancelled == 1
+
+    @allure.story("Re-targeting")
+    @allure.title("Taking a song that is still decoding waits for it")
+    def test_take_waits_for_current_decode(self):
+        loader = _Loader(blocked=['a'])
+        prefetcher = TrackPrefetcher(loader)
+        prefetcher.request(_song('a'))
+        assert loader.started['a'].wait(1)
+        threading.Timer(0.05, loader.gates['a'].set).start()
+        assert prefetcher.take(_song('a')) == 'sound:a'
+        assert loader.calls == ['a']
+
+    @allure.story("Failures")
+    @allure.title("A song that fails to decode is a miss, not a retry loop")
+    def test_failed_decode(self):
+        loader = _Loader()
+        prefetcher = TrackPrefetcher(loader)
+        prefetcher.request(_song('broken'))
+        assert prefetcher.take(_song('broken')) is None
+        assert loader.calls == ['broken']
@@ -0,0 +1,106 @@
+import time
+import pytest
+import allure
+from slot_scheduler import SlotScheduler, HOUR
+
+
+def _at(hhmm):
+    """Timestamp for today at local time hh:mm."""
+    hours, minutes = map(int, hhmm.split(':'))
+    lt = time.localtime()
+    return time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, hours, minutes, 0, 0, 0, -1))
+
+
+def _all(name):
+    return True
+
+
+def _sequence(scheduler, counters, available=_all, ts=None):
+    return [scheduler.pick(c, available, ts) for c in counters]
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Queue Management")
+@allure.feature("Slot Rules")
+class TestSlotScheduler:
+
+    @allure.story("Default Rule")
+    @allure.title("By default every 5th slot is Special and the rest follow primary, default, special")
+    def test_default(self):
+        s = SlotScheduler()
+        assert _sequence(s, range(0, 11)) == ['primary'] * 5 + ['special'] + ['primary'] * 4 + ['special']
+        only_default = lambda name: name == 'default'
+        assert _sequence(s, [5, 6], only_default) == ['default', 'default']
+        assert s.pick(3, lambda name: False) is None
+
+    @allure.story("Every Nth")
+    @allure.title("Several periodic rules combine over one compiled cycle, the earlier rule winning a shared slot")
+    def test_periods(self):
+        s = SlotScheduler([{'playlist': 'special', 'every': 4}, {'playlist': 'default', 'every': 3, 'start': 1}],
+                          fallback=['primary'])
+        assert _sequence(s, range(1, 13)) == ['default', 'primary', 'primary', 'special', 'primary', 'primary',
+                                              'default', 'special', 'primary', 'default', 'primary', 'special']
+        assert s._cycle == 12
+
+    @allure.story("Time Windows")
+    @allure.title("A time-window rule only claims slots that start inside its window, also across midnight")
+    def test_window(self):
+        s = SlotScheduler([{'playlist': 'special', 'between': ['23:00', '01:00']}], fallback=['default'])
+        assert s.pick(1, _all, _at('23:30')) == 'special'
+        assert s.pick(1, _all, _at('00:30')) == 'special'
+        assert s.pick(1, _all, _at('22:59')) == 'default'
+
+    @allure.story("Caps")
+    @allure.title("max_per_hour holds a playlist back until its oldest song is an hour old")
+    def test_cap(self):
+        s = SlotScheduler([{'playlist': 'special', 'every': 1}, {'playlist': 'special', 'max_per_hour': 2}],
+                          fallback=['default'])
+        t0 = 1_000_000.0
+        for i in range(2):
+            assert s.pick(i + 1, _all, t0 + i) == 'special'
+            s.record('special', t0 + i)
+        assert s.pick(3, _all, t0 + 60) == 'default'
+        assert s.pick(3, _all, t0 + HOUR + 0.5) == 'special'
+
+    @allure.story("Caps")
+    @allure.title("Look-ahead counts simulated songs in its own copy of the history")
+    def test_simulated_history(self):
+        s = SlotScheduler([{'playlist': 'special', 'max_per_hour': 1}], fallback=['special', 'default'])
+        history = s.copy_history()
+        s.record('special', 100.0, history)
+        assert s.pick(1, _all, 200.0, history) == 'default'
+        assert s.pick(1, _all, 200.0) == 'special' and s.version == 0
+
+    @allure.story("Config")
+    @allure.title("Rules load from a config dict and bad rules are rejected")
+    def test_config(self):
+        s = SlotScheduler.from_config({'rules': [{'playlist': 'default', 'every': 2}], 'fallback': ['primary']})
+        assert _sequence(s, [1, 2]) == ['primary', 'default']
+        with pytest.raises(ValueError):
+            SlotScheduler([{'playlist': 'special', 'every': 0}])
+        with pytest.raises(ValueError):
+            SlotScheduler([{'playlist': 'special', 'each': 3}])
+
+    @allure.story("Validation")
+    @allure.title("Malformed rules are rejected when loaded, not when a slot is picked")
+    @pytest.mark.parametrize("config", [
+        {'rules': [{'playlist': 'Special', 'every': 5}]},
+        {'rules': [{'playlist': 'special', 'between': ['22:00']}]},
+        {'rules': [{'playlist': 'special', 'between': '22:00-23:00'}]},
+        {'rules': [{'playlist': 'special', 'between': ['22:00', '25:00']}]},
+        {'rules': [{'playlist': 'special', 'every': 0}]},
+        {'rules': [{'playlist': 'special', 'every': 2.5}]},
+        {'rules': [{'playlist': 'special', 'start': 3}]},
+        {'rules': [{'playlist': 'special', 'every': 4, 'start': -1}]},
+        {'rules': [{'playlist': 'special', 'max_per_hour': '2'}]},
+        {'rules': [{'playlist': 'special', 'evry': 5}]},
+        {'rules': [{'every': 5}]},
+        {'rules': ['special']},
+        {'rules': {'playlist': 'special'}},
+        {'fallback': ['primary', 'Default']},
+        {'fallback': 'default'},
+        ['special'],
+    ])
+    def test_bad_config(self, config):
+        with pytest.raises(ValueError):
+            SlotScheduler.from_config(config)
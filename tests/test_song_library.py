@@ -1,7 +1,7 @@
 import pytest
 import allure
 from unittest.mock import MagicMock, patch
-from song_library import get_all_mp3_files_with_metadata, is_abba_song, _extract_album_art
+from song_library import get_all_mp3_files_with_metadata, is_abba_song, _extract_album_art, Song, ARTISTS
 
 # --- Fixtures for Mocking Mutagen/ID3 ---
 
@@ -206,4 +206,125 @@ class TestGetMp3Files:
         assert song['title'] == 'bad_file' # Derived from filename
         assert song['artists'] == ['Unknown Artist']
         assert song['genres'] == ['unknown genre']
-        assert song['album_art'] is None
\ No newline at end of file
+        assert song['art_frame'] is None
+
+@allure.epic("Song Library Management")
+@allure.suite("File System Scanning")
+@allure.feature("Parallel Scanning")
+class TestParallelScan:
+
+    @allure.story("Deterministic Order")
+    @allure.title("Pool results keep the sorted walk order")
+    @pytest.mark.parametrize("workers", [None, 4])
+    @patch('song_library._read_song_metadata')
+    @patch('song_library.os.walk')
+    def test_order_is_stable(self, mock_walk, mock_read, workers):
+        """
+        Scenario: Files are parsed on a thread pool, later files finishing first.
+        Expectation: Output order follows the sorted file names, not completion order.
+        """
+        import time as _time
+        names = [f'{c}.mp3' for c in 'edcba']
+        mock_walk.return_value = [('/music', [], list(names))]
+
+        def slow_read(path, stage_times=None):
+            # Make early files slow so they finish last
+            _time.sleep(0.01 * (5 - 'abcde'.index(path[-5])))
+            return {'path': path, 'title': path[-5], 'artists': [], 'genres': [], 'art_frame': None}
+        mock_read.side_effect = slow_read
+
+        results = get_all_mp3_files_with_metadata('/music', workers=workers)
+        assert [s['title'] for s in results] == list('abcde')
+
+    @allure.story("Stage Timings")
+    @allure.title("Report walk, parse and art timings")
+    @patch('song_library.ID3')
+    @patch('song_library.os.walk')
+    def test_timings_reported(self, mock_walk, mock_id3_class, mock_id3_tags):
+        mock_walk.return_value = [('/music', [], ['a.mp3', 'b.mp3'])]
+        mock_id3_class.return_value = mock_id3_tags
+
+        timings = {}
+        get_all_mp3_files_with_metadata('/music', workers=2, timings=timings)
+
+        assert timings['files'] == 2
+        assert timings['parsed'] == 2
+        assert timings['workers'] == 2
+        for stage in ('walk', 'parse', 'art'):
+            assert timings[stage] >= 0.0
+
+
+@allure.epic("Song Library Management")
+@allure.suite("Song Records")
+@allure.feature("Compact Song Type")
+class TestSongRecord:
+
+    @allure.story("Precomputed Flags")
+    @allure.title("ABBA, Special and Christmas flags are set at construction")
+    def test_flags(self):
+        song = Song(1, '/m/a.mp3', 'Mamma Mia', ['ABBA'], ['Christmas'])
+        assert song.is_abba and song.is_christmas and not song.is_special
+        assert is_abba_song(song) is True
+        assert Song(2, '/m/b.mp3', 'Carol', ['Choir'], ['Special']).is_special
+
+    @allure.story("Identity")
+    @allure.title("Equality and hashing go by key")
+    def test_identity_by_key(self):
+        a = Song(5, '/m/a.mp3', 'A', ['X'], ['Pop'])
+        retagged = a.replace(title='A (Remastered)')
+        assert a == retagged
+        assert retagged in {a}
+        assert a != Song(6, '/m/a.mp3', 'A', ['X'], ['Pop'])
+
+    @allure.story("Immutability")
+    @allure.title("Fields cannot be reassigned")
+    def test_immutable(self):
+        song = Song(1, '/m/a.mp3', 'A')
+        with pytest.raises(AttributeError):
+            song.title = 'B'
+        with pytest.raises(AttributeError):
+            song.extra = 1
+
+    @allure.story("Interning")
+    @allure.title("Artists are shared ids but read back as names")
+    def test_interned_artists(self):
+        a = Song(1, '/m/a.mp3', 'A', ['Queen', 'David Bowie'], ['Rock'])
+        b = Song(2, '/m/b.mp3', 'B', ['Queen'], ['Rock'])
+        assert a.artist_ids[0] == b.artist_ids[0] == ARTISTS.id_of('Queen')
+        assert a['artists'] == ('Queen', 'David Bowie')
+        assert a.get('album_art') is None
+        with pytest.raises(KeyError):
+            a['nope']
+
+
+@allure.epic("Song Library Management")
+@allure.suite("File System Scanning")
+@allure.feature("Streaming Scan")
+class TestStreamingScan:
+
+    @allure.story("Batches")
+    @allure.title("Songs are yielded in fixed-size batches in walk order")
+    @patch('song_library._read_song_metadata')
+    @patch('song_library.os.walk')
+    def test_batches(self, mock_walk, mock_read):
+        from song_library import iter_mp3_files_with_metadata
+        mock_walk.return_value = [('/music', [], [f'{i}.mp3' for i in range(5)])]
+        mock_read.side_effect = lambda path, stage_times=None: {'path': path}
+
+        timings = {}
+        batches = list(iter_mp3_files_with_metadata('/music', batch_size=2, timings=timings))
+
+        assert [len(b) for b in batches] == [2, 2, 1]
+        assert [s['path'] for b in batches for s in b] == [f'/music/{i}.mp3' for i in range(5)]
+        assert timings['files'] == 5
+
+    @allure.story("Audio Info")
+    @allure.title("Duration, bitrate and sample rate are captured at scan time")
+    def test_audio_info_from_real_file(self):
+        import os
+        from song_library import _read_song_metadata
+        song = _read_song_metadata(os.path.join(os.path.dirname(__file__), '..', 'I_am_a_test.mp3'))
+        assert song['duration'] == pytest.approx(1.224, abs=0.05)
+        assert song['bitrate'] == 192000
+        assert song['sample_rate'] == 48000
+        assert Song.from_record(song, key=0).duration == song['duration']
@@ -0,0 +1,106 @@
+import random
+import pytest
+import allure
+from song_queue import SongQueue
+
+
+def _songs(*names):
+    return [{'key': i, 'title': name} for i, name in enumerate(names)]
+
+
+def _titles(queue):
+    return [s['title'] for s in queue]
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Core Logic")
+@allure.feature("Song Queue")
+class TestSongQueue:
+
+    @allure.story("Basics")
+    @allure.title("Songs come off the front in order and compare equal to a list")
+    def test_fifo(self):
+        a, b, c = _songs('A', 'B', 'C')
+        q = SongQueue([a, b])
+        q.append(c)
+        assert q == [a, b, c] and len(q) == 3 and q.first() is a
+        assert q[1] is b and q[-1] is c
+        assert q.popleft() is a and _titles(q) == ['B', 'C']
+        q.popleft(), q.popleft()
+        assert not q and q.first() is None
+        with pytest.raises(IndexError):
+            q.popleft()
+
+    @allure.story("Membership")
+    @allure.title("Membership and removal go by the song's key, not by comparing every field")
+    def test_by_key(self):
+        a, b = _songs('A', 'B')
+        q = SongQueue([a, b])
+        assert {'key': 1, 'title': 'B (retagged)'} in q
+        q.remove({'key': 0})
+        assert q == [b] and a not in q
+        assert not q.discard(a)
+        with pytest.raises(ValueError):
+            q.remove(a)
+
+    @allure.story("Membership")
+    @allure.title("A song is queued at most once")
+    def test_no_duplicates(self):
+        a, = _songs('A')
+        q = SongQueue([a, a])
+        assert not q.append(a) and len(q) == 1
+
+    @allure.story("User Picks")
+    @allure.title("Picks queue behind earlier picks, ahead of everything else, also after the front one plays")
+    def test_picks(self):
+        a, b, p1, p2, p3 = _songs('A', 'B', 'P1', 'P2', 'P3')
+        q = SongQueue([a, b])
+        q.insert_after_picks(p1)
+        q.insert_after_picks(p2)
+        assert _titles(q) == ['P1', 'P2', 'A', 'B']
+        q.popleft()
+        q.remove(p2)
+        q.insert_after_picks(p3)
+        assert _titles(q) == ['P3', 'A', 'B']
+
+    @allure.story("Library Changes")
+    @allure.title("A retagged song takes its old place in the queue")
+    def test_replace(self):
+        a, b = _songs('A', 'B')
+        new_a = {'key': 0, 'title': 'A (retagged)'}
+        q = SongQueue([b, a])
+        assert q.replace(a, new_a)
+        assert q[1] is new_a and not q.replace({'key': 9}, a)
+
+    @allure.story("Positions")
+    @allure.title("Songs can be inserted before a queued song or at an index")
+    def test_insert(self):
+        a, b, c, d = _songs('A', 'B', 'C', 'D')
+        q = SongQueue([a, c])
+        q.insert_before(c, b)
+        q.insert(99, d)
+        assert _titles(q) == ['A', 'B', 'C', 'D']
+
+    @allure.story("Shuffle")
+    @allure.title("Random insertion picks each gap with equal probability")
+    def test_insert_random(self):
+        rng = random.Random(1)
+        counts = [0] * 4
+        for _ in range(4000):
+            songs = _songs('A', 'B', 'C', 'new')
+            q = SongQueue(songs[:3])
+            q.remove(songs[1])
+            q.append(songs[1])  # slots no longer match queue order
+            q.insert_random(songs[3], rng)
+            counts[_titles(q).index('new')] += 1
+        assert all(850 < c < 1150 for c in counts)
+
+    @allure.story("Iteration")
+    @allure.title("Removing the song an iterator stands on doesn't cut the iteration short")
+    def test_remove_while_iterating(self):
+        songs = _songs('A', 'B', 'C')
+        q = SongQueue(songs)
+        it = iter(q)
+        assert next(it) is songs[0]
+        q.remove(songs[0])
+        assert list(it) == songs[1:]
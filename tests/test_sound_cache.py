@@ -0,0 +1,96 @@
+import os
+import pytest
+import allure
+from sound_cache import DecodedAudioCache
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for name in 'abcd':
+        p = tmp_path / f'{name}.mp3'
+        p.write_bytes(b'x')
+        paths.append(str(p))
+    return paths
+
+def _cache(budget):
+    loads = []
+    def load(path):
+        loads.append(os.path.basename(path))
+        return f"pcm:{os.path.basename(path)}"
+    return DecodedAudioCache(load, lambda sound: 100, budget_bytes=budget), loads
+
+
+@allure.epic("Jukebox Player")
+@allure.suite("Playback")
+@allure.feature("Decoded Audio Cache")
+class TestDecodedAudioCache:
+
+    @allure.story("Hits")
+    @allure.title("A second play of the same file is served without decoding")
+    def test_hit(self, files):
+        cache, loads = _cache(1000)
+        assert cache.get(files[0]) == cache.get(files[0]) == 'pcm:a.mp3'
+        assert loads == ['a.mp3']
+        assert (cache.hits, cache.misses, cache.bytes) == (1, 1, 100)
+
+    @allure.story("Eviction")
+    @allure.title("The least recently used sound goes once the byte budget is exceeded")
+    def test_lru_eviction(self, files):
+        cache, loads = _cache(250)
+        cache.get(files[0])
+        cache.get(files[1])
+        cache.get(files[0])      # 'a' is now the most recent
+        cache.get(files[2])      # over budget: 'b' goes
+        assert cache.evictions == 1 and cache.bytes == 200
+        cache.get(files[0])
+        cache.get(files[1])
+        assert loads == ['a.mp3', 'b.mp3', 'c.mp3', 'b.mp3']
+
+    @allure.story("Pinning")
+    @allure.title("Pinned sounds are never evicted, and unpinning lets them go")
+    def test_pinning(self, files):
+        cache, loads = _cache(250)
+        cache.pin(files[0], files[1], files[2])
+        for path in files[:4]:
+            cache.get(path)
+        assert cache.bytes == 300  # over budget rather than dropping a pinned sound
+        for path in files[:3]:
+            cache.get(path)
+        assert loads == ['a.mp3', 'b.mp3', 'c.mp3', 'd.mp3']
+        cache.budget_bytes = 50
+        cache.unpin(files[0])
+        assert len(cache) == 2
+        cache.unpin(files[1], files[2])
+        assert len(cache) == 0
+
+    @allure.story("Invalidation")
+    @allure.title("A rewritten file is decoded again and replaces its old entry")
+    def test_mtime_change(self, files):
+        cache, loads = _cache(1000)
+        cache.get(files[0])
+        st = os.stat(files[0])
+        os.utime(files[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        cache.get(files[0])
+        assert loads == ['a.mp3', 'a.mp3']
+        assert len(cache) == 1 and cache.bytes == 100
+
+    @allure.story("Eviction")
+    @allure.title("A sound bigger than the whole budget isn't cached")
+    def test_too_big(self, files):
+        cache, loads = _cache(50)
+        cache.get(files[0])
+        cache.get(files[0])
+        assert loads == ['a.mp3', 'a.mp3'] and len(cache) == 0
+
+    @allure.story("Pinning")
+    @allure.title("A path pinned twice stays pinned until both pins are released")
+    def test_pin_counts(self, files):
+        cache, loads = _cache(1000)
+        cache.pin(files[0])
+        cache.pin(files[0])
+        cache.get(files[0])
+        cache.budget_bytes = 50
+        cache.unpin(files[0])
+        assert len(cache) == 1
+        cache.unpin(files[0])
+        assert len(cache) == 0